@@ -1,20 +1,27 @@
 from datetime import date
 from pathlib import Path
-from typing import List
+import itertools
 import os
 
-from engine.domain.schedule import Assignment
+from engine.infrastructure.checkpoints import CheckpointError, CheckpointStore, config_fingerprint
 from engine.infrastructure.config import CONFIG
+from engine.infrastructure.overtime_ledger import OvertimeLedger
 from engine.infrastructure.production_calendar import ProductionCalendar
+from engine.infrastructure.scenarios import synthetic_prev_tail_and_carry_in
 from engine.presentation import report
-from engine.services.generator import Generator
-from engine.services import pairing
-from engine.services import balancer
-from engine.services import postprocess
+from engine.services.diagnostics import MonthDiagnostics
+from engine.services.generator import CarryState, Generator
+from engine.services import rules
 from engine.services import validator
-from engine.services import coverage as cov
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Генерация месяцев из CONFIG с отчётами в ./reports")
+    parser.add_argument("--resume", action="store_true", help="продолжить после последнего чекпоинта")
+    parser.add_argument("--from-month", dest="from_month", default=None, help="YYYY-MM: начать с этого месяца")
+    args = parser.parse_args()
+
     calendar = ProductionCalendar.load_default()
     gen = Generator(CONFIG, calendar=calendar)
 
@@ -22,91 +29,48 @@ if __name__ == "__main__":
     code_map = {k: v.code for k, v in gen.shift_types.items()}
     report.set_code_map(code_map)
 
-    carry_in = []           # переносы N8* на 1-е число
-    prev_tail_by_emp = {}   # синтетический хвост для первого месяца
-    # анти-соло счётчик по сотрудникам (копим между месяцами в рамках одного запуска)
-    solo_months_counter = {}
     prev_pairs_for_report: list | None = None
 
     out_dir = Path(os.getcwd()) / "reports"
     out_dir.mkdir(exist_ok=True)
 
-    for idx, month_spec in enumerate(CONFIG["months"]):
-        ym = month_spec["month_year"]
-        # Номер месяца и 1-е число (для carry-in)
-        y, m = map(int, ym.split("-"))
-        first_day = date(y, m, 1)
-        # Границы месяца (для фильтра отпусков)
-        first_day_cur = first_day
-        # небольшая утилита: получить последний день месяца через генератор
-        last_day_cur = list(gen.iter_month_days(y, m))[-1]
-        # Множество актуальных сотрудников (на случай, если кого-то удалили из конфига)
-        current_emp_ids = {rec["id"] for rec in CONFIG["employees"]}
-
-        # --- СИНТЕТИЧЕСКИЙ ХВОСТ ТОЛЬКО ДЛЯ ПЕРВОГО МЕСЯЦА ---
-        if idx == 0:
-            # 28,29,30,31 июля 2025 — коды в хронологическом порядке.
-            # NB: у E07 на 31-е НЕТ ночи (исправлено), переносов делаем ТОЛЬКО для E04/E08.
-            prev_tail_by_emp = {
-                "E01": ["OFF", "DB", "OFF", "OFF"],   # → 1 авг DAY(A)
-                "E02": ["OFF", "OFF", "OFF", "DA"],   # → 1 авг NIGHT(B)
-                "E03": ["DA", "OFF", "NA", "OFF"],    # → 1 авг OFF (после ночи день раньше)
-                "E04": ["DA", "OFF", "OFF", "N4A"],   # → перенос N8A на 1 авг
-                "E05": ["OFF", "DA", "OFF", "OFF"],   # → 1 авг DAY(B)
-                "E06": ["OFF", "OFF", "OFF", "DB"],   # → 1 авг NIGHT(A)
-                "E07": ["DB", "OFF", "NB", "OFF"],    # → 1 авг OFF (без переноса)  ← фикс
-                "E08": ["DB", "OFF", "OFF", "N4B"],   # → перенос N8B на 1 авг
-            }
-            # Оставляем хвост только для существующих сотрудников
-            prev_tail_by_emp = {eid: tail for eid, tail in prev_tail_by_emp.items() if eid in current_emp_ids}
-            # Готовим carry-in N8* на 1-е число только для тех, кто есть в конфиге
-            carry_in = []
-            if "E04" in current_emp_ids:
-                carry_in.append(Assignment("E04", first_day, "n8_a", gen.shift_types["n8_a"].hours, source="template"))
-            if "E08" in current_emp_ids:
-                carry_in.append(Assignment("E08", first_day, "n8_b", gen.shift_types["n8_b"].hours, source="template"))
-
-        # --- Агрегируем отпуска по всем month_spec: берём только даты, попадающие в текущий месяц ---
-        eff_vacations: dict[str, list[date]] = {}
-        for ms in CONFIG["months"]:
-            vac = ms.get("vacations", {}) or {}
-            for eid, dates in vac.items():
-                for dt in dates:
-                    if first_day_cur <= dt <= last_day_cur:
-                        eff_vacations.setdefault(eid, []).append(dt)
-        # убираем дубликаты и несущ. сотрудников — на всякий случай
-        eff_vacations = {eid: sorted(set(dts)) for eid, dts in eff_vacations.items() if eid in current_emp_ids}
-        # Передаём в генератор модифицированный month_spec с «эффективными» отпусками
-        month_spec_eff = dict(month_spec)
-        month_spec_eff["vacations"] = eff_vacations
-
-        employees, schedule, carry_out = gen.generate_month(
-            month_spec_eff,
-            carry_in=carry_in,
-            prev_tail_by_emp=prev_tail_by_emp
-        )
-
-        # ---- Балансировка пар (safe-mode в начале месяца) ----
-        pairs_before = pairing.compute_pairs(schedule, gen.code_of)
-        pb_cfg = dict(CONFIG.get("pair_breaking", {}) or {})
-        pb_cfg.setdefault("prev_pairs", prev_pairs_for_report or [])
-        schedule_balanced, ops_log, solo_after, pair_score_before_pb, pair_score_after_pb, apply_log = balancer.apply_pair_breaking(
-            schedule,
-            employees,
-            gen.code_of,
-            pb_cfg,
-        )
+    # --- СИНТЕТИЧЕСКИЙ ХВОСТ ТОЛЬКО ДЛЯ ПЕРВОГО МЕСЯЦА ---
+    # 4 последних дня прошлого месяца + переносы N8* на 1-е — по позиции сотрудника в списке.
+    try:
+        month_list = gen.configured_months(CONFIG["months"])
+    except ValueError as exc:
+        raise SystemExit(f"[config] {exc}")
+    first_ym, last_ym = month_list[0], month_list[-1]
+    y0, m0 = map(int, first_ym.split("-"))
+    prev_tail0, carry_in0 = synthetic_prev_tail_and_carry_in(date(y0, m0, 1), [rec["id"] for rec in CONFIG["employees"]], gen)
+    state = CarryState(prev_tail_by_emp=prev_tail0, carry_in=carry_in0)
+
+    # Чекпоинты границ месяцев (reports/checkpoints): --resume / --from-month
+    checkpoints = CheckpointStore(out_dir / "checkpoints", config_fingerprint(CONFIG, calendar=calendar, state0=state))
+    try:
+        start_ym, state = checkpoints.start_point(month_list, state, resume=args.resume, from_month=args.from_month)
+    except CheckpointError as exc:
+        raise SystemExit(f"[checkpoints] {exc}")
+    if start_ym is None:
+        print(f"[checkpoints] all months up to {last_ym} are done")
+        raise SystemExit(0)
+    if start_ym != first_ym:
+        print(f"[checkpoints] continue from {start_ym}")
+        prev_pairs_for_report = state.prev_pairs
+
+    # Журнал переработки (reports/overtime_ledger.json) — пополняется после каждого месяца
+    ledger = OvertimeLedger.load(out_dir / "overtime_ledger.json")
+
+    # Генерация → балансировка пар → отпуска → сокращения — по месяцу за раз
+    for res in gen.generate_horizon(start_ym, last_ym, state, ledger=ledger):
+        ym = res.ym
+        employees, schedule = res.employees, res.schedule
+        carry_in, carry_out = res.carry_in, res.carry_out
+        ops_log, apply_log = res.ops_log, res.apply_log
+        pair_score_before_pb, pair_score_after_pb = res.pair_score_before, res.pair_score_after
+        norm_info = res.norm_info
         if CONFIG.get("pair_breaking", {}).get("enabled", False):
-            schedule = schedule_balanced
-
-        # ---- Пост-перекраска отпусков (0/8ч, не влияет на паттерн) ----
-        postprocess.apply_vacations(schedule, eff_vacations, gen.shift_types)
-
-        # -------- СЛОЙ СОКРАЩЕНИЙ (ПОСЛЕДНИМ) --------
-        raw_norm = month_spec.get("norm_hours_month")
-        norm = int(raw_norm) if raw_norm is not None else int(calendar.norm_hours(y, m) or 0)
-        gen.enforce_hours_caps(employees, schedule, norm, ym)
-        norm_info = gen.last_norms_info() or {}
+            res.pair_stats.write_json(str(out_dir / f"schedule_{ym}_balancer_stats.json"))
 
         # ---------- Сохранение в каталог reports/ ----------
         base = f"schedule_{ym}"
@@ -131,9 +95,13 @@ if __name__ == "__main__":
 
         # ---------- Аналитика и логи ----------
         log_lines = []
+        # диагностики (CONFIG["diagnostics"]) считаются только по запросу секций лога
+        diag = MonthDiagnostics.for_result(
+            res, gen.code_of, CONFIG, smoke_days=CONFIG.get("pair_breaking", {}).get("window_days", 6) + 2
+        )
         if CONFIG.get("logging", {}).get("enabled", True):
-            if idx == 0:
-                log_lines.append(f"[bootstrap] synthetic prev_tail applied for first month (size={len(prev_tail_by_emp)})")
+            if ym == first_ym:
+                log_lines.append(f"[bootstrap] synthetic prev_tail applied for first month (size={len(prev_tail0)})")
             if carry_in:
                 ap = ", ".join([f"{a.employee_id}={gen.code_of(a.shift_key)}" for a in carry_in])
                 log_lines.append(f"[carry_in] {ym}-01: {ap}")
@@ -147,17 +115,52 @@ if __name__ == "__main__":
                     log_lines.append("[pair_breaking.ops]")
                     log_lines.extend([f" - {x}" for x in ops_log])
                 # smoke по первым дням
-                smoke = validator.coverage_smoke(ym, schedule, gen.code_of, first_days=CONFIG.get("pair_breaking", {}).get("window_days", 6) + 2)
-                log_lines.append("[coverage.smoke.first-days]")
-                for row in smoke:
-                    log_lines.append(f" {row[0]}: DA={row[1]} DB={row[2]} NA={row[3]} NB={row[4]}")
-            # baseline валидация с учётом N4/N8 и игнором VAC
-            baseline_issues = validator.validate_baseline(ym, employees, schedule, gen.code_of, gen=None, ignore_vacations=True)
-            if baseline_issues:
-                log_lines.append("[validator.baseline.issues]")
-                log_lines.extend([f" - {x}" for x in baseline_issues])
+                if diag.enabled("coverage_smoke"):
+                    log_lines.append("[coverage.smoke.first-days]")
+                    for row in diag.get("coverage_smoke"):
+                        log_lines.append(f" {row[0]}: DA={row[1]} DB={row[2]} NA={row[3]} NB={row[4]}")
+            max_vac = int((CONFIG.get("validation", {}) or {}).get("max_concurrent_vacations", 0) or 0)
+            if max_vac > 0:
+                conflicts = gen.vacation_index().conflicts(
+                    max_vac, *gen.month_bounds(*gen.ym_to_year_month(ym)), emp_ids=[e.id for e in employees]
+                )
+                if conflicts:
+                    log_lines.append("[vacations.conflicts]")
+                    log_lines.extend([f" - {x}" for x in conflicts])
+            if res.coverage_log:
+                log_lines.append("[coverage.repair]")
+                log_lines.extend([f" - {x}" for x in res.coverage_log])
+            # baseline валидация с учётом N4/N8 и игнором VAC (отсечки — CONFIG["validation"])
+            v_cfg = CONFIG.get("validation", {}) or {}
+            issues = gen.final_issues(res)  # перепроверяются только сотрудники, изменённые после генерации
+            # доп. правила — одним проходом по сетке месяца
+            rule_names = [x for x in (v_cfg.get("rules") or []) if x != "baseline.cycle"]
+            if rule_names:
+                rule_report = rules.check_schedule(ym, employees, schedule, gen.code_of, rule_names)
+                log_lines.append("[validator.rules]")
+                for name, st in rule_report.stats.items():
+                    log_lines.append(f" - {name}: checked={st.checked} violations={st.violations} time={st.seconds:.4f}s")
+                issues = itertools.chain(issues, rule_report.issues)
+            # отсечки — один раз на общий поток baseline + правила
+            issues = validator.limit_issues(
+                issues, int(v_cfg.get("max_issues", 0)), int(v_cfg.get("per_employee", 0))
+            )
+            if CONFIG.get("logging", {}).get("format", "text") == "jsonl":
+                issues_path, n_issues = report.write_issues_jsonl(str(out_dir / f"{base}_issues.jsonl"), issues)
+                if n_issues:
+                    log_lines.append(f"[validator.baseline.issues] {n_issues} → {issues_path}")
+            else:
+                issues = list(issues)
+                baseline_issues = [validator.format_issue(x) for x in issues if x.rule == "baseline.cycle"]
+                if baseline_issues:
+                    log_lines.append("[validator.baseline.issues]")
+                    log_lines.extend([f" - {x}" for x in baseline_issues])
+                rule_issues = [validator.format_issue(x) for x in issues if x.rule != "baseline.cycle"]
+                if rule_issues:
+                    log_lines.append("[validator.rules.issues]")
+                    log_lines.extend([f" - {x}" for x in rule_issues])
             # диагностический трейс фазы (первые 10 дней)
-            trace = validator.phase_trace(ym, employees, schedule, gen.code_of, gen=None, days=10)
+            trace = diag.get("phase_trace", [])
             if trace:
                 log_lines.append("[diagnostics.phase_trace.first10]")
                 log_lines.extend([f" {ln}" for ln in trace])
@@ -176,29 +179,8 @@ if __name__ == "__main__":
                     for msg in norm_warnings:
                         log_lines.append(f" - {msg}")
 
-        if schedule:
-            last_day = max(schedule.keys())
-            next_year = last_day.year + (1 if last_day.month == 12 else 0)
-            next_month = 1 if last_day.month == 12 else last_day.month + 1
-            new_carry_out: List[Assignment] = []
-            for entry in schedule[last_day]:
-                code = gen.code_of(entry.shift_key).upper()
-                if code in {"N4A", "N4B"}:
-                    key = "n8_a" if code.endswith("A") else "n8_b"
-                    shift = gen.shift_types[key]
-                    new_carry_out.append(
-                        Assignment(
-                            entry.employee_id,
-                            date(next_year, next_month, 1),
-                            key,
-                            shift.hours,
-                            source="autofix",
-                        )
-                    )
-            carry_out = new_carry_out
-
         # Пары (после возможного баланса)
-        pairs = pairing.compute_pairs(schedule, gen.code_of)
+        pairs = res.pairs
         pair_score_after = sum(p[2] for p in pairs)
         pairs_path = out_dir / f"{base}_pairs.csv"
         report.write_pairs_csv(str(pairs_path), pairs, employees)
@@ -248,30 +230,7 @@ if __name__ == "__main__":
             report.write_log_txt(str(log_path), log_lines)
 
         print(f"Сохранено: {xlsx_path}, {csv_grid_path}, {metrics_emp_path}, {metrics_days_path}, {pairs_path}")
-
-        # Хвост и переносы для следующего месяца
-        # Берём последние 4 даты текущего месяца и собираем хвост по сотрудникам:
-        dates_sorted = sorted(schedule.keys())
-        tail_dates = dates_sorted[-4:] if len(dates_sorted) >= 4 else dates_sorted
-        prev_tail_by_emp = {}
-        for e in employees:
-            codes = []
-            for d in tail_dates:
-                for r in schedule[d]:
-                    if r.employee_id == e.id:
-                        codes.append(gen.code_of(r.shift_key))
-                        break
-            prev_tail_by_emp[e.id] = codes
-        carry_in = carry_out
-
-        # ---- Анти-соло счётчик (по месяцу) ----
-        # считаем «соло-дни» в этом месяце и накапливаем «соло-месяцы»
-        solo_days = cov.solo_days_by_employee(schedule, gen.code_of)
-        solo_emp_ids = {eid for eid, cnt in solo_days.items() if cnt > 0}
-        for e in employees:
-            if e.id in solo_emp_ids:
-                solo_months_counter[e.id] = solo_months_counter.get(e.id, 0) + 1
-            else:
-                solo_months_counter.setdefault(e.id, 0)
+        checkpoints.save(ym, res.state)
+        ledger.save()
 
     print("Готово.")
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+
+from engine.domain.schedule import Assignment
+from engine.infrastructure.production_calendar import ProductionCalendar
+from engine.services.generator import CarryState
+
+# Чекпоинты на границах месяцев: после каждого завершённого месяца сохраняется
+# CarryState для следующего (хвост, переносы N8*, пары, анти-соло счётчик) —
+# <dir>/<YYYY-MM>.json. Отпечаток конфига защищает от продолжения с другими входами.
+
+
+class CheckpointError(ValueError):
+    """Нельзя продолжить с запрошенного месяца (нет чекпоинта, месяц вне горизонта)."""
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+def config_fingerprint(
+    cfg: Dict,
+    *,
+    calendar: Optional[ProductionCalendar] = None,
+    intern_ids: Optional[List[str]] = None,
+    state0: Optional[CarryState] = None,
+) -> str:
+    """Хэш всех входов горизонта: конфиг, календарь, стажёры и стартовое состояние."""
+    payload = {
+        "config": cfg,
+        "calendar": calendar.to_dict() if calendar else None,
+        "intern_ids": sorted(intern_ids) if intern_ids is not None else None,
+        "state0": state_to_dict(state0) if state0 is not None else None,
+    }
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def state_to_dict(state: CarryState) -> Dict[str, object]:
+    return {
+        "prev_tail_by_emp": {eid: list(codes) for eid, codes in state.prev_tail_by_emp.items()},
+        "carry_in": [
+            {
+                "employee_id": a.employee_id,
+                "date": a.date.isoformat(),
+                "shift_key": a.shift_key,
+                "effective_hours": int(a.effective_hours),
+                "source": a.source,
+                "recolored_from_night": bool(a.recolored_from_night),
+            }
+            for a in state.carry_in
+        ],
+        "prev_pairs": [list(p) for p in state.prev_pairs] if state.prev_pairs is not None else None,
+        "solo_months_counter": dict(state.solo_months_counter),
+        "ytd_overtime": dict(state.ytd_overtime),
+    }
+
+
+def state_from_dict(payload: Dict) -> CarryState:
+    prev_pairs = payload.get("prev_pairs")
+    return CarryState(
+        prev_tail_by_emp={eid: list(codes) for eid, codes in (payload.get("prev_tail_by_emp") or {}).items()},
+        carry_in=[
+            Assignment(
+                rec["employee_id"],
+                date.fromisoformat(rec["date"]),
+                rec["shift_key"],
+                int(rec["effective_hours"]),
+                rec["source"],
+                bool(rec.get("recolored_from_night", False)),
+            )
+            for rec in payload.get("carry_in") or []
+        ],
+        prev_pairs=[tuple(p) for p in prev_pairs] if prev_pairs is not None else None,
+        solo_months_counter={eid: int(v) for eid, v in (payload.get("solo_months_counter") or {}).items()},
+        ytd_overtime={eid: int(v) for eid, v in (payload.get("ytd_overtime") or {}).items()},
+    )
+
+
+class CheckpointStore:
+    """Каталог чекпоинтов одного горизонта; чужой отпечаток конфига = чекпоинта нет."""
+
+    def __init__(self, directory: Path | str, fingerprint: str) -> None:
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+
+    def _path(self, ym: str) -> Path:
+        return self.directory / f"{ym}.json"
+
+    def save(self, ym: str, state: CarryState) -> Path:
+        """Состояние ПОСЛЕ месяца ym (вход для следующего)."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(ym)
+        tmp = path.with_suffix(".tmp")
+        payload = {"month": ym, "fingerprint": self.fingerprint, "state": state_to_dict(state)}
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, path)
+        return path
+
+    def load(self, ym: str) -> Optional[CarryState]:
+        try:
+            with open(self._path(ym), "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if payload.get("fingerprint") != self.fingerprint or payload.get("month") != ym:
+            return None
+        return state_from_dict(payload["state"])
+
+    def latest(self, months: List[str]) -> Optional[str]:
+        """Последний месяц горизонта, после которого есть подходящий чекпоинт (цепочка без разрывов)."""
+        done: Optional[str] = None
+        for ym in months:
+            if self.load(ym) is None:
+                break
+            done = ym
+        return done
+
+    def start_point(
+        self,
+        months: List[str],
+        state0: CarryState,
+        *,
+        resume: bool = False,
+        from_month: Optional[str] = None,
+    ) -> Tuple[Optional[str], CarryState]:
+        """
+        С какого месяца и с каким состоянием продолжать.
+        --from-month: нужен чекпоинт предыдущего месяца (для первого месяца — state0).
+        --resume: месяц после последнего чекпоинта; None — всё уже посчитано.
+        """
+        if from_month is not None:
+            if from_month not in months:
+                raise CheckpointError(f"--from-month {from_month}: month is outside the horizon {months[0]}..{months[-1]}")
+            idx = months.index(from_month)
+            if idx == 0:
+                return from_month, state0
+            state = self.load(months[idx - 1])
+            if state is None:
+                raise CheckpointError(f"--from-month {from_month}: no checkpoint for {months[idx - 1]} in {self.directory}")
+            return from_month, state
+        if resume:
+            done = self.latest(months)
+            if done is not None:
+                idx = months.index(done)
+                nxt = months[idx + 1] if idx + 1 < len(months) else None
+                return nxt, self.load(done)
+        return months[0], state0
+
+
+__all__ = ["CheckpointError", "CheckpointStore", "config_fingerprint", "state_to_dict", "state_from_dict"]
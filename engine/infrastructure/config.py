@@ -64,6 +64,25 @@ CONFIG = {
         {"id": "E08", "name": "Сотрудник 8", "is_trainee": False, "mentor_id": None, "ytd_overtime": 0},
     ],
 
+    # Сокращение смен до 8ч при перелимите: "greedy" — по датам и по порядку сотрудников,
+    # "exact" — минимальный набор сокращений по команде (с откатом на greedy по бюджету времени)
+    "shortening": {
+        "solver": "greedy",
+        "time_budget_ms": 200,
+    },
+
+    # Отсечки нарушений baseline: всего и на сотрудника (0 — без ограничения).
+    # rules — доп. правила engine/services/rules.py для лога (например, "vacation.night_before",
+    # "placement.n8", "placement.n4", "coverage.solo_day", "shortening.two_day_workers").
+    # max_concurrent_vacations — сколько сотрудников может быть в отпуске одновременно;
+    # пересечения сверх этого пишутся в лог месяца (0 — не проверять)
+    "validation": {
+        "max_issues": 0,
+        "per_employee": 0,
+        "rules": [],
+        "max_concurrent_vacations": 0,
+    },
+
     # Покрытие дневных по умолчанию НЕ форсируем (чтобы не ломать паттерн на отладке)
     "coverage": {
         "require_day_a": 0,
@@ -77,10 +96,16 @@ CONFIG = {
         "max_per_employee": 2,
     },
 
+    # Диагностики лога (engine/services/diagnostics.py): считаются лениво; False — не считать
+    "diagnostics": {
+        "coverage_smoke": True,
+        "phase_trace": True,
+    },
+
     # Логирование артефактов: метрики/пары/события
     "logging": {
         "enabled": True,
-        "format": "text",   # "text" | "jsonl" (jsonl подключим позже)
+        "format": "text",   # "text" | "jsonl" (нарушения baseline — в <месяц>_issues.jsonl)
         "pairs_top": 20     # сколько верхних пар писать в лог
     },
 
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from typing import Dict, List, Optional
+import copy
+
+from engine.infrastructure.month_cache import MonthCache
+from engine.infrastructure.production_calendar import ProductionCalendar
+from engine.services.generator import CarryState, Generator, MonthResult
+from engine.services.incremental import ChangeSet, diff_configs
+
+
+class IncrementalRunner:
+    """
+    Повторные прогоны одного горизонта после правок (отпуска, нормы, состав).
+
+    run(cfg) сравнивает cfg с прошлым прогоном (diff_configs): месяцы раньше самой ранней
+    затронутой даты возвращаются из памяти без пересчёта; месяц с этой датой и дальше
+    идут через generate_horizon с кэшем — для правки отпуска берётся стадия «после
+    балансировки», а последующие месяцы попадают в кэш, если их CarryState не изменился.
+    Результаты прошлого прогона не должны изменяться вызывающим.
+    """
+
+    def __init__(
+        self,
+        calendar: Optional[ProductionCalendar] = None,
+        cache: Optional[MonthCache] = None,
+        *,
+        validate_baseline: bool = True,
+    ) -> None:
+        self.calendar = calendar
+        self.cache = cache if cache is not None else MonthCache()
+        self.validate_baseline = validate_baseline
+        self.last_change: Optional[ChangeSet] = None
+        self.recomputed: List[str] = []
+        self._cfg: Optional[Dict] = None
+        self._state0: Optional[CarryState] = None
+        self._intern_ids: Optional[List[str]] = None
+        self._results: Dict[str, MonthResult] = {}
+
+    def run(
+        self,
+        cfg: Dict,
+        state0: Optional[CarryState] = None,
+        *,
+        intern_ids: Optional[List[str]] = None,
+    ) -> List[MonthResult]:
+        state0 = state0 or CarryState()
+        gen = Generator(cfg, calendar=self.calendar)
+        if not cfg.get("months"):
+            return []
+        months = gen.configured_months(cfg["months"])
+
+        change = diff_configs(self._cfg, cfg)
+        if self._cfg is not None and (state0 != self._state0 or intern_ids != self._intern_ids):
+            change.touch(Generator.month_bounds(*Generator.ym_to_year_month(months[0]))[0], "state0")
+        first_ym = change.first_ym
+
+        out: List[MonthResult] = []
+        state = state0
+        for ym in months:
+            prev = self._results.get(ym)
+            if prev is None or (first_ym is not None and ym >= first_ym):
+                break
+            out.append(prev)
+            state = prev.state
+
+        self.recomputed = months[len(out):]
+        if self.recomputed:
+            out.extend(
+                gen.generate_horizon(
+                    self.recomputed[0],
+                    self.recomputed[-1],
+                    state,
+                    intern_ids=intern_ids,
+                    validate_baseline=self.validate_baseline,
+                    cache=self.cache,
+                )
+            )
+
+        self.last_change = change
+        self._cfg = copy.deepcopy(cfg)
+        self._state0 = copy.deepcopy(state0)
+        self._intern_ids = list(intern_ids) if intern_ids is not None else None
+        self._results = {res.ym: res for res in out}
+        return out
+
+
+__all__ = ["IncrementalRunner"]
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import os
+import zlib
+
+from engine.domain.schedule import Assignment
+from engine.services.generator import BalancedStage, CarryState, Generator, MonthResult
+from engine.services.instrumentation import OpStats
+
+# Кэш обработанных месяцев на диске, адресуемый содержимым.
+# Ключ — sha256 от всех входов месяца (month_spec с эффективными отпусками, carry_in,
+# хвост и пары прошлого месяца, переработка с начала года, значимые разделы конфига,
+# содержимое календаря, версия движка = хэш исходников engine/domain + engine/services). Значение — итоговая
+# сетка, carry_out, norm_info и логи балансировки в колоночном JSON, сжатом zlib.
+# Вытеснение — LRU по mtime файла с ограничением на суммарный размер каталога.
+# Суммарный размер ведётся в памяти (один скан каталога при первой записи, дальше put
+# его обновляет); полный скан с сортировкой по mtime — только когда итог превысил max_bytes.
+#
+# Кроме итога месяца кэшируется стадия «после балансировки, до отпусков»: она не зависит
+# от отпусков и нормы, поэтому правка отпуска пересчитывает только отпуска, сокращения и пары.
+
+FORMAT_VERSION = 1
+DEFAULT_DIR = Path(__file__).resolve().parents[2] / "instance" / "month_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# Разделы конфига, от которых зависит результат месяца
+CONFIG_SECTIONS = (
+    "employees",
+    "shift_types",
+    "pair_breaking",
+    "monthly_overtime_max",
+    "yearly_overtime_max",
+    "rotation_epoch_policy",
+    "shortening",
+    "validation",
+    "coverage",
+)
+
+_ENGINE_VERSION: Optional[str] = None
+
+
+def engine_version() -> str:
+    """Хэш исходников генерации (engine/domain, engine/services): правка кода инвалидирует кэш."""
+    global _ENGINE_VERSION
+    if _ENGINE_VERSION is None:
+        root = Path(__file__).resolve().parents[1]
+        h = hashlib.sha256()
+        for sub in ("domain", "services"):
+            for path in sorted((root / sub).glob("*.py")):
+                h.update(path.name.encode("utf-8"))
+                h.update(path.read_bytes())
+        _ENGINE_VERSION = h.hexdigest()[:16]
+    return _ENGINE_VERSION
+
+
+def _row(a: Assignment) -> List[object]:
+    return [a.date.isoformat(), a.employee_id, a.shift_key, int(a.effective_hours), a.source, bool(a.recolored_from_night)]
+
+
+def _json_default(value):
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+
+class MonthCache:
+    """Каталог <key>.bin; get/put — по ключу, load/store/key_for — протокол для Generator.generate_horizon."""
+
+    def __init__(self, directory: Optional[Path | str] = None, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = Path(directory) if directory is not None else DEFAULT_DIR
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self._sizes: Optional[Dict[str, int]] = None  # имя файла -> размер; None — каталог ещё не сканировался
+        self._total = 0
+
+    # ---------- Ключ ----------
+    def key_for(
+        self,
+        gen: Generator,
+        month_spec: Dict,
+        state: CarryState,
+        *,
+        intern_ids: Optional[List[str]] = None,
+        validate_baseline: bool = True,
+        stage: str = "final",
+    ) -> str:
+        """stage="final" — итог месяца; stage="balanced" — до отпусков (без отпусков и нормы в ключе)."""
+        vacations = month_spec.get("vacations", {}) or {}
+        if stage == "balanced":
+            spec = {k: v for k, v in month_spec.items() if k not in ("vacations", "norm_hours_month")}
+        else:
+            spec = dict(
+                month_spec,
+                vacations={eid: sorted(d.isoformat() for d in ds) for eid, ds in sorted(vacations.items())},
+            )
+        payload = {
+            "format": FORMAT_VERSION,
+            "stage": stage,
+            "engine": engine_version(),
+            "month_spec": spec,
+            "carry_in": [_row(a) for a in state.carry_in],
+            "prev_tail": state.prev_tail_by_emp,
+            "prev_pairs": [list(p) for p in (state.prev_pairs or [])],
+            "ytd_overtime": state.ytd_overtime if stage != "balanced" else None,
+            "config": {k: gen.cfg.get(k) for k in CONFIG_SECTIONS},
+            "calendar": gen.calendar.to_dict() if gen.calendar and stage != "balanced" else None,
+            "intern_ids": sorted(intern_ids) if intern_ids is not None else None,
+            "validate_baseline": bool(validate_baseline),
+        }
+        blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # ---------- Сырые байты ----------
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.bin"
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # LRU: отметка последнего использования
+        except OSError:
+            pass
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        tmp = path.with_suffix(".tmp")
+        if self._sizes is None:
+            self._scan()
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        sizes = self._sizes if self._sizes is not None else {}
+        self._total += len(data) - sizes.get(path.name, 0)
+        sizes[path.name] = len(data)
+        if self._total > self.max_bytes:
+            self.evict(keep=path)
+
+    def _scan(self) -> List[Tuple[float, int, Path]]:
+        """Перечитывает каталог: (mtime, размер, путь) записей; заодно обновляет учтённый итог."""
+        entries = []
+        sizes: Dict[str, int] = {}
+        for path in self.directory.glob("*.bin"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            sizes[path.name] = st.st_size
+        self._sizes = sizes
+        self._total = sum(sizes.values())
+        return entries
+
+    def evict(self, keep: Optional[Path] = None) -> int:
+        """Удаляет давно не использованные записи, пока каталог больше max_bytes. Возвращает число удалённых."""
+        entries = self._scan()
+        sizes = self._sizes if self._sizes is not None else {}
+        removed = 0
+        for _mtime, size, path in sorted(entries, key=lambda x: x[0]):
+            if self._total <= self.max_bytes:
+                break
+            if keep is not None and path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            sizes.pop(path.name, None)
+            self._total -= size
+            removed += 1
+        return removed
+
+    # ---------- MonthResult ----------
+    def store(self, key: str, res: MonthResult) -> None:
+        self.put(key, encode_month(res))
+
+    def load(self, key: str, gen: Generator, month_spec: Dict, state: CarryState) -> Optional[MonthResult]:
+        data = self.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        try:
+            res = decode_month(data, gen, month_spec, state)
+        except (ValueError, KeyError, TypeError, zlib.error):
+            self.misses += 1  # битая/чужая запись — пересчитаем и перезапишем
+            return None
+        self.hits += 1
+        return res
+
+    def store_stage(self, key: str, stage: BalancedStage) -> None:
+        self.put(key, encode_stage(stage))
+
+    def load_stage(self, key: str) -> Optional[BalancedStage]:
+        data = self.get(key)
+        if data is None:
+            return None
+        try:
+            return decode_stage(data)
+        except (ValueError, KeyError, TypeError, zlib.error):
+            return None
+
+
+# ---------------------------------------------------------------------------
+# Компактная форма: таблицы строк (сотрудники, ключи смен, источники) + строки как
+# плоские массивы индексов; даты — ordinal. JSON → zlib.
+# ---------------------------------------------------------------------------
+
+class _Table:
+    def __init__(self) -> None:
+        self.items: List[str] = []
+        self.index: Dict[str, int] = {}
+
+    def id(self, value: str) -> int:
+        i = self.index.get(value)
+        if i is None:
+            i = len(self.items)
+            self.items.append(value)
+            self.index[value] = i
+        return i
+
+
+class _Rows:
+    """Кодирование строк Assignment: таблицы сотрудников/ключей/источников + плоские массивы по 5 чисел."""
+
+    def __init__(self, emp: Optional[List[str]] = None, keys: Optional[List[str]] = None, src: Optional[List[str]] = None):
+        self.emp, self.keys, self.src = _Table(), _Table(), _Table()
+        for table, items in ((self.emp, emp), (self.keys, keys), (self.src, src)):
+            for item in items or []:
+                table.id(item)
+
+    def flat(self, a: Assignment) -> List[int]:
+        return [
+            self.emp.id(a.employee_id),
+            self.keys.id(a.shift_key),
+            int(a.effective_hours),
+            self.src.id(a.source),
+            int(bool(a.recolored_from_night)),
+        ]
+
+    def unflat(self, d: date, vals: List[int], i: int) -> Assignment:
+        return Assignment(
+            self.emp.items[vals[i]], d, self.keys.items[vals[i + 1]], vals[i + 2], self.src.items[vals[i + 3]], bool(vals[i + 4])
+        )
+
+    def encode_schedule(self, schedule: Dict[date, List[Assignment]]) -> Dict[str, object]:
+        days = sorted(schedule.keys())
+        return {"days": [d.toordinal() for d in days], "rows": [[x for a in schedule[d] for x in self.flat(a)] for d in days]}
+
+    def decode_schedule(self, payload: Dict) -> Dict[date, List[Assignment]]:
+        schedule: Dict[date, List[Assignment]] = {}
+        for ordinal, vals in zip(payload["days"], payload["rows"]):
+            d = date.fromordinal(ordinal)
+            schedule[d] = [self.unflat(d, vals, i) for i in range(0, len(vals), 5)]
+        return schedule
+
+    def tables(self) -> Dict[str, List[str]]:
+        return {"emp": self.emp.items, "keys": self.keys.items, "src": self.src.items}
+
+
+def _pack(payload: Dict) -> bytes:
+    blob = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default)
+    return zlib.compress(blob.encode("utf-8"), 6)
+
+
+def _unpack(data: bytes) -> Dict:
+    payload = json.loads(zlib.decompress(data).decode("utf-8"))
+    if payload.get("v") != FORMAT_VERSION:
+        raise ValueError("month cache format mismatch")
+    return payload
+
+
+def encode_stage(stage: BalancedStage) -> bytes:
+    rows = _Rows()
+    sched = rows.encode_schedule(stage.schedule)
+    return _pack(
+        dict(
+            sched,
+            v=FORMAT_VERSION,
+            baseline_issues=stage.baseline_issues,
+            ops_log=stage.ops_log,
+            apply_log=stage.apply_log,
+            score=[stage.pair_score_before, stage.pair_score_after],
+            pair_stats=stage.pair_stats.to_dict(),
+            **rows.tables(),
+        )
+    )
+
+
+def decode_stage(data: bytes) -> BalancedStage:
+    payload = _unpack(data)
+    rows = _Rows(payload["emp"], payload["keys"], payload["src"])
+    return BalancedStage(
+        schedule=rows.decode_schedule(payload),
+        baseline_issues=payload["baseline_issues"],
+        ops_log=payload["ops_log"],
+        apply_log=payload["apply_log"],
+        pair_score_before=payload["score"][0],
+        pair_score_after=payload["score"][1],
+        pair_stats=OpStats.from_dict(payload["pair_stats"]),
+    )
+
+
+def encode_month(res: MonthResult) -> bytes:
+    rows = _Rows()
+    sched = rows.encode_schedule(res.schedule)
+    carry_out = [[a.date.toordinal()] + rows.flat(a) for a in res.carry_out]
+    norm_info = dict(res.norm_info or {})
+    if "operations" in norm_info:
+        norm_info["operations"] = [
+            dict(op, date=op["date"].toordinal()) if isinstance(op.get("date"), date) else dict(op)
+            for op in norm_info["operations"]
+        ]
+    payload = {
+        "v": FORMAT_VERSION,
+        "ym": res.ym,
+        "days": sched["days"],
+        "rows": sched["rows"],
+        "carry_out": carry_out,
+        "norm_info": norm_info,
+        "baseline_issues": res.baseline_issues,
+        "ops_log": res.ops_log,
+        "apply_log": res.apply_log,
+        "coverage_log": res.coverage_log,
+        "score": [res.pair_score_before, res.pair_score_after],
+        "pair_stats": res.pair_stats.to_dict(),
+        "pairs": [list(p) for p in res.pairs],
+    }
+    payload.update(rows.tables())
+    return _pack(payload)
+
+
+def decode_month(data: bytes, gen: Generator, month_spec: Dict, state: CarryState) -> MonthResult:
+    payload = _unpack(data)
+    rows = _Rows(payload["emp"], payload["keys"], payload["src"])
+    schedule = rows.decode_schedule(payload)
+    carry_out = [rows.unflat(date.fromordinal(vals[0]), vals[1:], 0) for vals in payload["carry_out"]]
+
+    norm_info = payload["norm_info"]
+    if "operations" in norm_info:
+        norm_info["operations"] = [
+            dict(op, date=date.fromordinal(op["date"])) if isinstance(op.get("date"), int) else op
+            for op in norm_info["operations"]
+        ]
+    pairs = [tuple(p) for p in payload["pairs"]]
+    employees = gen.build_employees(state.ytd_overtime)
+    return MonthResult(
+        ym=payload["ym"],
+        month_spec=month_spec,
+        employees=employees,
+        schedule=schedule,
+        carry_in=state.carry_in,
+        carry_out=carry_out,
+        vacations=month_spec.get("vacations", {}) or {},
+        norm_info=norm_info,
+        baseline_issues=payload["baseline_issues"],
+        ops_log=payload["ops_log"],
+        apply_log=payload["apply_log"],
+        pair_score_before=payload["score"][0],
+        pair_score_after=payload["score"][1],
+        pair_stats=OpStats.from_dict(payload["pair_stats"]),
+        pairs=pairs,
+        state=gen.next_state(state, employees, schedule, carry_out, pairs, norm_info),
+        coverage_log=payload.get("coverage_log", []),
+    )
+
+
+__all__ = [
+    "MonthCache",
+    "encode_month",
+    "decode_month",
+    "encode_stage",
+    "decode_stage",
+    "engine_version",
+]
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import os
+
+from engine.services.generator import Generator, MonthResult
+
+# Журнал переработки по сотрудникам: часы, норма и переработка каждого месяца плюс
+# остаток на начало года (ytd_overtime первого записанного месяца года).
+# Годовые итоги ведутся инкрементально: запись или исправление месяца меняет итог на
+# разницу старой и новой переработки, поэтому YTD отвечает за O(1), а исправленный месяц
+# не требует повторного прохода по году. Хранение — JSON-файл (атомарная запись).
+
+
+@dataclass
+class LedgerEntry:
+    hours: int
+    norm: int
+    overtime: int
+    ytd_start: int  # переработка с начала года на 1-е число месяца (как её видел генератор)
+
+
+def overtime_of(hours: int, norm: int) -> int:
+    """Переработка месяца — как в ShiftShortener/отчёте норм: часы сверх нормы, не меньше 0."""
+    return max(0, hours - norm) if norm else 0
+
+
+class OvertimeLedger:
+    """
+    record_month/record_result — записать (или перезаписать) месяц;
+    ytd(eid, year) — переработка за год по всем записанным месяцам;
+    ytd_before(eid, ym) — на 1-е число месяца; ytd_state(ym, ids) — вход для
+    CarryState.ytd_overtime (Generator.generate_horizon берёт его из журнала, если он передан).
+    """
+
+    def __init__(self, path: Optional[Path | str] = None) -> None:
+        self.path = Path(path) if path is not None else None
+        self._months: Dict[str, Dict[str, LedgerEntry]] = {}  # ym -> сотрудник -> запись
+        self._by_year: Dict[Tuple[str, int], List[int]] = {}  # (сотрудник, год) -> переработка по месяцам
+        self._totals: Dict[Tuple[str, int], int] = {}  # (сотрудник, год) -> сумма _by_year
+        self._opening: Dict[Tuple[str, int], Tuple[int, int]] = {}  # (сотрудник, год) -> (первый месяц, остаток)
+
+    # ---------- Запись ----------
+    def record_month(self, ym: str, rows: Dict[str, Tuple[int, int, int]]) -> None:
+        """
+        rows: сотрудник -> (часы, норма, ytd на начало месяца). Месяц заменяется целиком:
+        сотрудники, которых нет в rows, из месяца удаляются.
+        """
+        year, month = Generator.ym_to_year_month(ym)
+        old = self._months.pop(ym, {})
+        for eid in old:
+            if eid not in rows:
+                self._set(eid, year, month, None)
+        fresh: Dict[str, LedgerEntry] = {}
+        for eid, (hours, norm, ytd_start) in rows.items():
+            entry = LedgerEntry(int(hours), int(norm), overtime_of(int(hours), int(norm)), int(ytd_start))
+            fresh[eid] = entry
+            self._set(eid, year, month, entry)
+        self._months[ym] = fresh
+
+    def record_result(self, res: MonthResult) -> None:
+        """Итог месяца генератора: часы из norm_info["per_employee"], ytd — с сотрудников месяца."""
+        norm = int(res.norm_info.get("norm_hours") or 0)
+        per_employee = res.norm_info.get("per_employee", {}) or {}
+        rows: Dict[str, Tuple[int, int, int]] = {}
+        for e in res.employees:
+            if e.id not in rows:
+                rows[e.id] = (int(per_employee.get(e.id, {}).get("hours", 0)), norm, e.ytd_overtime)
+        self.record_month(res.ym, rows)
+
+    def correct(self, ym: str, employee_id: str, hours: int, norm: Optional[int] = None) -> LedgerEntry:
+        """Исправить часы одного сотрудника в уже записанном месяце (норма по умолчанию прежняя)."""
+        entry = self._months.get(ym, {}).get(employee_id)
+        if entry is None:
+            raise KeyError(f"{employee_id}: month {ym} is not in the ledger")
+        year, month = Generator.ym_to_year_month(ym)
+        norm = entry.norm if norm is None else int(norm)
+        fixed = LedgerEntry(int(hours), norm, overtime_of(int(hours), norm), entry.ytd_start)
+        self._months[ym][employee_id] = fixed
+        self._set(employee_id, year, month, fixed)
+        return fixed
+
+    def _set(self, eid: str, year: int, month: int, entry: Optional[LedgerEntry]) -> None:
+        key = (eid, year)
+        months = self._by_year.setdefault(key, [0] * 12)
+        new = entry.overtime if entry is not None else 0
+        self._totals[key] = self._totals.get(key, 0) - months[month - 1] + new
+        months[month - 1] = new
+        first = self._opening.get(key)
+        if entry is not None:
+            if first is None or month <= first[0]:
+                self._opening[key] = (month, entry.ytd_start)
+        elif first is not None and first[0] == month:
+            # удалён первый месяц года — остаток берём со следующего записанного (до 11 проверок)
+            self._opening.pop(key)
+            for m in range(month + 1, 13):
+                nxt = self._months.get(f"{year:04d}-{m:02d}", {}).get(eid)
+                if nxt is not None:
+                    self._opening[key] = (m, nxt.ytd_start)
+                    break
+
+    # ---------- Запросы ----------
+    def month(self, ym: str) -> Dict[str, LedgerEntry]:
+        return dict(self._months.get(ym, {}))
+
+    def months(self) -> List[str]:
+        return sorted(self._months)
+
+    def ytd(self, employee_id: str, year: int) -> int:
+        """Переработка за год: остаток на начало + записанные месяцы. O(1)."""
+        key = (employee_id, year)
+        first = self._opening.get(key)
+        return (first[1] if first else 0) + self._totals.get(key, 0)
+
+    def ytd_before(self, employee_id: str, ym: str) -> int:
+        """Переработка на 1-е число месяца ym (не больше 11 слагаемых)."""
+        year, month = Generator.ym_to_year_month(ym)
+        key = (employee_id, year)
+        first = self._opening.get(key)
+        if first is None:
+            return 0
+        if month <= first[0]:
+            return first[1]
+        return first[1] + sum(self._by_year[key][first[0] - 1 : month - 1])
+
+    def covers(self, employee_id: str, ym: str) -> bool:
+        """Записаны ли все месяцы года до ym (от первого записанного) — тогда ytd_before полон."""
+        year, month = Generator.ym_to_year_month(ym)
+        first = self._opening.get((employee_id, year))
+        if first is None or first[0] >= month:
+            return False
+        return all(
+            employee_id in self._months.get(f"{year:04d}-{m:02d}", {}) for m in range(first[0], month)
+        )
+
+    def ytd_state(self, ym: str, employee_ids: Iterable[str]) -> Dict[str, int]:
+        """
+        CarryState.ytd_overtime для месяца ym — пересчёт месяца без прохода по году.
+        Только сотрудники, у которых журнал покрывает предыдущие месяцы года (covers);
+        исправление месяца (correct) так доходит до следующих месяцев при перезапуске.
+        """
+        return {eid: self.ytd_before(eid, ym) for eid in employee_ids if self.covers(eid, ym)}
+
+    # ---------- Файл ----------
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "months": {
+                ym: {
+                    eid: [e.hours, e.norm, e.ytd_start]
+                    for eid, e in sorted(rows.items())
+                }
+                for ym, rows in sorted(self._months.items())
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict, path: Optional[Path | str] = None) -> "OvertimeLedger":
+        ledger = cls(path)
+        for ym, rows in (payload.get("months") or {}).items():
+            ledger.record_month(ym, {eid: (v[0], v[1], v[2]) for eid, v in rows.items()})
+        return ledger
+
+    @classmethod
+    def load(cls, path: Path | str) -> "OvertimeLedger":
+        """Журнал из файла; нет файла — пустой журнал с этим путём."""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        return cls.from_dict(payload, path)
+
+    def save(self, path: Optional[Path | str] = None) -> Path:
+        target = Path(path) if path is not None else self.path
+        if target is None:
+            raise ValueError("OvertimeLedger.save: no path")
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=1)
+        os.replace(tmp, target)
+        return target
+
+
+__all__ = ["LedgerEntry", "OvertimeLedger", "overtime_of"]
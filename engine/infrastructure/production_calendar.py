@@ -58,6 +58,14 @@ class ProductionCalendar:
         default_path = base_dir / "data" / "production_calendar_2025.json"
         return cls.from_json(default_path)
 
+    def to_dict(self) -> Dict[str, object]:
+        """Содержимое календаря в формате from_json (ключи норм — "YYYY-MM", даты — ISO, отсортированы)."""
+        return {
+            "monthly_norm_hours": {f"{y:04d}-{m:02d}": v for (y, m), v in sorted(self._monthly_norms.items())},
+            "off_dates": sorted(d.isoformat() for d in self._off_dates),
+            "working_overrides": sorted(d.isoformat() for d in self._working_overrides),
+        }
+
     def norm_hours(self, year: int, month: int) -> Optional[int]:
         return self._monthly_norms.get((year, month))
 
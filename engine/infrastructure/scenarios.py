@@ -2,7 +2,7 @@
 from __future__ import annotations
 from datetime import date, timedelta
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterable, List, Tuple, Optional
 import sys
 from glob import glob
 import json
@@ -11,15 +11,16 @@ if not __package__:
     sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
 
 from engine.domain.schedule import Assignment
+from engine.infrastructure.checkpoints import CheckpointError, CheckpointStore, config_fingerprint
 from engine.infrastructure.config import CONFIG as BASE_CONFIG
+from engine.infrastructure.month_cache import MonthCache
+from engine.infrastructure.overtime_ledger import OvertimeLedger
 from engine.infrastructure.production_calendar import ProductionCalendar
 from engine.presentation import report
-from engine.services.generator import Generator
-from engine.services import pairing
-from engine.services import balancer
-from engine.services import postprocess
 from engine.services import validator
-from engine.services import coverage as cov
+from engine.services.diagnostics import MonthDiagnostics
+from engine.services.generator import CarryState, Generator
+from engine.services.vacations import VacationIndex
 
 # ---------------------------------------------------------------------------
 # Вспомогательные утилиты
@@ -114,49 +115,39 @@ def month_bounds(gen: Generator, ym: str) -> Tuple[date, date]:
 def aggregate_effective_vacations(cfg_months: List[dict], current_ym: str, gen: Generator, current_emp_ids: set[str]) -> Dict[str, List[date]]:
     """Собираем ВСЕ отпуска из всех month_spec, но возвращаем только те даты, что попадают в current_ym и по существующим сотрудникам."""
     d0, d1 = month_bounds(gen, current_ym)
-    eff: Dict[str, List[date]] = {}
-    for ms in cfg_months:
-        vac = ms.get("vacations", {}) or {}
-        for eid, dates in vac.items():
-            if eid not in current_emp_ids: continue
-            for dt in dates:
-                if d0 <= dt <= d1:
-                    eff.setdefault(eid, []).append(dt)
-    return {eid: sorted(set(ds)) for eid, ds in eff.items()}
-
-def synthetic_prev_tail_and_carry_in(first_day: date, existing_ids: set[str], gen: Generator):
-    """Синтетический хвост (28–31 июля) + переносы на 1-е число первого месяца; фильтруем по существующим сотрудникам."""
-    prev_tail_by_emp = {
-        "E01": ["OFF","DB","OFF","OFF"],
-        "E02": ["OFF","OFF","OFF","DA"],
-        "E03": ["DA","OFF","NA","OFF"],
-        "E04": ["DA","OFF","OFF","N4A"],
-        "E05": ["OFF","DA","OFF","OFF"],
-        "E06": ["OFF","OFF","OFF","DB"],
-        "E07": ["DB","OFF","NB","OFF"],  # без переноса
-        "E08": ["DB","OFF","OFF","N4B"],
-    }
-    prev_tail_by_emp = {eid: tail for eid, tail in prev_tail_by_emp.items() if eid in existing_ids}
-    carry_in = []
-    if "E04" in existing_ids:
-        carry_in.append(Assignment("E04", first_day, "n8_a", gen.shift_types["n8_a"].hours, source="template"))
-    if "E08" in existing_ids:
-        carry_in.append(Assignment("E08", first_day, "n8_b", gen.shift_types["n8_b"].hours, source="template"))
+    return VacationIndex.from_months(cfg_months).window(d0, d1, emp_ids=current_emp_ids)
+
+# Шаблон хвоста (4 последних дня прошлого месяца) по позиции сотрудника в списке:
+# фазы на 1-е D/N/O3/O2 (O2 — через перенос N8* на 1-е), дневные офисы A и B поровну.
+# Для E01–E08 по порядку это исходная фикстура сценариев.
+_TAIL_TEMPLATE: List[Tuple[List[str], Optional[str]]] = [
+    (["OFF", "DB", "OFF", "OFF"], None),
+    (["OFF", "OFF", "OFF", "DA"], None),
+    (["DA", "OFF", "NA", "OFF"], None),
+    (["DA", "OFF", "OFF", "N4A"], "n8_a"),
+    (["OFF", "DA", "OFF", "OFF"], None),
+    (["OFF", "OFF", "OFF", "DB"], None),
+    (["DB", "OFF", "NB", "OFF"], None),  # без переноса
+    (["DB", "OFF", "OFF", "N4B"], "n8_b"),
+]
+
+
+def synthetic_prev_tail_and_carry_in(first_day: date, roster: Iterable[str], gen: Generator):
+    """
+    Синтетический хвост + переносы N8* на 1-е число первого месяца для всего штата:
+    сотрудник на позиции i получает слот _TAIL_TEMPLATE[i % 8] (roster — id по порядку).
+    """
+    prev_tail_by_emp: Dict[str, List[str]] = {}
+    carry_in: List[Assignment] = []
+    for i, eid in enumerate(dict.fromkeys(roster)):
+        tail, carry_key = _TAIL_TEMPLATE[i % len(_TAIL_TEMPLATE)]
+        prev_tail_by_emp[eid] = list(tail)
+        if carry_key is not None:
+            carry_in.append(Assignment(eid, first_day, carry_key, gen.shift_types[carry_key].hours, source="template"))
     return prev_tail_by_emp, carry_in
 
 def extract_tail(schedule, employees, gen: Generator) -> Dict[str, List[str]]:
-    dates = sorted(schedule.keys())
-    tail_dates = dates[-4:] if len(dates) >= 4 else dates
-    prev_tail_by_emp: Dict[str, List[str]] = {}
-    for e in employees:
-        codes = []
-        for d in tail_dates:
-            for r in schedule[d]:
-                if r.employee_id == e.id:
-                    codes.append(gen.code_of(r.shift_key))
-                    break
-        prev_tail_by_emp[e.id] = codes
-    return prev_tail_by_emp
+    return gen.extract_tail(schedule, employees)
 
 # ---------------------------------------------------------------------------
 # Сценарии
@@ -242,11 +233,12 @@ def build_config_from_scenario(base_cfg: dict, scn: dict) -> Tuple[dict, List[st
     else:
         intern_ids = [e.get("id") for e in cfg.get("employees", []) if e.get("is_trainee")]
 
-    # pair breaking overrides
-    pair_breaking_cfg = dict(cfg.get("pair_breaking", {}) or {})
-    for k, v in (scn_cfg.get("pair_breaking", {}) or {}).items():
-        pair_breaking_cfg[k] = v
-    cfg["pair_breaking"] = pair_breaking_cfg
+    # pair breaking overrides (и прочие разделы-словари: ключи сценария поверх базовых)
+    for section in ("pair_breaking", "diagnostics", "validation"):
+        section_cfg = dict(cfg.get(section, {}) or {})
+        for k, v in (scn_cfg.get(section, {}) or {}).items():
+            section_cfg[k] = v
+        cfg[section] = section_cfg
 
     # months
     months_spec = scn_cfg.get("months") or []
@@ -292,7 +284,14 @@ def build_config_from_scenario(base_cfg: dict, scn: dict) -> Tuple[dict, List[st
 # Запуск одного сценария
 # ---------------------------------------------------------------------------
 
-def run_scenario(scn: dict, out_root: Path):
+def run_scenario(
+    scn: dict,
+    out_root: Path,
+    cache: Optional[MonthCache] = None,
+    *,
+    resume: bool = False,
+    from_month: Optional[str] = None,
+):
     # 0) базовый конфиг + JSON-переопределения
     cfg2, intern_ids = build_config_from_scenario(BASE_CONFIG, scn)
 
@@ -319,91 +318,65 @@ def run_scenario(scn: dict, out_root: Path):
     out_dir = out_root / scn["name"]
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    # 3) state: хвост + переносы + анти-соло
-    prev_tail_by_emp = {}
-    carry_in = []
-    solo_months_counter: Dict[str,int] = {}
+    # 3) state: синтетический хвост + переносы для первого месяца
+    if not cfg2["months"]:
+        print(f"[SCENARIO DONE] {scn['name']} → {out_dir}")
+        return
+    month_list = gen.configured_months(cfg2["months"])
+    first_ym, last_ym = month_list[0], month_list[-1]
+    y0, m0 = map(int, first_ym.split("-"))
+    prev_tail0, carry_in0 = synthetic_prev_tail_and_carry_in(date(y0, m0, 1), [rec["id"] for rec in cfg2["employees"]], gen)
+    state = CarryState(
+        prev_tail_by_emp=prev_tail0,
+        carry_in=carry_in0,
+        prev_pairs=scn.get("prev_pairs_for_month") or scn.get("prev_pairs") or None,
+    )
     prev_pairs_for_month: Optional[List[Tuple[str, str, int, int]]] = None
 
-    # 4) по месяцам
-    for idx, month_spec in enumerate(cfg2["months"]):
-        ym = month_spec["month_year"]
-        y, m = map(int, ym.split("-"))
-        first_day = date(y, m, 1)
-        current_emp_ids = {rec["id"] for rec in cfg2["employees"]}
-
-        # синтетический хвост только для первого месяца
-        if idx == 0:
-            prev_tail_by_emp, carry_in = synthetic_prev_tail_and_carry_in(first_day, current_emp_ids, gen)
-
-        # эффективные отпуска (только попавшие в этот месяц)
-        eff_vacations = aggregate_effective_vacations(cfg2["months"], ym, gen, current_emp_ids)
-        month_spec_eff = dict(month_spec)
-        month_spec_eff["vacations"] = eff_vacations  # применим пост-цветом, но оставим в логах
-
-        # генерация
-        employees, schedule, carry_out = gen.generate_month(
-            month_spec_eff,
-            carry_in=carry_in,
-            prev_tail_by_emp=prev_tail_by_emp
-        )
-
-        # baseline-validator до балансировки
-        baseline_issues = validator.validate_baseline(ym, employees, schedule, gen.code_of, gen=None, ignore_vacations=True)
-
-        # балансировка пар (safe-mode в начале месяца)
-        pairs_before = pairing.compute_pairs(schedule, gen.code_of)
-        pb_cfg = dict(cfg2.get("pair_breaking", {}) or {})
-        prev_pairs_hint = scn.get("prev_pairs_for_month") or scn.get("prev_pairs") or prev_pairs_for_month or []
-        pb_cfg.setdefault("prev_pairs", prev_pairs_hint)
-        if "intern_ids" in scn:
-            pb_cfg["intern_ids"] = scn["intern_ids"]
-        schedule_balanced, ops_log, _solo_after, pair_score_before, pair_score_after, apply_log = balancer.apply_pair_breaking(
-            schedule,
-            employees,
-            gen.code_of,
-            pb_cfg,
-        )
+    # 3.1) чекпоинты границ месяцев: --resume / --from-month продолжают с сохранённого состояния
+    checkpoints = CheckpointStore(
+        out_dir / "checkpoints",
+        config_fingerprint(cfg2, calendar=calendar, intern_ids=scn.get("intern_ids"), state0=state),
+    )
+    start_ym, state = checkpoints.start_point(month_list, state, resume=resume, from_month=from_month)
+    if start_ym is None:
+        print(f"[checkpoints] {scn['name']}: all months up to {last_ym} are done")
+        print(f"[SCENARIO DONE] {scn['name']} → {out_dir}")
+        return
+    if start_ym != first_ym:
+        print(f"[checkpoints] {scn['name']}: continue from {start_ym}")
+        prev_pairs_for_month = state.prev_pairs
+
+    # 3.2) журнал переработки: часы/переработка по месяцам, пополняется по мере готовности месяцев
+    ledger = OvertimeLedger.load(out_dir / "overtime_ledger.json")
+
+    # 4) по месяцам — поток из генератора горизонта
+    months = gen.generate_horizon(
+        start_ym,
+        last_ym,
+        state,
+        intern_ids=scn["intern_ids"] if "intern_ids" in scn else None,
+        cache=cache,
+        ledger=ledger,
+    )
+    for res in months:
+        ym = res.ym
+        employees, schedule = res.employees, res.schedule
+        carry_in, carry_out = res.carry_in, res.carry_out
+        eff_vacations = res.vacations
+        # baseline итогового расписания: кэш проверки сгенерированной сетки + перепроверка изменённых
+        baseline_issues = [validator.format_issue(x) for x in gen.final_issues(res)]
+        ops_log, apply_log = res.ops_log, res.apply_log
+        pair_score_before, pair_score_after = res.pair_score_before, res.pair_score_after
         print(
             f"[pairs.score] before={pair_score_before} after={pair_score_after} "
             f"Δ={pair_score_after - pair_score_before}"
         )
-        if cfg2.get("pair_breaking", {}).get("enabled", False):
-            schedule = schedule_balanced
-
-        # пост-перекраска отпусков (VAC8/VAC0)
-        postprocess.apply_vacations(schedule, eff_vacations, gen.shift_types)
-
-        # пересчёт carry_out после всех сдвигов
-        if schedule:
-            last_day = max(schedule.keys())
-            next_year = last_day.year + (1 if last_day.month == 12 else 0)
-            next_month = 1 if last_day.month == 12 else last_day.month + 1
-            new_carry_out: List[Assignment] = []
-            for entry in schedule[last_day]:
-                code = gen.code_of(entry.shift_key).upper()
-                if code in {"N4A", "N4B"}:
-                    key = "n8_a" if code.endswith("A") else "n8_b"
-                    st = gen.shift_types[key]
-                    new_carry_out.append(
-                        Assignment(
-                            entry.employee_id,
-                            date(next_year, next_month, 1),
-                            key,
-                            st.hours,
-                            source="autofix",
-                        )
-                    )
-            carry_out = new_carry_out
-
-        # -------- СЛОЙ СОКРАЩЕНИЙ (ПОСЛЕДНИМ) --------
-        raw_norm = month_spec.get("norm_hours_month")
-        norm = int(raw_norm) if raw_norm is not None else int(calendar.norm_hours(y, m) or 0)
-        gen.enforce_hours_caps(employees, schedule, norm, ym)
 
-        # валидации и диагностика (уже после сокращений)
-        smoke = validator.coverage_smoke(ym, schedule, gen.code_of, first_days=cfg2.get("pair_breaking",{}).get("window_days",6)+2)
-        trace = validator.phase_trace(ym, employees, schedule, gen.code_of, gen=None, days=10)
+        # диагностика (уже после сокращений) — лениво, по мере запроса секциями лога
+        diag = MonthDiagnostics.for_result(
+            res, gen.code_of, cfg2, smoke_days=cfg2.get("pair_breaking", {}).get("window_days", 6) + 2
+        )
 
         # отчёты
         base = f"{scn['name']}_{ym}"
@@ -417,7 +390,7 @@ def run_scenario(scn: dict, out_root: Path):
         report.write_metrics_employees_csv(str(metrics_emp_path), employees, schedule)
         report.write_metrics_days_csv(str(metrics_days_path), schedule)
 
-        norm_info = gen.last_norms_info() or {}
+        norm_info = res.norm_info
         norms_path = out_dir / f"{base}_norms.txt"
         _, norm_warnings, _ = report.write_norms_report(
             str(norms_path),
@@ -427,14 +400,14 @@ def run_scenario(scn: dict, out_root: Path):
             norm_info,
         )
 
-        pairs_after = pairing.compute_pairs(schedule, gen.code_of)
+        pairs_after = res.pairs
         pairs_path = out_dir / f"{base}_pairs.csv"
         report.write_pairs_csv(str(pairs_path), pairs_after, employees)
 
         # лог
         log_lines = []
-        if idx == 0 and prev_tail_by_emp:
-            log_lines.append(f"[bootstrap] synthetic prev_tail for first month (employees={len(prev_tail_by_emp)})")
+        if ym == first_ym and prev_tail0:
+            log_lines.append(f"[bootstrap] synthetic prev_tail for first month (employees={len(prev_tail0)})")
         if carry_in:
             ap = ", ".join([f"{a.employee_id}={gen.code_of(a.shift_key)}" for a in carry_in])
             log_lines.append(f"[carry_in] {ym}-01: {ap}")
@@ -447,9 +420,10 @@ def run_scenario(scn: dict, out_root: Path):
             if ops_log:
                 log_lines.append("[pair_breaking.ops]")
                 log_lines.extend([f" - {x}" for x in ops_log])
-            log_lines.append("[coverage.smoke.first-days]")
-            for row in smoke:
-                log_lines.append(f" {row[0]}: DA={row[1]} DB={row[2]} NA={row[3]} NB={row[4]}")
+            if diag.enabled("coverage_smoke"):
+                log_lines.append("[coverage.smoke.first-days]")
+                for row in diag.get("coverage_smoke"):
+                    log_lines.append(f" {row[0]}: DA={row[1]} DB={row[2]} NA={row[3]} NB={row[4]}")
         if carry_out:
             co = ", ".join([f"{a.employee_id}={gen.code_of(a.shift_key)}@{a.date.isoformat()}" for a in carry_out])
             log_lines.append(f"[carry_out] to next month: {co}")
@@ -459,9 +433,21 @@ def run_scenario(scn: dict, out_root: Path):
                 vlines.append(f"{eid}: {', '.join(sorted({d.isoformat() for d in ds}))}")
             log_lines.append("[vacations.effective]")
             log_lines.extend(vlines)
+        max_vac = int((cfg2.get("validation", {}) or {}).get("max_concurrent_vacations", 0) or 0)
+        if max_vac > 0:
+            conflicts = gen.vacation_index().conflicts(
+                max_vac, *month_bounds(gen, ym), emp_ids=[e.id for e in employees]
+            )
+            if conflicts:
+                log_lines.append("[vacations.conflicts]")
+                log_lines.extend([f" - {x}" for x in conflicts])
+        if res.coverage_log:
+            log_lines.append("[coverage.repair]")
+            log_lines.extend([f" - {x}" for x in res.coverage_log])
         if baseline_issues:
             log_lines.append("[validator.baseline.issues]")
             log_lines.extend([f" - {x}" for x in baseline_issues])
+        trace = diag.get("phase_trace", [])
         if trace:
             log_lines.append("[diagnostics.phase_trace.first10]")
             log_lines.extend([f" {ln}" for ln in trace])
@@ -481,6 +467,8 @@ def run_scenario(scn: dict, out_root: Path):
                 log_lines.append(f" - {msg}")
         log_path = out_dir / f"{base}_log.txt"
         report.write_log_txt(str(log_path), log_lines)
+        if cfg2.get("pair_breaking", {}).get("enabled", False):
+            res.pair_stats.write_json(str(out_dir / f"{base}_balancer_stats.json"))
 
         pb_cfg = cfg2.get("pair_breaking", {}) or {}
         threshold_day = int(pb_cfg.get("overlap_threshold", 8))
@@ -512,30 +500,29 @@ def run_scenario(scn: dict, out_root: Path):
 
         prev_pairs_for_month = pairs_after
         scn["prev_pairs_for_month"] = prev_pairs_for_month
-
-        # хвост → следующий месяц
-        prev_tail_by_emp = extract_tail(schedule, employees, gen)
-        carry_in = carry_out
-
-        # анти-соло счётчик: если в месяце были соло-дни — инкремент сотруднику
-        solo_days = cov.solo_days_by_employee(schedule, gen.code_of)
-        solo_emp_ids = {eid for eid, cnt in solo_days.items() if cnt > 0}
-        for e in employees:
-            if e.id in solo_emp_ids:
-                solo_months_counter[e.id] = solo_months_counter.get(e.id, 0) + 1
-            else:
-                solo_months_counter.setdefault(e.id, 0)
+        checkpoints.save(ym, res.state)
+        ledger.save()
 
     print(f"[SCENARIO DONE] {scn['name']} → {out_dir}")
 
 # ---------------------------------------------------------------------------
 # MAIN
 # ---------------------------------------------------------------------------
-def main():
+def main(argv: Optional[List[str]] = None):
     """
     Новая точка входа: запускаем все сценарии из ./scenarios/*.json.
     Никаких закодированных сценариев в модуле не остаётся.
+
+    --resume           продолжить каждый сценарий после последнего сохранённого месяца
+    --from-month YYYY-MM  пересчитать с указанного месяца (нужен чекпоинт предыдущего)
     """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Прогон сценариев из scenario_presets")
+    parser.add_argument("--resume", action="store_true", help="продолжить после последнего чекпоинта")
+    parser.add_argument("--from-month", dest="from_month", default=None, help="YYYY-MM: начать с этого месяца")
+    args = parser.parse_args(argv)
+
     base_dir = Path(__file__).parent
     scn_dir = SCENARIOS_DIR
     out_root = base_dir / "reports"
@@ -546,10 +533,16 @@ def main():
         print(f"[scenarios] no JSON scenarios found in {scn_dir}")
         return
 
+    # Кэш обработанных месяцев: неизменившиеся месяцы не пересчитываются при повторном прогоне
+    cache = MonthCache()
     for scn in scenarios:
         print(f"[scenarios] run: {scn.get('name','<unnamed>')}")
         # Вызов вашей существующей оркестрации: базовый генератор + балансировка + отчёты
-        run_scenario(scn, out_root)
+        try:
+            run_scenario(scn, out_root, cache=cache, resume=args.resume, from_month=args.from_month)
+        except CheckpointError as exc:
+            print(f"[checkpoints] {scn.get('name','<unnamed>')}: {exc}")
+    print(f"[month_cache] hits={cache.hits} misses={cache.misses} dir={cache.directory}")
 
 
 if __name__ == "__main__":
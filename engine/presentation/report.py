@@ -1,10 +1,12 @@
 from __future__ import annotations
 from datetime import date
-from typing import Dict, List, Tuple, Optional, TYPE_CHECKING
+from typing import Dict, Iterable, List, Tuple, Optional, TYPE_CHECKING
 import csv
+import json
 import os
 from collections import defaultdict
 
+from engine.services import hours as hours_engine
 from engine.services import pairing
 
 from openpyxl import Workbook
@@ -120,22 +122,30 @@ def write_excel_grid(
     return path
 
 
+def _codes_by_day(schedule: Dict[date, List]) -> Dict[date, Dict[str, str]]:
+    """Дата -> {сотрудник: код}; при дублях берём первую строку (как прежний поиск по строкам дня)."""
+    out: Dict[date, Dict[str, str]] = {}
+    for d, rows in schedule.items():
+        by_emp: Dict[str, str] = {}
+        for r in rows:
+            if r.employee_id not in by_emp:
+                by_emp[r.employee_id] = _code_of(r.shift_key)
+        out[d] = by_emp
+    return out
+
+
 def write_csv_grid(path: str, ym: str, employees: List, schedule: Dict[date, List]):
     """CSV-сетка для простого анализа: первая колонка — сотрудник, первая строка — даты (числа)."""
     dates = sorted(schedule.keys())
     employees_sorted = sorted(employees, key=lambda e: e.id)
+    codes = _codes_by_day(schedule)
     with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["Сотрудник"] + [d.day for d in dates])
         for e in employees_sorted:
             row = [f"{e.id} — {e.name}"]
             for d in dates:
-                code = ""
-                for r in schedule[d]:
-                    if r.employee_id == e.id:
-                        code = _code_of(r.shift_key)
-                        break
-                row.append(code)
+                row.append(codes[d].get(e.id, ""))
             w.writerow(row)
     return path
 
@@ -169,29 +179,10 @@ def write_metrics_days_csv(path: str, schedule: Dict[date, List]):
 
 
 def write_metrics_employees_csv(path: str, employees: List, schedule: Dict[date, List]):
-    """По сотрудникам: суммарные часы и количество D/N/O (VAC → O)."""
-
-    def tok(code: str) -> str:
-        c = (code or "").upper()
-        if c in {"DA", "DB", "M8A", "M8B", "E8A", "E8B"}:
-            return "D"
-        if c in {"NA", "NB", "N4A", "N4B", "N8A", "N8B"}:
-            return "N"
-        return "O"
-
+    """По сотрудникам: суммарные часы и количество D/N/O (VAC → O) — из общей таблицы часов."""
     emp_name = {e.id: e.name for e in employees}
-    stats = {e.id: {"hours": 0, "D": 0, "N": 0, "O": 0} for e in employees}
-    known_ids = set(stats.keys())
-
-    for d, rows in schedule.items():
-        per_emp: Dict[str, Tuple[str, int]] = {}
-        for a in rows:
-            if a.employee_id not in known_ids:
-                continue
-            per_emp[a.employee_id] = (_code_of(a.shift_key), a.effective_hours)
-        for eid, (code, hrs) in per_emp.items():
-            stats[eid]["hours"] += int(hrs)
-            stats[eid][tok(code)] += 1
+    table = hours_engine.build_hours(schedule, _code_of, emp_ids=emp_name)
+    stats = {eid: dict(table.token_counts[eid], hours=table.totals[eid]) for eid in emp_name}
 
     with open(path, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
@@ -208,10 +199,7 @@ def _build_norms_summary(employees: List, schedule: Dict[date, List], norm_info:
     monthly_cap = int(norm_info.get("monthly_cap") or (norm_hours + monthly_allowance if norm_hours else 0))
     yearly_cap = int(norm_info.get("yearly_cap") or 0)
 
-    hours_by_emp: Dict[str, int] = {}
-    for rows in schedule.values():
-        for assn in rows:
-            hours_by_emp[assn.employee_id] = hours_by_emp.get(assn.employee_id, 0) + int(assn.effective_hours)
+    hours_by_emp = hours_engine.hours_by_employee(schedule, _code_of)
 
     rows_summary: List[Dict[str, object]] = []
     warnings: List[str] = []
@@ -304,6 +292,12 @@ def write_norms_report(
         else:
             f.write("- нет\n")
 
+        mismatches = norm_info.get("hours_mismatches") or []
+        if mismatches:
+            f.write("\nРасхождения часов (effective_hours ≠ часы по коду смены):\n")
+            for msg in mismatches:
+                f.write(f"- {msg}\n")
+
         f.write("\nПредупреждения:\n")
         if warnings:
             for msg in warnings:
@@ -580,6 +574,16 @@ def write_log_txt(path: str, lines: List[str]):
     return path
 
 
+def write_issues_jsonl(path: str, issues: Iterable) -> Tuple[str, int]:
+    """Нарушения проверок (validator.ValidationIssue) построчно в JSONL, по мере поступления из итератора."""
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for issue in issues:
+            f.write(json.dumps(issue.to_dict(), ensure_ascii=False) + "\n")
+            count += 1
+    return path, count
+
+
 # ------------------- ГРИД -------------------
 
 def _is_weekend_or_off(dt: date, calendar: "ProductionCalendar" | None) -> bool:
@@ -614,17 +618,14 @@ def _write_grid(
 
     # Тело
     employees_sorted = sorted(employees, key=lambda e: e.id)
+    codes = _codes_by_day(schedule)
     for i, e in enumerate(employees_sorted, start=2):
         c = ws.cell(row=i, column=1, value=f"{e.id} — {e.name}")
         c.font = HEADER_FONT
         c.alignment = LEFT
         c.border = B_THIN
         for j, d in enumerate(dates, start=2):
-            code = ""
-            for r in schedule[d]:
-                if r.employee_id == e.id:
-                    code = _code_of(r.shift_key)
-                    break
+            code = codes[d].get(e.id, "")
             cell = ws.cell(row=i, column=j, value=code)
             cell.alignment = CENTER
             cell.border = B_THIN
@@ -2,13 +2,14 @@
 from __future__ import annotations
 from typing import Dict, List, Tuple
 from datetime import date
-import copy
 
 from engine.domain.employee import Employee
 from engine.domain.schedule import Assignment
 from engine.services import shifts_ops
 from engine.services import pairing
 from engine.services import coverage as cov
+from engine.services.hours import code_hours as _hours_of, hours_by_employee
+from engine.services.instrumentation import OpStats, collecting, copy_schedule
 
 DAYC = {"DA", "DB", "M8A", "M8B", "E8A", "E8B"}
 
@@ -35,34 +36,6 @@ def _fmt_tape(schedule, code_of, eid: str, w0: date, w1: date) -> str:
     return ", ".join(tape)
 
 
-def _hours_by_employee(schedule, code_of) -> Dict[str, int]:
-    hours: Dict[str, int] = {}
-    for rows in schedule.values():
-        for a in rows:
-            code = code_of(a.shift_key).upper()
-            if code in {"DA", "DB", "NA", "NB"}:
-                h = 12
-            elif code in {"M8A", "M8B", "E8A", "E8B", "N8A", "N8B", "VAC8"}:
-                h = 8
-            elif code in {"N4A", "N4B"}:
-                h = 4
-            else:
-                h = 0
-            hours[a.employee_id] = hours.get(a.employee_id, 0) + h
-    return hours
-
-
-def _hours_of(code: str) -> int:
-    c = (code or "OFF").upper()
-    if c in {"DA", "DB", "NA", "NB"}:
-        return 12
-    if c in {"M8A", "M8B", "E8A", "E8B", "N8A", "N8B", "VAC8"}:
-        return 8
-    if c in {"N4A", "N4B"}:
-        return 4
-    return 0
-
-
 def _code_on(schedule, code_of, emp_id: str, d: date) -> str:
     for a in schedule[d]:
         if a.employee_id == emp_id:
@@ -121,9 +94,13 @@ def _delta_hours_pred_plus_one(schedule, code_of, emp_id: str) -> int:
 
 
 def _solo_in_window(schedule, code_of, ordered_dates: List[date], window_days: int, eid: str) -> int:
+    return _window_coverage(schedule, code_of, ordered_dates, window_days).solo_days(eid)
+
+
+def _window_coverage(schedule, code_of, ordered_dates: List[date], window_days: int) -> cov.CoverageIndex:
+    """Индекс покрытия по первым window_days датам (без среза расписания)."""
     limit = min(len(ordered_dates), max(1, window_days))
-    window_sched = {d: schedule[d] for d in ordered_dates[:limit]}
-    return cov.solo_days_by_employee(window_sched, code_of).get(eid, 0)
+    return cov.build_coverage(schedule, code_of, ordered_dates[:limit])
 
 
 def _same_office_overlap_hours(
@@ -167,9 +144,37 @@ def apply_pair_breaking(
     employees: List[Employee],
     code_of,
     cfg,
-) -> Tuple[object, List[str], Dict[str, int], int, int, List[str]]:
-    """Балансировка по парам с фазовыми сдвигами в начале месяца."""
+) -> Tuple[object, List[str], Dict[str, int], int, int, List[str], OpStats]:
+    """Балансировка по парам с фазовыми сдвигами в начале месяца.
+
+    Последним элементом возвращает OpStats: счётчики кандидатов по операторам,
+    причины отказов и суммарное время горячих вызовов (экспорт через to_json()).
+    """
+
+    stats = OpStats()
+    with collecting(stats):
+        result = _apply_pair_breaking(schedule, employees, code_of, cfg, stats)
+    return (*result, stats)
+
 
+def _reject_reasons(d_pair: int | None, d_solo: int, so_ok: bool, so_month_ok: bool) -> List[str]:
+    reasons: List[str] = []
+    if d_pair is not None and d_pair >= 0:
+        reasons.append("pair")
+    if d_solo > 0:
+        reasons.append("solo")
+    if not (so_ok and so_month_ok):
+        reasons.append("same_office")
+    return reasons
+
+
+def _apply_pair_breaking(
+    schedule: Dict[date, List[Assignment]],
+    employees: List[Employee],
+    code_of,
+    cfg,
+    stats: OpStats,
+) -> Tuple[object, List[str], Dict[str, int], int, int, List[str]]:
     ops_log: List[str] = []
     apply_log: List[str] = []
 
@@ -186,13 +191,36 @@ def apply_pair_breaking(
     }
     intern_ids = intern_ids_cfg | intern_ids_emp
 
-    entry_pairs = pairing.pair_hours_exclusive(
-        schedule,
-        code_of,
-        prev_pairs,
-        threshold_day=threshold_day,
-        skip_ids=intern_ids,
-    )
+    def _pairs_exclusive(sched):
+        with stats.timed("pair_hours_exclusive"):
+            return pairing.pair_hours_exclusive(
+                sched,
+                code_of,
+                prev_pairs,
+                threshold_day=threshold_day,
+                skip_ids=intern_ids,
+            )
+
+    def _overlap_month(sched, a: str, b: str) -> int:
+        with stats.timed("_same_office_overlap_month"):
+            return _same_office_overlap_month(sched, code_of, a, b)
+
+    def _overlap_window(sched, a: str, b: str) -> int:
+        with stats.timed("_same_office_overlap_hours"):
+            return _same_office_overlap_hours(sched, code_of, a, b, ordered_dates, window_days)
+
+    # индекс окна для текущего расписания: базовые Δsolo minus/plus считаются по одному индексу,
+    # для пробного расписания индекс строится один раз на кандидата
+    window_cov: List[object] = [None, None]  # [расписание, индекс]
+
+    def _solo(sched, eid: str) -> int:
+        with stats.timed("_solo_in_window"):
+            if window_cov[0] is not sched:
+                window_cov[0] = sched
+                window_cov[1] = _window_coverage(sched, code_of, ordered_dates, window_days)
+            return window_cov[1].solo_days(eid)
+
+    entry_pairs = _pairs_exclusive(schedule)
     entry_score = sum(item[4] for item in entry_pairs)
 
     if not cfg.get("enabled", False):
@@ -205,16 +233,10 @@ def apply_pair_breaking(
     anti_align = bool(cfg.get("anti_align", True))
     norm_by_emp: Dict[str, int] = cfg.get("norm_by_employee", {}) or {}
 
-    cur_sched = copy.deepcopy(schedule)
+    cur_sched = copy_schedule(schedule)
     ordered_dates = sorted(cur_sched.keys())
 
-    base_pairs_hours = pairing.pair_hours_exclusive(
-        cur_sched,
-        code_of,
-        prev_pairs,
-        threshold_day=threshold_day,
-        skip_ids=intern_ids,
-    )
+    base_pairs_hours = _pairs_exclusive(cur_sched)
     base_score = sum(item[4] for item in base_pairs_hours)
 
     prev_exclusive = pairing.exclusive_matching_by_day(prev_pairs or [], threshold_day=threshold_day)
@@ -255,7 +277,7 @@ def apply_pair_breaking(
             apply_log.append(f"{emp_a}~{emp_b}: skip(pair-member already moved)")
             continue
 
-        hours_now = _hours_by_employee(cur_sched, code_of)
+        hours_now = hours_by_employee(cur_sched, code_of)
         def_a = norm_by_emp.get(emp_a, hours_now.get(emp_a, 0)) - hours_now.get(emp_a, 0)
         def_b = norm_by_emp.get(emp_b, hours_now.get(emp_b, 0)) - hours_now.get(emp_b, 0)
 
@@ -275,54 +297,43 @@ def apply_pair_breaking(
         w1 = ordered_dates[limit]
         window = (w0, w1)
 
-        before_pairs = pairing.pair_hours_exclusive(
-            cur_sched,
-            code_of,
-            prev_pairs,
-            threshold_day=threshold_day,
-            skip_ids=intern_ids,
-        )
+        before_pairs = _pairs_exclusive(cur_sched)
         before_map = {
             _pair_key(a, b): (a, b, h_d, h_n, h_t)
             for a, b, h_d, h_n, h_t in before_pairs
         }
         pair_id = _pair_key(emp_a, emp_b)
 
-        base_solo_minus = _solo_in_window(cur_sched, code_of, ordered_dates, window_days, minus_emp)
-        before_same_office = _same_office_overlap_hours(
-            cur_sched, code_of, emp_a, emp_b, ordered_dates, window_days
-        )
-        before_same_office_month = _same_office_overlap_month(cur_sched, code_of, emp_a, emp_b)
+        base_solo_minus = _solo(cur_sched, minus_emp)
+        before_same_office = _overlap_window(cur_sched, emp_a, emp_b)
+        before_same_office_month = _overlap_month(cur_sched, emp_a, emp_b)
         dHpred1 = _delta_hours_pred_minus_one(cur_sched, code_of, minus_emp)
 
         test_sched = None
         ok1 = False
         note1 = ""
         blocked_budget1 = False
+        stats.tried("minus_one")
         if (pred_hours_cum + dHpred1) < -hours_budget:
             apply_log.append(
                 f"{minus_emp}: op=-1 window=[{w0.isoformat()}..{w1.isoformat()}] "
                 f"Δhours_pred={dHpred1} Σpred={pred_hours_cum} budget={-hours_budget} -> REJECT(budget)"
             )
             blocked_budget1 = True
+            stats.rejected("minus_one", ["budget"])
         else:
-            test_sched, dh1, ok1, note1 = shifts_ops.phase_shift_minus_one_skip(
-                cur_sched,
-                code_of,
-                minus_emp,
-                window,
-                partner_id=partner_of(minus_emp),
-                anti_align=anti_align,
-            )
+            with stats.timed("op.minus_one"):
+                test_sched, dh1, ok1, note1 = shifts_ops.phase_shift_minus_one_skip(
+                    cur_sched,
+                    code_of,
+                    minus_emp,
+                    window,
+                    partner_id=partner_of(minus_emp),
+                    anti_align=anti_align,
+                )
 
         if ok1 and test_sched is not None:
-            after_pairs = pairing.pair_hours_exclusive(
-                test_sched,
-                code_of,
-                prev_pairs,
-                threshold_day=threshold_day,
-                skip_ids=intern_ids,
-            )
+            after_pairs = _pairs_exclusive(test_sched)
             after_map = {
                 _pair_key(a, b): (a, b, h_d, h_n, h_t)
                 for a, b, h_d, h_n, h_t in after_pairs
@@ -330,14 +341,10 @@ def apply_pair_breaking(
             before_ht = before_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             after_ht = after_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             d_pair = after_ht - before_ht
-            after_solo_minus = _solo_in_window(test_sched, code_of, ordered_dates, window_days, minus_emp)
+            after_solo_minus = _solo(test_sched, minus_emp)
             d_solo = after_solo_minus - base_solo_minus
-            after_same_office = _same_office_overlap_hours(
-                test_sched, code_of, emp_a, emp_b, ordered_dates, window_days
-            )
-            after_same_office_month = _same_office_overlap_month(
-                test_sched, code_of, emp_a, emp_b
-            )
+            after_same_office = _overlap_window(test_sched, emp_a, emp_b)
+            after_same_office_month = _overlap_month(test_sched, emp_a, emp_b)
             so_ok = after_same_office <= before_same_office
             so_month_ok = after_same_office_month <= before_same_office_month
             verdict = (
@@ -351,7 +358,10 @@ def apply_pair_breaking(
                 f"Δhours_pred={dHpred1} Σpred={pred_hours_cum + dHpred1} -> {verdict}"
             )
             apply_log.append(summary)
+            if verdict != "ACCEPT":
+                stats.rejected("minus_one", _reject_reasons(d_pair, d_solo, so_ok, so_month_ok))
             if verdict == "ACCEPT":
+                stats.accepted("minus_one")
                 ops_log.append(f"  tape.before: {_fmt_tape(cur_sched, code_of, minus_emp, w0, w1)}")
                 ops_log.append(f"  tape.after : {_fmt_tape(test_sched, code_of, minus_emp, w0, w1)}")
                 cur_sched = test_sched
@@ -367,39 +377,37 @@ def apply_pair_breaking(
                     pred_minus12_cnt += 1
                 continue
         elif not ok1 and not blocked_budget1:
+            stats.rejected("minus_one", ["no_move"])
             apply_log.append(f"{minus_emp}: op=-1 Δhours_pred={dHpred1} Σpred={pred_hours_cum} {note1}".strip())
 
-        base_solo_plus = _solo_in_window(cur_sched, code_of, ordered_dates, window_days, plus_emp)
+        base_solo_plus = _solo(cur_sched, plus_emp)
         dHpred2 = _delta_hours_pred_plus_one(cur_sched, code_of, plus_emp)
 
         test_sched2 = None
         ok2 = False
         note2 = ""
         blocked_budget2 = False
+        stats.tried("plus_one")
         if (pred_hours_cum + dHpred2) < -hours_budget:
             apply_log.append(
                 f"{plus_emp}: op=+1 window=[{w0.isoformat()}..{w1.isoformat()}] "
                 f"Δhours_pred={dHpred2} Σpred={pred_hours_cum} budget={-hours_budget} -> REJECT(budget)"
             )
             blocked_budget2 = True
+            stats.rejected("plus_one", ["budget"])
         else:
-            test_sched2, dh2, ok2, note2 = shifts_ops.phase_shift_plus_one_insert_off(
-                cur_sched,
-                code_of,
-                plus_emp,
-                window,
-                partner_id=partner_of(plus_emp),
-                anti_align=anti_align,
-            )
+            with stats.timed("op.plus_one"):
+                test_sched2, dh2, ok2, note2 = shifts_ops.phase_shift_plus_one_insert_off(
+                    cur_sched,
+                    code_of,
+                    plus_emp,
+                    window,
+                    partner_id=partner_of(plus_emp),
+                    anti_align=anti_align,
+                )
 
         if ok2 and test_sched2 is not None:
-            after_pairs = pairing.pair_hours_exclusive(
-                test_sched2,
-                code_of,
-                prev_pairs,
-                threshold_day=threshold_day,
-                skip_ids=intern_ids,
-            )
+            after_pairs = _pairs_exclusive(test_sched2)
             after_map = {
                 _pair_key(a, b): (a, b, h_d, h_n, h_t)
                 for a, b, h_d, h_n, h_t in after_pairs
@@ -407,14 +415,10 @@ def apply_pair_breaking(
             before_ht = before_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             after_ht = after_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             d_pair = after_ht - before_ht
-            after_solo_plus = _solo_in_window(test_sched2, code_of, ordered_dates, window_days, plus_emp)
+            after_solo_plus = _solo(test_sched2, plus_emp)
             d_solo = after_solo_plus - base_solo_plus
-            after_same_office = _same_office_overlap_hours(
-                test_sched2, code_of, emp_a, emp_b, ordered_dates, window_days
-            )
-            after_same_office_month = _same_office_overlap_month(
-                test_sched2, code_of, emp_a, emp_b
-            )
+            after_same_office = _overlap_window(test_sched2, emp_a, emp_b)
+            after_same_office_month = _overlap_month(test_sched2, emp_a, emp_b)
             so_ok = after_same_office <= before_same_office
             so_month_ok = after_same_office_month <= before_same_office_month
             verdict = "ACCEPT" if (d_solo <= 0 and so_ok and so_month_ok) else "REJECT"
@@ -426,7 +430,10 @@ def apply_pair_breaking(
                 f"Δhours_pred={dHpred2} Σpred={pred_hours_cum + dHpred2} -> {verdict}"
             )
             apply_log.append(summary)
+            if verdict != "ACCEPT":
+                stats.rejected("plus_one", _reject_reasons(None, d_solo, so_ok, so_month_ok))
             if verdict == "ACCEPT":
+                stats.accepted("plus_one")
                 ops_log.append(f"  tape.before: {_fmt_tape(cur_sched, code_of, plus_emp, w0, w1)}")
                 ops_log.append(f"  tape.after : {_fmt_tape(test_sched2, code_of, plus_emp, w0, w1)}")
                 cur_sched = test_sched2
@@ -442,28 +449,27 @@ def apply_pair_breaking(
                     pred_minus12_cnt += 1
                 continue
         elif not ok2 and not blocked_budget2:
+            stats.rejected("plus_one", ["no_move"])
             apply_log.append(f"{plus_emp}: op=+1 Δhours_pred={dHpred2} Σpred={pred_hours_cum} {note2}".strip())
 
         if ops >= max_ops:
             continue
 
-        flip_sched_d, _, ok_flip_d, note_flip_d = shifts_ops.flip_ab_on_next_token(
-            cur_sched,
-            code_of,
-            minus_emp,
-            window,
-            kind="D",
-            partner_id=partner_of(minus_emp),
-            anti_align=anti_align,
-        )
-        if ok_flip_d:
-            after_pairs = pairing.pair_hours_exclusive(
-                flip_sched_d,
+        stats.tried("flip_d")
+        with stats.timed("op.flip_d"):
+            flip_sched_d, _, ok_flip_d, note_flip_d = shifts_ops.flip_ab_on_next_token(
+                cur_sched,
                 code_of,
-                prev_pairs,
-                threshold_day=threshold_day,
-                skip_ids=intern_ids,
+                minus_emp,
+                window,
+                kind="D",
+                partner_id=partner_of(minus_emp),
+                anti_align=anti_align,
             )
+        if not ok_flip_d:
+            stats.rejected("flip_d", ["no_move"])
+        if ok_flip_d:
+            after_pairs = _pairs_exclusive(flip_sched_d)
             after_map = {
                 _pair_key(a, b): (a, b, h_d, h_n, h_t)
                 for a, b, h_d, h_n, h_t in after_pairs
@@ -471,17 +477,11 @@ def apply_pair_breaking(
             before_ht = before_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             after_ht = after_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             d_pair = after_ht - before_ht
-            after_same_office = _same_office_overlap_hours(
-                flip_sched_d, code_of, emp_a, emp_b, ordered_dates, window_days
-            )
-            after_same_office_month = _same_office_overlap_month(
-                flip_sched_d, code_of, emp_a, emp_b
-            )
+            after_same_office = _overlap_window(flip_sched_d, emp_a, emp_b)
+            after_same_office_month = _overlap_month(flip_sched_d, emp_a, emp_b)
             so_ok = after_same_office <= before_same_office
             so_month_ok = after_same_office_month <= before_same_office_month
-            d_solo = _solo_in_window(
-                flip_sched_d, code_of, ordered_dates, window_days, minus_emp
-            ) - base_solo_minus
+            d_solo = _solo(flip_sched_d, minus_emp) - base_solo_minus
             verdict = "ACCEPT" if (d_solo <= 0 and so_ok and so_month_ok) else "REJECT"
             summary = (
                 f"{minus_emp}: op=flipD window=[{w0.isoformat()}..{w1.isoformat()}] "
@@ -491,7 +491,10 @@ def apply_pair_breaking(
                 f"Δhours_pred=0 Σpred={pred_hours_cum} -> {verdict}"
             )
             apply_log.append(summary)
+            if verdict != "ACCEPT":
+                stats.rejected("flip_d", _reject_reasons(None, d_solo, so_ok, so_month_ok))
             if verdict == "ACCEPT":
+                stats.accepted("flip_d")
                 cur_sched = flip_sched_d
                 ordered_dates = sorted(cur_sched.keys())
                 base_pairs_hours = after_pairs
@@ -503,23 +506,21 @@ def apply_pair_breaking(
         if ops >= max_ops:
             continue
 
-        flip_sched_n, _, ok_flip_n, note_flip_n = shifts_ops.flip_ab_on_next_token(
-            cur_sched,
-            code_of,
-            plus_emp,
-            window,
-            kind="N",
-            partner_id=partner_of(plus_emp),
-            anti_align=anti_align,
-        )
-        if ok_flip_n:
-            after_pairs = pairing.pair_hours_exclusive(
-                flip_sched_n,
+        stats.tried("flip_n")
+        with stats.timed("op.flip_n"):
+            flip_sched_n, _, ok_flip_n, note_flip_n = shifts_ops.flip_ab_on_next_token(
+                cur_sched,
                 code_of,
-                prev_pairs,
-                threshold_day=threshold_day,
-                skip_ids=intern_ids,
+                plus_emp,
+                window,
+                kind="N",
+                partner_id=partner_of(plus_emp),
+                anti_align=anti_align,
             )
+        if not ok_flip_n:
+            stats.rejected("flip_n", ["no_move"])
+        if ok_flip_n:
+            after_pairs = _pairs_exclusive(flip_sched_n)
             after_map = {
                 _pair_key(a, b): (a, b, h_d, h_n, h_t)
                 for a, b, h_d, h_n, h_t in after_pairs
@@ -527,17 +528,11 @@ def apply_pair_breaking(
             before_ht = before_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             after_ht = after_map.get(pair_id, (emp_a, emp_b, 0, 0, 0))[4]
             d_pair = after_ht - before_ht
-            after_same_office = _same_office_overlap_hours(
-                flip_sched_n, code_of, emp_a, emp_b, ordered_dates, window_days
-            )
-            after_same_office_month = _same_office_overlap_month(
-                flip_sched_n, code_of, emp_a, emp_b
-            )
+            after_same_office = _overlap_window(flip_sched_n, emp_a, emp_b)
+            after_same_office_month = _overlap_month(flip_sched_n, emp_a, emp_b)
             so_ok = after_same_office <= before_same_office
             so_month_ok = after_same_office_month <= before_same_office_month
-            d_solo = _solo_in_window(
-                flip_sched_n, code_of, ordered_dates, window_days, plus_emp
-            ) - base_solo_plus
+            d_solo = _solo(flip_sched_n, plus_emp) - base_solo_plus
             verdict = "ACCEPT" if (d_solo <= 0 and so_ok and so_month_ok) else "REJECT"
             summary = (
                 f"{plus_emp}: op=flipN window=[{w0.isoformat()}..{w1.isoformat()}] "
@@ -547,7 +542,10 @@ def apply_pair_breaking(
                 f"Δhours_pred=0 Σpred={pred_hours_cum} -> {verdict}"
             )
             apply_log.append(summary)
+            if verdict != "ACCEPT":
+                stats.rejected("flip_n", _reject_reasons(None, d_solo, so_ok, so_month_ok))
             if verdict == "ACCEPT":
+                stats.accepted("flip_n")
                 cur_sched = flip_sched_n
                 ordered_dates = sorted(cur_sched.keys())
                 base_pairs_hours = after_pairs
@@ -561,15 +559,23 @@ def apply_pair_breaking(
         if not ok_flip_n and note_flip_n:
             apply_log.append(f"{plus_emp}: op=flipN {note_flip_n}")
 
-    solo_after = cov.solo_days_by_employee(cur_sched, code_of)
+    with stats.timed("solo_days_by_employee"):
+        solo_after = cov.solo_days_by_employee(cur_sched, code_of)
 
     post_notes: List[str] = []
     total_flips = 0
     for a, b, _, _ in target_pairs:
-        before_so = _same_office_overlap_month(cur_sched, code_of, a, b)
-        fixed_sched, flips, notes = shifts_ops.desync_pair_month(cur_sched, code_of, a, b)
-        after_so = _same_office_overlap_month(fixed_sched, code_of, a, b)
+        before_so = _overlap_month(cur_sched, a, b)
+        stats.tried("desync_pair")
+        with stats.timed("op.desync_pair"):
+            fixed_sched, flips, notes = shifts_ops.desync_pair_month(cur_sched, code_of, a, b)
+        after_so = _overlap_month(fixed_sched, a, b)
+        if flips <= 0:
+            stats.rejected("desync_pair", ["no_move"])
+        elif after_so > before_so:
+            stats.rejected("desync_pair", ["same_office"])
         if flips > 0 and after_so <= before_so:
+            stats.accepted("desync_pair")
             cur_sched = fixed_sched
             ordered_dates = sorted(cur_sched.keys())
             total_flips += flips
@@ -585,7 +591,7 @@ def apply_pair_breaking(
         emp_ids = sorted([e.id for e in employees if e.id not in intern_ids])
 
         def _month_overlap(a: str, b: str) -> int:
-            return _same_office_overlap_month(cur_sched, code_of, a, b)
+            return _overlap_month(cur_sched, a, b)
 
         best_partner: Dict[str, Tuple[str, int]] = {}
         for a in emp_ids:
@@ -616,9 +622,16 @@ def apply_pair_breaking(
             before_so = _month_overlap(a, b)
             if before_so <= 0:
                 continue
-            fixed_sched, flips, notes = shifts_ops.desync_pair_month(cur_sched, code_of, a, b)
-            after_so = _same_office_overlap_month(fixed_sched, code_of, a, b)
+            stats.tried("desync_all")
+            with stats.timed("op.desync_all"):
+                fixed_sched, flips, notes = shifts_ops.desync_pair_month(cur_sched, code_of, a, b)
+            after_so = _overlap_month(fixed_sched, a, b)
+            if flips <= 0:
+                stats.rejected("desync_all", ["no_move"])
+            elif after_so >= before_so:
+                stats.rejected("desync_all", ["same_office"])
             if flips > 0 and after_so < before_so:
+                stats.accepted("desync_all")
                 cur_sched = fixed_sched
                 ordered_dates = sorted(cur_sched.keys())
                 extra_flips += flips
@@ -631,13 +644,7 @@ def apply_pair_breaking(
             for msg in extra_notes:
                 ops_log.append("  " + msg)
 
-    after_pairs = pairing.pair_hours_exclusive(
-        cur_sched,
-        code_of,
-        prev_pairs,
-        threshold_day=threshold_day,
-        skip_ids=intern_ids,
-    )
+    after_pairs = _pairs_exclusive(cur_sched)
     after_score = sum(item[4] for item in after_pairs)
 
     ops_log.append("[pairs.after_ops.delta]")
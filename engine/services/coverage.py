@@ -1,7 +1,9 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import Dict, List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 from datetime import date
+import bisect
 
 N8 = {"N8A", "N8B"}
 DAYC = {"DA", "DB", "M8A", "M8B", "E8A", "E8B"}
@@ -16,32 +18,122 @@ def _is_carry_in_n8(d: date, code: str) -> bool:
     return d.day == 1 and (code or "").upper() in N8
 
 
+COUNT_KEYS = ("DA", "DB", "NA", "NB")
+
+
+@dataclass
+class CoverageIndex:
+    """
+    Покрытие за один проход: по дням счётчики DA/DB/NA/NB (как per_day_counts), число
+    «дневных» строк (DA/DB/M8/E8) и единственный дневной дня (если он один), плюс префиксные
+    суммы. Запросы по диапазону индексов дат [i0..i1] — O(1).
+    """
+
+    dates: List[date]
+    date_index: Dict[date, int]
+    counts: Dict[str, List[int]]  # DA/DB/NA/NB -> по дням
+    day_workers: List[int]
+    sole: List[Optional[str]]  # сотрудник — единственный дневной дня, иначе None
+    prefix: Dict[str, List[int]] = field(default_factory=dict)  # DA/DB/NA/NB/D -> префикс (len = дней + 1)
+    solo_prefix: Dict[str, List[int]] = field(default_factory=dict)  # сотрудник -> префикс соло-дней
+
+    def _span(self, i0: int, i1: Optional[int]) -> Tuple[int, int]:
+        n = len(self.dates)
+        hi = n - 1 if i1 is None else min(i1, n - 1)
+        return max(0, i0), hi + 1
+
+    def count(self, key: str, i0: int = 0, i1: Optional[int] = None) -> int:
+        """Сумма счётчика key (DA/DB/NA/NB, "D" — дневные) по дням i0..i1 включительно."""
+        lo, hi = self._span(i0, i1)
+        pre = self.prefix[key]
+        return pre[hi] - pre[lo] if hi > lo else 0
+
+    def solo_days(self, emp_id: str, i0: int = 0, i1: Optional[int] = None) -> int:
+        """Соло-дней сотрудника по дням i0..i1 включительно."""
+        pre = self.solo_prefix.get(emp_id)
+        if pre is None:
+            return 0
+        lo, hi = self._span(i0, i1)
+        return pre[hi] - pre[lo] if hi > lo else 0
+
+    def solo_between(self, emp_id: str, d0: date, d1: date) -> int:
+        """То же по датам [d0..d1] (даты вне расписания обрезаются)."""
+        lo = bisect.bisect_left(self.dates, d0)
+        hi = bisect.bisect_right(self.dates, d1) - 1
+        return self.solo_days(emp_id, lo, hi)
+
+    def per_day_counts(self) -> Dict[date, Dict[str, int]]:
+        return {d: {k: self.counts[k][i] for k in COUNT_KEYS} for i, d in enumerate(self.dates)}
+
+    def solo_days_by_employee(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for eid in self.sole:
+            if eid is not None:
+                out[eid] = out.get(eid, 0) + 1
+        return out
+
+
+def build_coverage(
+    schedule,
+    code_of_fn,
+    dates: Optional[Sequence[date]] = None,
+    skip_ids: Optional[Set[str]] = None,
+) -> CoverageIndex:
+    """
+    Индекс покрытия по всем датам расписания (dates — только по этим, в их порядке; так
+    окно балансера индексируется без среза расписания). skip_ids — сотрудники, которые
+    в покрытие не входят (например, стажёры при trainees_count_towards_coverage=False).
+    """
+    ds = sorted(schedule.keys()) if dates is None else list(dates)
+    n = len(ds)
+    counts = {k: [0] * n for k in COUNT_KEYS}
+    day_workers = [0] * n
+    sole: List[Optional[str]] = [None] * n
+    profile: Dict[Tuple[str, bool], Tuple[Optional[str], bool]] = {}  # (shift_key, 1-е?) -> (счётчик, дневная?)
+    for i, d in enumerate(ds):
+        first = d.day == 1
+        workers = 0
+        worker: Optional[str] = None
+        for a in schedule[d]:
+            if skip_ids and a.employee_id in skip_ids:
+                continue
+            prof = profile.get((a.shift_key, first))
+            if prof is None:
+                c0 = _code_of(code_of_fn, a.shift_key)
+                key: Optional[str] = None
+                if c0 in DAYC:
+                    key = "DA" if c0.endswith("A") else ("DB" if c0.endswith("B") else None)
+                elif c0 in NIGHT or (c0 in N8 and not first):
+                    key = "NA" if c0.endswith("A") else "NB"
+                prof = profile[(a.shift_key, first)] = (key, c0 in DAYC)
+            if prof[0] is not None:
+                counts[prof[0]][i] += 1
+            if prof[1]:
+                workers += 1
+                worker = a.employee_id
+        day_workers[i] = workers
+        if workers == 1:
+            sole[i] = worker
+
+    index = CoverageIndex(
+        dates=ds, date_index={d: i for i, d in enumerate(ds)}, counts=counts, day_workers=day_workers, sole=sole
+    )
+    for key, row in list(counts.items()) + [("D", day_workers)]:
+        pre = [0] * (n + 1)
+        for i, v in enumerate(row):
+            pre[i + 1] = pre[i] + v
+        index.prefix[key] = pre
+    for eid in dict.fromkeys(x for x in sole if x is not None):
+        pre = [0] * (n + 1)
+        for i, x in enumerate(sole):
+            pre[i + 1] = pre[i] + (x == eid)
+        index.solo_prefix[eid] = pre
+    return index
+
+
 def per_day_counts(schedule, code_of_fn):
     """Возвращает по каждой дате счётчики DA/DB/NA/NB (N4 считаем ночными; N8 на 1-е = OFF)."""
-    out = {}
-    for d, rows in schedule.items():
-        c = {"DA": 0, "DB": 0, "NA": 0, "NB": 0}
-        for a in rows:
-            c0 = _code_of(code_of_fn, a.shift_key)
-            if c0 in DAYC:
-                if c0.endswith("A"):
-                    c["DA"] += 1
-                elif c0.endswith("B"):
-                    c["DB"] += 1
-                continue
-            if c0 in NIGHT:
-                if c0.endswith("A"):
-                    c["NA"] += 1
-                else:
-                    c["NB"] += 1
-                continue
-            if c0 in N8 and not _is_carry_in_n8(d, c0):
-                if c0.endswith("A"):
-                    c["NA"] += 1
-                else:
-                    c["NB"] += 1
-        out[d] = c
-    return out
+    return build_coverage(schedule, code_of_fn).per_day_counts()
 
 
 def solo_days_by_employee(schedule, code_of_fn):
@@ -49,15 +141,4 @@ def solo_days_by_employee(schedule, code_of_fn):
     Список "соло-дней" по сотрудникам: когда (DA+DB)==1 и этот единственный D принадлежит сотруднику.
     Возвращает dict[emp_id] -> int (кол-во соло-дней).
     """
-    out: Dict[str, int] = {}
-    for d, rows in schedule.items():
-        # ищем единственный D
-        day_workers: List[str] = []
-        for a in rows:
-            c0 = _code_of(code_of_fn, a.shift_key)
-            if c0 in ("DA", "DB", "M8A", "M8B", "E8A", "E8B"):
-                day_workers.append(a.employee_id)
-        if len(day_workers) == 1:
-            eid = day_workers[0]
-            out[eid] = out.get(eid, 0) + 1
-    return out
+    return build_coverage(schedule, code_of_fn).solo_days_by_employee()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Set, Tuple
+
+from engine.services import coverage as cov
+from engine.services import shifts_ops
+
+# Ремонт дневного покрытия по CONFIG["coverage"]: в каждый день минимум require_day_a
+# дневных в офисе A и require_day_b в офисе B (стажёры считаются, только если
+# trainees_count_towards_coverage). Дефицитные дни находит индекс coverage.build_coverage,
+# чинят их флипы A↔B дневных смен (shifts_ops.flip_ab_on_cells) из офиса с избытком.
+#
+# Флип меняет только одну ячейку, поэтому дни независимы, и выбор флипов — задача о
+# назначении «слоты дефицита → сотрудники» с выпуклой ценой k-го флипа одного сотрудника
+# (флипы размазываются по людям). Решаем её как min-cost flow последовательными
+# кратчайшими путями: путь — чередующаяся цепочка «день → сотрудник → другой его день»,
+# цена пути — нагрузка конечного сотрудника, поэтому BFS до наименее загруженного
+# достижимого сотрудника и есть кратчайший путь. Без перебора «попробовать и откатить».
+#
+# Сдвиги фазы не используются: они двигают всю ленту и связывают дни между собой;
+# дефицит без избытка в другом офисе (мало дневных вообще) остаётся в unresolved.
+
+
+@dataclass
+class CoverageDeficit:
+    date: date
+    office: str  # A | B
+    required: int
+    actual: int
+
+    @property
+    def missing(self) -> int:
+        return max(0, self.required - self.actual)
+
+    def __str__(self) -> str:
+        return f"{self.date.isoformat()} {self.office}: {self.actual}/{self.required}"
+
+
+@dataclass
+class CoverageRepair:
+    deficits: List[CoverageDeficit] = field(default_factory=list)  # до ремонта
+    flips: List[Tuple[str, date]] = field(default_factory=list)  # (сотрудник, дата)
+    notes: List[str] = field(default_factory=list)
+    unresolved: List[CoverageDeficit] = field(default_factory=list)  # после ремонта
+
+    def log_lines(self) -> List[str]:
+        if not self.deficits:
+            return []
+        lines = [f"deficits={len(self.deficits)} flips={len(self.flips)} unresolved={len(self.unresolved)}"]
+        lines.extend(self.notes)
+        lines.extend(f"unresolved {x}" for x in self.unresolved)
+        return lines
+
+
+def coverage_requirements(cfg: Dict) -> Tuple[int, int, bool]:
+    c = cfg.get("coverage", {}) or {}
+    return (
+        int(c.get("require_day_a", 0) or 0),
+        int(c.get("require_day_b", 0) or 0),
+        bool(c.get("trainees_count_towards_coverage", False)),
+    )
+
+
+def find_deficits(index: cov.CoverageIndex, require_a: int, require_b: int) -> List[CoverageDeficit]:
+    out: List[CoverageDeficit] = []
+    for i, d in enumerate(index.dates):
+        for office, need in (("A", require_a), ("B", require_b)):
+            have = index.counts["D" + office][i]
+            if have < need:
+                out.append(CoverageDeficit(d, office, need, have))
+    return out
+
+
+def _assign(slots: List[Tuple[int, int]], cands: Dict[int, List[str]]) -> Dict[int, List[str]]:
+    """
+    Назначение: слот дня i нужно закрыть units разными сотрудниками из cands[i].
+    Сумма выпуклых цен по нагрузке минимальна (последовательные кратчайшие пути).
+    Возвращает день -> сотрудники; незакрытые слоты просто не попадают в ответ.
+    """
+    assigned: Dict[int, Dict[str, None]] = {i: {} for i in cands}
+    member: Dict[str, Dict[int, None]] = {}  # сотрудник -> дни, где он назначен
+    load: Dict[str, int] = {}
+    for start, units in slots:
+        for _ in range(units):
+            via_day: Dict[str, int] = {}  # сотрудник -> день, из которого он достигнут
+            via_emp: Dict[int, Optional[str]] = {start: None}  # день -> сотрудник, через которого достигнут
+            queue = deque([start])
+            best: Optional[str] = None
+            while queue and not (best is not None and load.get(best, 0) == 0):
+                di = queue.popleft()
+                taken = assigned[di]
+                for e in cands[di]:
+                    if e in taken or e in via_day:
+                        continue
+                    via_day[e] = di
+                    if best is None or load.get(e, 0) < load.get(best, 0):
+                        best = e
+                    for dj in member.get(e, ()):
+                        if dj not in via_emp:
+                            via_emp[dj] = e
+                            queue.append(dj)
+            if best is None:
+                break  # у дня не осталось свободных кандидатов
+            e = best
+            while True:
+                di = via_day[e]
+                assigned[di][e] = None
+                member.setdefault(e, {})[di] = None
+                if di == start:
+                    break
+                prev = via_emp[di]
+                del assigned[di][prev]
+                del member[prev][di]
+                e = prev
+            load[best] = load.get(best, 0) + 1
+    return {i: list(emps) for i, emps in assigned.items() if emps}
+
+
+def plan_flips(
+    schedule,
+    code_of,
+    employees,
+    require_a: int,
+    require_b: int,
+    trainees_count: bool = False,
+) -> Tuple[List[Tuple[str, date]], List[CoverageDeficit]]:
+    """Флипы (сотрудник, дата) для закрытия дефицитов и сами дефициты (без изменения расписания)."""
+    skip: Set[str] = set() if trainees_count else {e.id for e in employees if getattr(e, "is_trainee", False)}
+    index = cov.build_coverage(schedule, code_of, skip_ids=skip)
+    deficits = find_deficits(index, require_a, require_b)
+    if not deficits:
+        return [], []
+    need = {"A": require_a, "B": require_b}
+    order = {e.id: pos for pos, e in enumerate(employees)}
+
+    slots: List[Tuple[int, int]] = []
+    cands: Dict[int, List[str]] = {}
+    for x in deficits:
+        i = index.date_index[x.date]
+        donor = "B" if x.office == "A" else "A"
+        surplus = index.counts["D" + donor][i] - need[donor]
+        units = min(x.missing, surplus)
+        if units <= 0:
+            continue
+        pool: Dict[str, int] = {}
+        for a in schedule[x.date]:
+            if a.employee_id in skip or a.employee_id in pool:
+                continue
+            c = code_of(a.shift_key).upper()
+            if c in cov.DAYC and c.endswith(donor):
+                pool[a.employee_id] = order.get(a.employee_id, len(order))
+        cands[i] = sorted(pool, key=pool.get)
+        slots.append((i, units))
+
+    chosen = _assign(slots, cands)
+    flips = [(eid, index.dates[i]) for i in sorted(chosen) for eid in chosen[i]]
+    return flips, deficits
+
+
+def repair_coverage(schedule, code_of, employees, cfg: Dict):
+    """
+    Ремонт покрытия по cfg["coverage"]. Возвращает (schedule, CoverageRepair); при флипах
+    расписание — копия (как у операторов shifts_ops), иначе исходное.
+    """
+    require_a, require_b, trainees_count = coverage_requirements(cfg)
+    if require_a <= 0 and require_b <= 0:
+        return schedule, CoverageRepair()
+    flips, deficits = plan_flips(schedule, code_of, employees, require_a, require_b, trainees_count)
+    result = CoverageRepair(deficits=deficits)
+    if flips:
+        schedule, _n, notes = shifts_ops.flip_ab_on_cells(schedule, code_of, flips, source="coverage_repair")
+        result.flips = flips
+        result.notes = notes
+    if deficits:
+        skip = set() if trainees_count else {e.id for e in employees if getattr(e, "is_trainee", False)}
+        result.unresolved = find_deficits(cov.build_coverage(schedule, code_of, skip_ids=skip), require_a, require_b)
+    return schedule, result
+
+
+__all__ = [
+    "CoverageDeficit",
+    "CoverageRepair",
+    "coverage_requirements",
+    "find_deficits",
+    "plan_flips",
+    "repair_coverage",
+]
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass
+from time import perf_counter
+from typing import Callable, Dict, List, Optional
+
+from engine.services import validator
+
+# Реестр диагностик месяца для логов: каждая объявлена один раз (register) и считается
+# лениво — только когда секция лога (или другой потребитель) запросила её через
+# MonthDiagnostics.get(). Включение — раздел конфига "diagnostics" (имя -> bool; в
+# сценарии — "config": {"diagnostics": {...}}); не упомянутые в конфиге включены.
+# Выключенная диагностика не считается вовсе, а get() возвращает default.
+
+
+@dataclass(frozen=True)
+class Diagnostic:
+    name: str
+    compute: Callable[["MonthDiagnostics"], object]
+    description: str = ""
+
+
+DIAGNOSTICS: Dict[str, Diagnostic] = {}
+
+
+def register(diag: Diagnostic) -> Diagnostic:
+    """Добавить диагностику в реестр (повторная регистрация заменяет прежнюю)."""
+    DIAGNOSTICS[diag.name] = diag
+    return diag
+
+
+def _coverage_smoke(md: "MonthDiagnostics") -> object:
+    return validator.coverage_smoke(md.ym, md.schedule, md.code_of, first_days=md.smoke_days)
+
+
+def _phase_trace(md: "MonthDiagnostics") -> object:
+    # трейс нужен один раз на итоговой сетке — кэш IncrementalValidation тут ничего не сэкономит
+    return validator.phase_trace(md.ym, md.employees, md.schedule, md.code_of, gen=None, days=md.trace_days)
+
+
+register(Diagnostic("coverage_smoke", _coverage_smoke, "DA/DB/NA/NB по первым дням месяца"))
+register(Diagnostic("phase_trace", _phase_trace, "ожидаемый и фактический цикл по первым дням"))
+
+
+def enabled_diagnostics(cfg: Optional[Dict]) -> Dict[str, bool]:
+    """Имя -> включена ли, по разделу cfg["diagnostics"] (по умолчанию — все)."""
+    d_cfg = (cfg or {}).get("diagnostics", {}) or {}
+    return {name: bool(d_cfg.get(name, True)) for name in DIAGNOSTICS}
+
+
+class MonthDiagnostics:
+    """Ленивые диагностики одного месяца: get() считает при первом запросе и запоминает."""
+
+    def __init__(
+        self,
+        ym: str,
+        employees,
+        schedule,
+        code_of,
+        cfg: Optional[Dict] = None,
+        *,
+        smoke_days: int = 8,
+        trace_days: int = 10,
+    ) -> None:
+        self.ym = ym
+        self.employees = employees
+        self.schedule = schedule
+        self.code_of = code_of
+        self.smoke_days = smoke_days
+        self.trace_days = trace_days
+        self._enabled = enabled_diagnostics(cfg)
+        self._values: Dict[str, object] = {}
+        self.seconds: Dict[str, float] = {}
+
+    @classmethod
+    def for_result(cls, res, code_of, cfg: Optional[Dict] = None, **kwargs) -> "MonthDiagnostics":
+        """Диагностики готового месяца генератора (MonthResult)."""
+        return cls(res.ym, res.employees, res.schedule, code_of, cfg, **kwargs)
+
+    def enabled(self, name: str) -> bool:
+        if name not in DIAGNOSTICS:
+            raise ValueError(f"unknown diagnostic: {name}")
+        return self._enabled.get(name, True)
+
+    def get(self, name: str, default: object = None) -> object:
+        if not self.enabled(name):
+            return default
+        if name not in self._values:
+            t0 = perf_counter()
+            self._values[name] = DIAGNOSTICS[name].compute(self)
+            self.seconds[name] = perf_counter() - t0
+        return self._values[name]
+
+    @property
+    def computed(self) -> List[str]:
+        return list(self._values)
+
+
+__all__ = ["DIAGNOSTICS", "Diagnostic", "MonthDiagnostics", "enabled_diagnostics", "register"]
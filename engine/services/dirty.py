@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+# «Грязные» ячейки расписания: какие сотрудники и в каком диапазоне дат менялись.
+# Как и сборщик OpStats (instrumentation.collecting), активный набор один на поток
+# выполнения (ContextVar): операторы, меняющие строки на месте (rotor.remember, shifts_ops, отпуска,
+# сокращения), вызывают mark(), и пока открыт tracking(), изменения копятся в DirtySet.
+# Инкрементальные валидаторы (validator.IncrementalValidation) перепроверяют только их.
+
+_ACTIVE: ContextVar[Optional["DirtySet"]] = ContextVar("dirty_active", default=None)
+
+
+class DirtySet:
+    """Сотрудник -> (первая, последняя) изменённая дата; everything=True — менялось всё."""
+
+    def __init__(self) -> None:
+        self.ranges: Dict[str, Tuple[date, date]] = {}
+        self.everything = False
+
+    def mark(self, emp_id: str, d: date) -> None:
+        rng = self.ranges.get(emp_id)
+        if rng is None:
+            self.ranges[emp_id] = (d, d)
+        elif d < rng[0]:
+            self.ranges[emp_id] = (d, rng[1])
+        elif d > rng[1]:
+            self.ranges[emp_id] = (rng[0], d)
+
+    def mark_all(self) -> None:
+        self.everything = True
+
+    def update(self, other: "DirtySet") -> None:
+        if other.everything:
+            self.everything = True
+        for eid, (lo, hi) in other.ranges.items():
+            self.mark(eid, lo)
+            self.mark(eid, hi)
+
+    def clear(self) -> None:
+        self.ranges.clear()
+        self.everything = False
+
+    def employees(self) -> Set[str]:
+        return set(self.ranges)
+
+    def touches(self, emp_id: str, lo: date, hi: date) -> bool:
+        """Менялся ли сотрудник в пределах [lo, hi]."""
+        if self.everything:
+            return True
+        rng = self.ranges.get(emp_id)
+        return rng is not None and rng[0] <= hi and rng[1] >= lo
+
+    def __bool__(self) -> bool:
+        return self.everything or bool(self.ranges)
+
+    def __repr__(self) -> str:
+        if self.everything:
+            return "DirtySet(everything)"
+        return f"DirtySet({len(self.ranges)} employees)"
+
+
+def mark(emp_id: str, d: date) -> None:
+    """Отметить изменённую ячейку в активном наборе (вне tracking() — ничего не делает)."""
+    current = _ACTIVE.get()
+    if current is not None:
+        current.mark(emp_id, d)
+
+
+@contextmanager
+def tracking(dirty: Optional[DirtySet] = None) -> Iterator[DirtySet]:
+    """Делает dirty (или новый набор) активным на время блока; вложенные блоки пишут и во внешний."""
+    prev = _ACTIVE.get()
+    current = dirty if dirty is not None else DirtySet()
+    token = _ACTIVE.set(current)
+    try:
+        yield current
+    finally:
+        _ACTIVE.reset(token)
+        if prev is not None:
+            prev.update(current)
+
+
+@contextmanager
+def suspended() -> Iterator[None]:
+    """Не отмечать изменения внутри блока (правки копий, а не расписания — например, предпросмотр)."""
+    token = _ACTIVE.set(None)
+    try:
+        yield
+    finally:
+        _ACTIVE.reset(token)
+
+
+__all__ = ["DirtySet", "mark", "suspended", "tracking"]
@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+from dataclasses import dataclass, field, replace
 from datetime import date, timedelta
 import calendar
 import hashlib
-from typing import Dict, List, Tuple, Optional, Iterable
+from typing import Dict, List, Tuple, Optional, Iterable, Iterator
 
 from engine.domain.employee import Employee
 from engine.domain.schedule import Assignment
@@ -26,14 +27,83 @@ from engine.domain.shift import (
     OFF,
 )
 from engine.infrastructure.production_calendar import ProductionCalendar
-from engine.services.shortener import ShiftShortener, ShorteningConfig
+from engine.services import balancer
+from engine.services import coverage as cov
+from engine.services import coverage_repair
+from engine.services import dirty
+from engine.services import pairing
+from engine.services import postprocess
+from engine.services import validator
+from engine.services.instrumentation import OpStats
+from engine.services.shortener import ShiftShortener, ShorteningConfig, ShorteningPreview
+from engine.services.vacations import VacationIndex
+
+
+@dataclass
+class CarryState:
+    """Состояние на границе месяцев: всё, от чего зависит генерация следующего месяца."""
+
+    prev_tail_by_emp: Dict[str, List[str]] = field(default_factory=dict)
+    carry_in: List[Assignment] = field(default_factory=list)
+    prev_pairs: Optional[List[Tuple[str, str, int, int]]] = None
+    solo_months_counter: Dict[str, int] = field(default_factory=dict)
+    # переработка с начала года на 1-е число месяца; пусто — берётся ytd_overtime из конфига
+    ytd_overtime: Dict[str, int] = field(default_factory=dict)
+
+
+@dataclass
+class BalancedStage:
+    """Месяц после генерации и балансировки пар, до отпусков/сокращений (от отпусков не зависит)."""
+
+    schedule: Dict[date, List[Assignment]]
+    baseline_issues: List[str]
+    ops_log: List[str]
+    apply_log: List[str]
+    pair_score_before: int
+    pair_score_after: int
+    pair_stats: OpStats
+
+
+@dataclass
+class MonthResult:
+    """Полностью обработанный месяц горизонта (генерация → пары → отпуска → покрытие → сокращения)."""
+
+    ym: str
+    month_spec: Dict
+    employees: List[Employee]
+    schedule: Dict[date, List[Assignment]]
+    carry_in: List[Assignment]
+    carry_out: List[Assignment]
+    vacations: Dict[str, List[date]]
+    norm_info: Dict
+    baseline_issues: List[str]
+    ops_log: List[str]
+    apply_log: List[str]
+    pair_score_before: int
+    pair_score_after: int
+    pair_stats: OpStats
+    pairs: List[Tuple[str, str, int, int]]
+    state: CarryState  # состояние для следующего месяца
+    # ячейки, изменённые балансировкой/отпусками/сокращениями относительно сгенерированной сетки,
+    # и кэш baseline-проверки этой сетки: Generator.final_issues перепроверяет только их
+    changed: Optional[dirty.DirtySet] = None
+    validation: Optional[validator.IncrementalValidation] = None
+    coverage_log: List[str] = field(default_factory=list)  # ремонт покрытия (CONFIG["coverage"])
+
 
 class Generator:
-    def __init__(self, config: Dict, calendar: Optional[ProductionCalendar] = None):
+    def __init__(
+        self,
+        config: Dict,
+        calendar: Optional[ProductionCalendar] = None,
+        shift_types: Optional[Dict[str, ShiftType]] = None,
+    ):
         self.cfg = config
         self.calendar = calendar
         self._last_norms_info: Optional[Dict] = None
-        self.shift_types: Dict[str, ShiftType] = {
+        self._vacation_index: Optional[VacationIndex] = None
+        # shift_types можно передать готовыми (общая таксономия на процесс, см. services.teams)
+        self.shift_types: Dict[str, ShiftType] = shift_types if shift_types is not None else {
             k: ShiftType(
                 key=k,
                 code=v["code"],
@@ -183,6 +253,175 @@ class Generator:
         carry_in: Optional[List[Assignment]] = None,
         prev_tail_by_emp: Optional[Dict[str, List[str]]] = None,
     ) -> Tuple[List[Employee], Dict[date, List[Assignment]], List[Assignment]]:
+        y, m, last, employees, schedule, phase_map, next_day_parity = self._prepare_month(
+            month_spec, carry_in, prev_tail_by_emp
+        )
+
+        # Построение шаблона по дням
+        carry_out: List[Assignment] = []  # N8* на 1-е след. месяца
+        # Занятые carry-in ячейки (дата, сотрудник) — вместо сканирования строк дня на каждого сотрудника
+        occupied = {(d, a.employee_id) for d, rows in schedule.items() for a in rows}
+
+        for d in self.iter_month_days(y, m):
+            for e in employees:
+                ph = phase_map[e.id]
+                # ВНИМАНИЕ: отпуск НЕ применяется здесь. Перекраска делается postprocess'ом.
+
+                # если на этот день уже стоит carry-in (например N8A) — пропускаем генерацию
+                if (d, e.id) in occupied:
+                    phase_map[e.id] = (ph + 1) % 4
+                    continue
+
+                if ph == 0:  # DAY
+                    # Дневной офис берём из next_day_parity и сразу инвертируем на следующий цикл
+                    office = "A" if next_day_parity[e.id] == 0 else "B"
+                    key = DAY_A if office == "A" else DAY_B
+                    st = self.shift_types[key]
+                    schedule[d].append(Assignment(e.id, d, key, st.hours, source="template"))
+                    # Следующий цикл: дневной офис противоположный
+                    next_day_parity[e.id] = 1 - next_day_parity[e.id]
+
+                elif ph == 1:  # NIGHT
+                    # Ночь текущего цикла всегда в офисе = текущему next_day_parity (см. вывод в обсуждении)
+                    offc = "A" if next_day_parity[e.id] == 0 else "B"
+                    key = NIGHT_A if offc == "A" else NIGHT_B
+                    # Если последняя дата месяца — ставим N4* и готовим N8* в следующий месяц
+                    if d == last:
+                        key4 = N4_A if key == NIGHT_A else N4_B
+                        st4 = self.shift_types[key4]
+                        schedule[d].append(Assignment(e.id, d, key4, st4.hours, source="template"))
+                        # carry-out в след. месяц: N8*
+                        carry_out.append(self._carry_out_n8(e.id, last, key))
+                    else:
+                        st = self.shift_types[key]
+                        schedule[d].append(Assignment(e.id, d, key, st.hours, source="template"))
+
+                else:  # OFF
+                    st = self.shift_types[OFF]
+                    schedule[d].append(Assignment(e.id, d, OFF, st.hours, source="template"))
+
+                phase_map[e.id] = (ph + 1) % 4
+
+        return employees, schedule, carry_out
+
+    # ---------- Генерация месяца: векторный путь ----------
+    @staticmethod
+    def _cycle8(parity: int) -> List[str]:
+        """Период 8 дней при старте с DAY: D(p) N(1-p) O O D(1-p) N(p) O O; parity 0 -> A."""
+        da, db = (DAY_A, DAY_B) if parity == 0 else (DAY_B, DAY_A)
+        na, nb = (NIGHT_A, NIGHT_B) if parity == 0 else (NIGHT_B, NIGHT_A)
+        return [da, nb, OFF, OFF, db, na, OFF, OFF]
+
+    @staticmethod
+    def _row_keys_scalar(phase0: int, parity: int, n: int, skip: set) -> List[Optional[str]]:
+        """Ключи смен строки по тем же правилам, что основной цикл generate_month (None — день carry-in)."""
+        keys: List[Optional[str]] = []
+        ph, par = phase0, parity
+        for i in range(n):
+            if i in skip:
+                keys.append(None)
+            elif ph == 0:
+                keys.append(DAY_A if par == 0 else DAY_B)
+                par = 1 - par
+            elif ph == 1:
+                keys.append(NIGHT_A if par == 0 else NIGHT_B)
+            else:
+                keys.append(OFF)
+            ph = (ph + 1) % 4
+        return keys
+
+    def generate_month_vectorized(
+        self,
+        month_spec: Dict,
+        carry_in: Optional[List[Assignment]] = None,
+        prev_tail_by_emp: Optional[Dict[str, List[str]]] = None,
+    ) -> Tuple[List[Employee], Dict[date, List[Assignment]], List[Assignment]]:
+        """
+        Тот же результат, что generate_month (сетка, порядок строк, carry-out N8*, N4* в последний день),
+        но строка сотрудника строится целиком: фаза дня i = (phase0 + i) % 4, а офис дневной
+        чередуется по циклам, поэтому строка — срез 8-дневного периода `_cycle8` со сдвигом
+        по (phase0, parity). Дни carry-in вырезаются; если carry-in попадает на DAY-фазу
+        (паритет не инвертируется), строка считается скалярно.
+        """
+        y, m, last, employees, schedule, phase_map, next_day_parity = self._prepare_month(
+            month_spec, carry_in, prev_tail_by_emp
+        )
+        days = list(schedule.keys())
+        n = len(days)
+        day_idx = {d: i for i, d in enumerate(days)}
+
+        # carry-in как словарь emp -> индексы дней (вместо any(...) по строкам дня)
+        occupied: Dict[str, set] = {}
+        for d, rows in schedule.items():
+            for a in rows:
+                occupied.setdefault(a.employee_id, set()).add(day_idx[d])
+
+        hours = {k: st.hours for k, st in self.shift_types.items()}
+        n4_of = {NIGHT_A: N4_A, NIGHT_B: N4_B}
+        carry_out: List[Assignment] = []
+        rows_keys: List[List[Optional[str]]] = []
+        for e in employees:
+            p0 = phase_map[e.id]
+            par = next_day_parity[e.id]
+            skip = occupied.get(e.id, set())
+            if any((p0 + i) % 4 == 0 for i in skip):
+                keys = self._row_keys_scalar(p0, par, n, skip)
+            else:
+                off, p = (0, par) if p0 == 0 else (p0, 1 - par)
+                keys = (self._cycle8(p) * (n // 8 + 2))[off:off + n]
+                for i in skip:
+                    keys[i] = None
+            if n and keys[-1] in n4_of:
+                carry_out.append(self._carry_out_n8(e.id, last, keys[-1]))
+                keys[-1] = n4_of[keys[-1]]
+            rows_keys.append(keys)
+
+        # Транспонируем строки в столбцы дней и собираем Assignment пачкой на день
+        emp_ids = [e.id for e in employees]
+        for d, col in zip(days, zip(*rows_keys)):
+            schedule[d].extend(
+                [Assignment(eid, d, k, hours[k], "template") for eid, k in zip(emp_ids, col) if k is not None]
+            )
+        return employees, schedule, carry_out
+
+    def _carry_out_n8(self, emp_id: str, last: date, night_key: str) -> Assignment:
+        key8 = N8_A if night_key == NIGHT_A else N8_B
+        st8 = self.shift_types[key8]
+        next_year = last.year + (1 if last.month == 12 else 0)
+        next_month = 1 if last.month == 12 else last.month + 1
+        return Assignment(
+            emp_id,
+            date(next_year, next_month, 1),
+            key8,
+            st8.hours,
+            source="template",
+        )
+
+    def build_employees(self, ytd_overtime: Optional[Dict[str, int]] = None) -> List[Employee]:
+        """
+        Сотрудники из конфига (с seed4 — используется только как fallback фазы).
+        ytd_overtime — переработка на начало месяца из CarryState (перекрывает значение конфига).
+        """
+        employees = [
+            Employee(
+                id=rec["id"], name=rec["name"],
+                is_trainee=bool(rec.get("is_trainee", False)),
+                mentor_id=rec.get("mentor_id"),
+                ytd_overtime=int((ytd_overtime or {}).get(rec["id"], rec.get("ytd_overtime", 0))),
+            )
+            for rec in self.cfg["employees"]
+        ]
+        for e in employees:
+            self.seed_employee(e)
+        return employees
+
+    def _prepare_month(
+        self,
+        month_spec: Dict,
+        carry_in: Optional[List[Assignment]],
+        prev_tail_by_emp: Optional[Dict[str, List[str]]],
+    ):
+        """Общая часть генерации: сотрудники, пустое расписание с carry-in, стартовые фазы и паритеты."""
         ym = month_spec["month_year"]
         y, m = self.ym_to_year_month(ym)
         _, last = self.month_bounds(y, m)
@@ -194,18 +433,7 @@ class Generator:
         else:
             norm = 0
 
-        # Сотрудники
-        employees = [
-            Employee(
-                id=rec["id"], name=rec["name"],
-                is_trainee=bool(rec.get("is_trainee", False)),
-                mentor_id=rec.get("mentor_id"),
-                ytd_overtime=int(rec.get("ytd_overtime", 0)),
-            )
-            for rec in self.cfg["employees"]
-        ]
-        for e in employees:
-            self.seed_employee(e)  # используем только как fallback фазы
+        employees = self.build_employees()
 
         # Инициализация расписания
         schedule: Dict[date, List[Assignment]] = {d: [] for d in self.iter_month_days(y, m)}
@@ -218,7 +446,7 @@ class Generator:
         next_day_parity: Dict[str, int] = {}  # 0->A, 1->B
         for i, e in enumerate(employees):
             tail = (prev_tail_by_emp or {}).get(e.id, [])
-            seed_phase = i % 4  # равномерно 0,1,2,3 между 8 сотрудниками
+            seed_phase = i % 4  # равномерно 0,1,2,3 по порядку сотрудников (циклически)
             bootstrap_par = 0 if (i % 2 == 0) else 1
             p0, par = self._infer_state_from_tail(
                 tail,
@@ -246,12 +474,16 @@ class Generator:
         # стартовую фазу фиксируем на O2 (=2).
         if carry_in:
             existing = {e.id for e in employees}
+            # день -> сотрудник -> строка: повторный перенос того же сотрудника заменяет прежний
+            # и встаёт в конец (как фильтр списка + append), без скана строк дня на каждый перенос
+            by_day: Dict[date, Dict[str, Assignment]] = {}
             for a in carry_in:
                 if a.employee_id not in existing:
                     continue
                 if a.date in schedule:
-                    schedule[a.date] = [x for x in schedule[a.date] if x.employee_id != a.employee_id]
-                    schedule[a.date].append(a)
+                    rows = by_day.setdefault(a.date, {})
+                    rows.pop(a.employee_id, None)
+                    rows[a.employee_id] = a
                 # Если это 1-е число и код N8A/N8B — корректируем стартовую фазу на O2.
                 if a.date == first_day:
                     code = self.code_of(a.shift_key).upper()
@@ -260,63 +492,10 @@ class Generator:
                         # со скипом из-за carry-in, поэтому получаем: N4 | N8(=O2) | O3 | D0.
                         phase_map[a.employee_id] = 2  # O2
                         # Паритет дневного офиса не меняем: он применяется только на DAY.
+            for d, rows in by_day.items():
+                schedule[d] = list(rows.values())
 
-        # Построение шаблона по дням
-        carry_out: List[Assignment] = []  # N8* на 1-е след. месяца
-
-        for d in self.iter_month_days(y, m):
-            for e in employees:
-                ph = phase_map[e.id]
-                # ВНИМАНИЕ: отпуск НЕ применяется здесь. Перекраска делается postprocess'ом.
-
-                # если на этот день уже стоит carry-in (например N8A) — пропускаем генерацию
-                if any(a.employee_id == e.id for a in schedule[d]):
-                    phase_map[e.id] = (ph + 1) % 4
-                    continue
-
-                if ph == 0:  # DAY
-                    # Дневной офис берём из next_day_parity и сразу инвертируем на следующий цикл
-                    office = "A" if next_day_parity[e.id] == 0 else "B"
-                    key = DAY_A if office == "A" else DAY_B
-                    st = self.shift_types[key]
-                    schedule[d].append(Assignment(e.id, d, key, st.hours, source="template"))
-                    # Следующий цикл: дневной офис противоположный
-                    next_day_parity[e.id] = 1 - next_day_parity[e.id]
-
-                elif ph == 1:  # NIGHT
-                    # Ночь текущего цикла всегда в офисе = текущему next_day_parity (см. вывод в обсуждении)
-                    offc = "A" if next_day_parity[e.id] == 0 else "B"
-                    key = NIGHT_A if offc == "A" else NIGHT_B
-                    # Если последняя дата месяца — ставим N4* и готовим N8* в следующий месяц
-                    if d == last:
-                        key4 = N4_A if key == NIGHT_A else N4_B
-                        st4 = self.shift_types[key4]
-                        schedule[d].append(Assignment(e.id, d, key4, st4.hours, source="template"))
-                        # carry-out в след. месяц: N8*
-                        key8 = N8_A if key == NIGHT_A else N8_B
-                        st8 = self.shift_types[key8]
-                        next_year = last.year + (1 if last.month == 12 else 0)
-                        next_month = 1 if last.month == 12 else last.month + 1
-                        carry_out.append(
-                            Assignment(
-                                e.id,
-                                date(next_year, next_month, 1),
-                                key8,
-                                st8.hours,
-                                source="template",
-                            )
-                        )
-                    else:
-                        st = self.shift_types[key]
-                        schedule[d].append(Assignment(e.id, d, key, st.hours, source="template"))
-
-                else:  # OFF
-                    st = self.shift_types[OFF]
-                    schedule[d].append(Assignment(e.id, d, OFF, st.hours, source="template"))
-
-                phase_map[e.id] = (ph + 1) % 4
-
-        return employees, schedule, carry_out
+        return y, m, last, employees, schedule, phase_map, next_day_parity
 
     # ---------- Ограничение часов (M8/E8 с приоритетом выходных) ----------
     def enforce_hours_caps(
@@ -326,17 +505,321 @@ class Generator:
         norm_month: int,
         ym: str,
     ) -> None:
-        monthly_allowance = int(self.cfg.get("monthly_overtime_max", 0))
-        yearly_cap = int(self.cfg.get("yearly_overtime_max", 0))
-        info = self.shortener.apply(
-            employees,
-            schedule,
-            norm_month,
-            ym,
-            monthly_allowance,
-            yearly_cap,
-        )
+        info = self.shortener.apply(employees, schedule, norm_month, ym, *self._shortening_args())
         self._last_norms_info = info
 
+    def preview_hours_caps(
+        self,
+        employees: List[Employee],
+        schedule: Dict[date, List[Assignment]],
+        norm_month: int,
+        ym: str,
+    ) -> ShorteningPreview:
+        """
+        Что сократил бы enforce_hours_caps, без изменения расписания и last_norms_info
+        (черновики редактора): операции, изменения часов и разреженная разница строк.
+        """
+        return self.shortener.preview(employees, schedule, norm_month, ym, *self._shortening_args())
+
+    def _shortening_args(self) -> Tuple[int, int, str, int]:
+        """monthly_allowance, yearly_cap, solver, time_budget_ms из конфига."""
+        sh_cfg = self.cfg.get("shortening", {}) or {}
+        return (
+            int(self.cfg.get("monthly_overtime_max", 0)),
+            int(self.cfg.get("yearly_overtime_max", 0)),
+            str(sh_cfg.get("solver", "greedy")),
+            int(sh_cfg.get("time_budget_ms", 200)),
+        )
+
     def last_norms_info(self) -> Optional[Dict]:
         return self._last_norms_info
+
+    # ---------- Горизонт из нескольких месяцев ----------
+    def next_state(
+        self,
+        state: CarryState,
+        employees: List[Employee],
+        schedule: Dict[date, List[Assignment]],
+        carry_out: List[Assignment],
+        pairs: List[Tuple[str, str, int, int]],
+        norm_info: Optional[Dict] = None,
+    ) -> CarryState:
+        """
+        CarryState после обработанного месяца: хвост, переносы N8*, пары, анти-соло счётчик
+        и переработка с начала года (ytd сотрудника + overtime_month из norm_info; с января — 0).
+        """
+        solo_days = cov.solo_days_by_employee(schedule, self.code_of)
+        solo_counter = dict(state.solo_months_counter)
+        for e in employees:
+            if solo_days.get(e.id, 0) > 0:
+                solo_counter[e.id] = solo_counter.get(e.id, 0) + 1
+            else:
+                solo_counter.setdefault(e.id, 0)
+        per_employee = (norm_info or {}).get("per_employee", {}) or {}
+        year_ends = bool(schedule) and max(schedule.keys()).month == 12
+        ytd: Dict[str, int] = {}
+        for e in employees:
+            ytd[e.id] = 0 if year_ends else e.ytd_overtime + int(per_employee.get(e.id, {}).get("overtime_month", 0))
+        return CarryState(
+            prev_tail_by_emp=self.extract_tail(schedule, employees),
+            carry_in=carry_out,
+            prev_pairs=pairs,
+            solo_months_counter=solo_counter,
+            ytd_overtime=ytd,
+        )
+
+    @staticmethod
+    def iter_months(start_ym: str, end_ym: str) -> Iterator[str]:
+        y, m = Generator.ym_to_year_month(start_ym)
+        y1, m1 = Generator.ym_to_year_month(end_ym)
+        while (y, m) <= (y1, m1):
+            yield f"{y:04d}-{m:02d}"
+            y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+    @staticmethod
+    def configured_months(month_specs: Iterable[Dict]) -> List[str]:
+        """
+        month_year из month_spec конфига по порядку. Горизонт идёт подряд (CarryState
+        передаётся от месяца к следующему), поэтому неупорядоченный список, повторы и
+        пропуски — ValueError, а не молча сгенерированные или пропущенные месяцы; пустой список тоже.
+        """
+        months = [ms["month_year"] for ms in month_specs if ms.get("month_year")]
+        if not months:
+            raise ValueError("months: no month_year configured")
+        for prev, ym in zip(months, months[1:]):
+            y, m = Generator.ym_to_year_month(prev)
+            expected = f"{y + 1:04d}-01" if m == 12 else f"{y:04d}-{m + 1:02d}"
+            if ym != expected:
+                raise ValueError(f"months must be consecutive: {prev} is followed by {ym}, expected {expected}")
+        return months
+
+    def _validation(self, ym: str, employees: List[Employee]) -> validator.IncrementalValidation:
+        v_cfg = self.cfg.get("validation", {}) or {}
+        return validator.IncrementalValidation(
+            ym, employees, self.code_of, ignore_vacations=True,
+            max_issues=int(v_cfg.get("max_issues", 0)), per_employee=int(v_cfg.get("per_employee", 0)),
+        )
+
+    def final_issues(self, res: MonthResult) -> List[validator.ValidationIssue]:
+        """
+        Нарушения baseline итогового расписания месяца (отсечки CONFIG["validation"]).
+        Свежий месяц хранит проверку сгенерированной сетки — перепроверяются только
+        сотрудники из res.changed; у месяца из кэша (или из воркера) проверяются все.
+        """
+        if res.validation is None:
+            res.validation = self._validation(res.ym, res.employees)
+        return res.validation.issue_records(res.schedule, res.changed)
+
+    def vacation_index(self) -> VacationIndex:
+        """Индекс всех отпусков из всех month_spec (строится один раз; generate_horizon его обновляет)."""
+        if self._vacation_index is None:
+            self._vacation_index = VacationIndex.from_months(self.cfg.get("months", []))
+        return self._vacation_index
+
+    def extract_tail(self, schedule, employees: List[Employee]) -> Dict[str, List[str]]:
+        """Коды последних 4 дней месяца по сотрудникам (хвост для следующего месяца)."""
+        dates = sorted(schedule.keys())
+        tail_dates = dates[-4:] if len(dates) >= 4 else dates
+        # первая строка сотрудника за день -> код (индекс вместо поиска по строкам дня)
+        by_day: List[Dict[str, str]] = []
+        for d in tail_dates:
+            first: Dict[str, str] = {}
+            for r in schedule[d]:
+                if r.employee_id not in first:
+                    first[r.employee_id] = self.code_of(r.shift_key)
+            by_day.append(first)
+        prev_tail_by_emp: Dict[str, List[str]] = {}
+        for e in employees:
+            prev_tail_by_emp[e.id] = [first[e.id] for first in by_day if e.id in first]
+        return prev_tail_by_emp
+
+    def carry_out_from_last_day(self, schedule) -> List[Assignment]:
+        """Пересчёт переносов N8* по фактическим N4* последнего дня (после всех сдвигов)."""
+        if not schedule:
+            return []
+        last_day = max(schedule.keys())
+        next_year = last_day.year + (1 if last_day.month == 12 else 0)
+        next_month = 1 if last_day.month == 12 else last_day.month + 1
+        out: List[Assignment] = []
+        for entry in schedule[last_day]:
+            code = self.code_of(entry.shift_key).upper()
+            if code in {"N4A", "N4B"}:
+                key = N8_A if code.endswith("A") else N8_B
+                st = self.shift_types[key]
+                out.append(
+                    Assignment(
+                        entry.employee_id,
+                        date(next_year, next_month, 1),
+                        key,
+                        st.hours,
+                        source="autofix",
+                    )
+                )
+        return out
+
+    def generate_horizon(
+        self,
+        start_ym: str,
+        end_ym: str,
+        state: Optional[CarryState] = None,
+        *,
+        intern_ids: Optional[List[str]] = None,
+        validate_baseline: bool = True,
+        cache=None,
+        ledger=None,
+    ) -> Iterator[MonthResult]:
+        """
+        Потоковая генерация месяцев start_ym..end_ym включительно: по одному полностью
+        обработанному месяцу за раз. Между месяцами передаётся только CarryState
+        (хвост, переносы N8*, пары прошлого месяца, анти-соло счётчик), поэтому память
+        не растёт с длиной горизонта, а вызывающий может остановиться в любой момент.
+
+        Месяцы без month_spec в конфиге генерируются с нормой из календаря и без отпусков.
+
+        cache — кэш результатов месяца (см. infrastructure.month_cache.MonthCache): ключ
+        считается по всем входам месяца; при попадании генерация, балансировка и
+        сокращения пропускаются.
+
+        ledger — журнал переработки (см. infrastructure.overtime_ledger.OvertimeLedger):
+        переработка на начало месяца берётся из него (ytd_state), если журнал покрывает
+        предыдущие месяцы года, а каждый готовый месяц (в том числе из кэша) записывается
+        в него до выдачи вызывающему.
+        """
+        state = state or CarryState()
+        specs = {ms["month_year"]: ms for ms in self.cfg.get("months", []) if ms.get("month_year")}
+        self._vacation_index = None
+        vac_index = self.vacation_index()
+        pb_base = dict(self.cfg.get("pair_breaking", {}) or {})
+        pb_enabled = bool(pb_base.get("enabled", False))
+        emp_ids = {rec["id"] for rec in self.cfg["employees"]}
+
+        for ym in self.iter_months(start_ym, end_ym):
+            y, m = self.ym_to_year_month(ym)
+            month_spec = specs.get(ym) or {"month_year": ym}
+            if ledger is not None:
+                # журнал — источник переработки с начала года: исправленный в нём месяц
+                # (ledger.correct) учитывается при перезапуске со следующего месяца
+                seeded = ledger.ytd_state(ym, emp_ids)
+                if seeded:
+                    state = replace(state, ytd_overtime=dict(state.ytd_overtime, **seeded))
+
+            # эффективные отпуска (только попавшие в этот месяц и по существующим сотрудникам)
+            eff_vacations = vac_index.window(*self.month_bounds(y, m), emp_ids=emp_ids)
+            month_spec_eff = dict(month_spec)
+            month_spec_eff["vacations"] = eff_vacations
+
+            cache_key = None
+            if cache is not None:
+                cache_key = cache.key_for(
+                    self, month_spec_eff, state, intern_ids=intern_ids, validate_baseline=validate_baseline
+                )
+                cached = cache.load(cache_key, self, month_spec_eff, state)
+                if cached is not None:
+                    if ledger is not None:
+                        ledger.record_result(cached)
+                    yield cached
+                    state = cached.state
+                    continue
+
+            changed = dirty.DirtySet()
+            validation: Optional[validator.IncrementalValidation] = None
+            staged: Optional[BalancedStage] = None
+            if cache is not None:
+                stage_key = cache.key_for(
+                    self, month_spec_eff, state,
+                    intern_ids=intern_ids, validate_baseline=validate_baseline, stage="balanced",
+                )
+                staged = cache.load_stage(stage_key)
+            if staged is not None:
+                # генерация и балансировка не зависят от отпусков/нормы — берём готовую стадию
+                employees = self.build_employees()
+                schedule = staged.schedule
+                baseline_issues = staged.baseline_issues
+                ops_log, apply_log = staged.ops_log, staged.apply_log
+                score_before, score_after = staged.pair_score_before, staged.pair_score_after
+                pb_stats = staged.pair_stats
+                changed.mark_all()  # изменения балансировки неизвестны
+                validation = self._validation(ym, employees)
+            else:
+                employees, schedule, _ = self.generate_month_vectorized(
+                    month_spec_eff,
+                    carry_in=state.carry_in,
+                    prev_tail_by_emp=state.prev_tail_by_emp,
+                )
+
+                baseline_issues = []
+                validation = self._validation(ym, employees)
+                if validate_baseline:
+                    baseline_issues = validation.issues(schedule)
+
+                pb_cfg = dict(pb_base)
+                pb_cfg.setdefault("prev_pairs", state.prev_pairs or [])
+                if intern_ids is not None:
+                    pb_cfg["intern_ids"] = intern_ids
+                with dirty.tracking() as pb_changed:
+                    balanced, ops_log, _solo, score_before, score_after, apply_log, pb_stats = balancer.apply_pair_breaking(
+                        schedule,
+                        employees,
+                        self.code_of,
+                        pb_cfg,
+                    )
+                if pb_enabled:
+                    schedule = balanced
+                    changed.update(pb_changed)
+                if cache is not None:
+                    cache.store_stage(
+                        stage_key,
+                        BalancedStage(schedule, baseline_issues, ops_log, apply_log, score_before, score_after, pb_stats),
+                    )
+
+            # годовой лимит сокращений считается от переработки, накопленной прошлыми месяцами
+            if state.ytd_overtime:
+                for e in employees:
+                    e.ytd_overtime = state.ytd_overtime.get(e.id, e.ytd_overtime)
+
+            with dirty.tracking(changed):
+                postprocess.apply_vacations(schedule, vac_index, self.shift_types)
+                schedule, repair = coverage_repair.repair_coverage(schedule, self.code_of, employees, self.cfg)
+            carry_out = self.carry_out_from_last_day(schedule)
+
+            raw_norm = month_spec.get("norm_hours_month")
+            if raw_norm is not None:
+                norm = int(raw_norm)
+            elif self.calendar:
+                norm = int(self.calendar.norm_hours(y, m) or 0)
+            else:
+                norm = 0
+            with dirty.tracking(changed):
+                self.enforce_hours_caps(employees, schedule, norm, ym)
+            norm_info = self.last_norms_info() or {}
+
+            pairs = pairing.compute_pairs(schedule, self.code_of)
+            next_state = self.next_state(state, employees, schedule, carry_out, pairs, norm_info)
+
+            result = MonthResult(
+                ym=ym,
+                month_spec=month_spec_eff,
+                employees=employees,
+                schedule=schedule,
+                carry_in=state.carry_in,
+                carry_out=carry_out,
+                vacations=eff_vacations,
+                norm_info=norm_info,
+                baseline_issues=baseline_issues,
+                ops_log=ops_log,
+                apply_log=apply_log,
+                pair_score_before=score_before,
+                pair_score_after=score_after,
+                pair_stats=pb_stats,
+                pairs=pairs,
+                state=next_state,
+                changed=changed,
+                validation=validation,
+                coverage_log=repair.log_lines(),
+            )
+            if cache is not None:
+                cache.store(cache_key, result)
+            if ledger is not None:
+                ledger.record_result(result)
+            yield result
+            state = next_state
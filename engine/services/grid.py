@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, Iterable, List, Optional
+
+# Плотная сетка «сотрудник × дата» поверх Schedule (Dict[date, List[Assignment]]).
+# Строится за один проход по строкам расписания; дальше доступ к ячейке — O(1)
+# по индексам, без сканирования schedule[d]. Строки (rows) — ссылки на исходные
+# Assignment, поэтому правки через rows видны в расписании.
+
+
+@dataclass
+class ScheduleGrid:
+    dates: List[date]
+    emp_ids: List[str]
+    emp_index: Dict[str, int]
+    codes: List[List[str]]  # [emp][day] — код смены (верхний регистр), "OFF" если строки нет
+    rows: List[List[Optional[object]]]  # [emp][day] — Assignment или None
+
+    def date_index(self) -> Dict[date, int]:
+        return {d: i for i, d in enumerate(self.dates)}
+
+    def tape(self, emp_id: str) -> List[str]:
+        return self.codes[self.emp_index[emp_id]]
+
+
+def build_grid(schedule, code_of, emp_ids: Optional[Iterable[str]] = None) -> ScheduleGrid:
+    """Строит сетку. Если emp_ids не заданы — берём всех сотрудников из расписания (по порядку появления).
+
+    Как и построчные помощники (`_code_on`), при дублях учитываем первую строку сотрудника за день.
+    """
+    dates = sorted(schedule.keys())
+    fixed = emp_ids is not None
+    ids: List[str] = list(emp_ids) if fixed else []
+    index: Dict[str, int] = {eid: i for i, eid in enumerate(ids)}
+    n = len(dates)
+    codes: List[List[str]] = [["OFF"] * n for _ in ids]
+    rows: List[List[Optional[object]]] = [[None] * n for _ in ids]
+    code_cache: Dict[str, str] = {}
+
+    for di, d in enumerate(dates):
+        for a in schedule[d]:
+            ei = index.get(a.employee_id)
+            if ei is None:
+                if fixed:
+                    continue
+                ei = len(ids)
+                ids.append(a.employee_id)
+                index[a.employee_id] = ei
+                codes.append(["OFF"] * n)
+                rows.append([None] * n)
+            if rows[ei][di] is not None:
+                continue
+            key = a.shift_key
+            code = code_cache.get(key)
+            if code is None:
+                code = code_of(key).upper()
+                code_cache[key] = code
+            rows[ei][di] = a
+            codes[ei][di] = code
+
+    return ScheduleGrid(dates=dates, emp_ids=ids, emp_index=index, codes=codes, rows=rows)
+
+
+__all__ = ["ScheduleGrid", "build_grid"]
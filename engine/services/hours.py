@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Единый подсчёт часов и токенов D/N/O по расписанию (Dict[date, List[Assignment]]).
+# Один проход строит колонки «сотрудник × дата» (часы, токен и офис дня) и агрегаты:
+# итог по сотруднику, по офису A/B и по типу дня D/N/O. Часы — effective_hours строк
+# (все строки сотрудника за день суммируются), токен дня — по первой строке (как в grid).
+# Этим пользуются балансер, сокращения и отчёты, чтобы часы везде считались одинаково.
+# Заодно сверяются effective_hours и часы по коду смены — расхождения в mismatches.
+
+DAY_CODES = frozenset({"DA", "DB", "M8A", "M8B", "E8A", "E8B"})
+NIGHT_CODES = frozenset({"NA", "NB", "N4A", "N4B", "N8A", "N8B"})
+
+CODE_HOURS: Dict[str, int] = {
+    "DA": 12, "DB": 12, "NA": 12, "NB": 12,
+    "M8A": 8, "M8B": 8, "E8A": 8, "E8B": 8, "N8A": 8, "N8B": 8, "VAC8": 8,
+    "N4A": 4, "N4B": 4,
+}
+
+
+def code_hours(code: str) -> int:
+    """Часы смены по коду (неизвестный код, OFF, VAC0 — 0)."""
+    return CODE_HOURS.get((code or "OFF").upper(), 0)
+
+
+def code_token(code: str) -> str:
+    c = (code or "").upper()
+    if c in DAY_CODES:
+        return "D"
+    if c in NIGHT_CODES:
+        return "N"
+    return "O"
+
+
+def code_office(code: str) -> Optional[str]:
+    c = (code or "").upper()
+    if c in DAY_CODES or c in NIGHT_CODES:
+        return c[-1]
+    return None
+
+
+@dataclass
+class HoursMismatch:
+    employee_id: str
+    date: date
+    code: str
+    effective_hours: int
+    code_hours: int
+
+    def __str__(self) -> str:
+        return (
+            f"{self.date.isoformat()} {self.employee_id}: {self.code} effective_hours={self.effective_hours}, "
+            f"по коду {self.code_hours}ч"
+        )
+
+
+@dataclass
+class HoursTable:
+    dates: List[date]
+    emp_ids: List[str]
+    emp_index: Dict[str, int]
+    hours: List[List[int]]  # [emp][day] — сумма effective_hours строк сотрудника за день
+    tokens: List[List[str]]  # [emp][day] — D/N/O первой строки, "" если строк за день нет
+    offices: List[List[Optional[str]]]  # [emp][day] — офис A/B первой строки (None — выходной/отпуск)
+    totals: Dict[str, int] = field(default_factory=dict)
+    token_counts: Dict[str, Dict[str, int]] = field(default_factory=dict)  # сотрудник -> D/N/O -> дней
+    token_hours: Dict[str, Dict[str, int]] = field(default_factory=dict)  # сотрудник -> D/N/O -> часов
+    office_hours: Dict[str, Dict[str, int]] = field(default_factory=dict)  # сотрудник -> A/B -> часов
+    mismatches: List[HoursMismatch] = field(default_factory=list)
+
+    def total(self, emp_id: str) -> int:
+        return self.totals.get(emp_id, 0)
+
+    def date_index(self) -> Dict[date, int]:
+        return {d: i for i, d in enumerate(self.dates)}
+
+
+def build_hours(schedule, code_of, emp_ids: Optional[Iterable[str]] = None) -> HoursTable:
+    """
+    Таблица часов за один проход. emp_ids заданы — строки прочих сотрудников пропускаются,
+    а у заданных без строк итог 0; иначе сотрудники берутся из расписания по порядку появления.
+    """
+    dates = sorted(schedule.keys())
+    fixed = emp_ids is not None
+    ids: List[str] = list(emp_ids) if fixed else []
+    index: Dict[str, int] = {}
+    for eid in ids:
+        index.setdefault(eid, len(index))
+    ids = list(index)
+    n = len(dates)
+    hours: List[List[int]] = [[0] * n for _ in ids]
+    tokens: List[List[str]] = [[""] * n for _ in ids]
+    offices: List[List[Optional[str]]] = [[None] * n for _ in ids]
+    profile: Dict[str, Tuple[str, str, Optional[str], int]] = {}  # shift_key -> (код, токен, офис, часы по коду)
+    mismatches: List[HoursMismatch] = []
+
+    for di, d in enumerate(dates):
+        for a in schedule[d]:
+            ei = index.get(a.employee_id)
+            if ei is None:
+                if fixed:
+                    continue
+                ei = len(ids)
+                ids.append(a.employee_id)
+                index[a.employee_id] = ei
+                hours.append([0] * n)
+                tokens.append([""] * n)
+                offices.append([None] * n)
+            prof = profile.get(a.shift_key)
+            if prof is None:
+                code = code_of(a.shift_key).upper()
+                prof = (code, code_token(code), code_office(code), code_hours(code))
+                profile[a.shift_key] = prof
+            h = int(a.effective_hours)
+            hours[ei][di] += h
+            if not tokens[ei][di]:
+                tokens[ei][di] = prof[1]
+                offices[ei][di] = prof[2]
+            if h != prof[3]:
+                mismatches.append(HoursMismatch(a.employee_id, d, prof[0], h, prof[3]))
+
+    table = HoursTable(
+        dates=dates, emp_ids=ids, emp_index=index, hours=hours, tokens=tokens, offices=offices, mismatches=mismatches
+    )
+    # агрегаты по строкам таблицы
+    for ei, eid in enumerate(ids):
+        row_h, row_t, row_o = hours[ei], tokens[ei], offices[ei]
+        counts = {"D": 0, "N": 0, "O": 0}
+        by_tok = {"D": 0, "N": 0, "O": 0}
+        by_office: Dict[str, int] = {"A": 0, "B": 0}
+        for di in range(n):
+            tok = row_t[di]
+            if not tok:
+                continue
+            counts[tok] += 1
+            by_tok[tok] += row_h[di]
+            office = row_o[di]
+            if office is not None:
+                by_office[office] += row_h[di]
+        table.totals[eid] = sum(row_h)
+        table.token_counts[eid] = counts
+        table.token_hours[eid] = by_tok
+        table.office_hours[eid] = by_office
+    return table
+
+
+def hours_by_employee(schedule, code_of) -> Dict[str, int]:
+    """Итог часов по сотрудникам (effective_hours всех строк)."""
+    return dict(build_hours(schedule, code_of).totals)
+
+
+__all__ = [
+    "CODE_HOURS",
+    "HoursMismatch",
+    "HoursTable",
+    "build_hours",
+    "code_hours",
+    "code_office",
+    "code_token",
+    "hours_by_employee",
+]
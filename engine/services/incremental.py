@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Set
+
+# Определение изменений между двумя конфигурациями горизонта: самая ранняя
+# затронутая дата (и причины). Всё, что раньше этой даты, можно брать из прошлого
+# прогона; месяц с этой датой и последующие пересчитываются (последующие — из кэша,
+# если их CarryState не изменился).
+
+# Разделы, правка которых затрагивает весь горизонт и всех сотрудников
+GLOBAL_SECTIONS = (
+    "shift_types",
+    "pair_breaking",
+    "monthly_overtime_max",
+    "yearly_overtime_max",
+    "rotation_epoch_policy",
+    "shortening",
+    "validation",
+    "coverage",
+)
+
+
+@dataclass
+class ChangeSet:
+    """earliest=None — изменений нет."""
+
+    earliest: Optional[date] = None
+    reasons: List[str] = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return self.earliest is not None
+
+    @property
+    def first_ym(self) -> Optional[str]:
+        if self.earliest is None:
+            return None
+        return f"{self.earliest.year:04d}-{self.earliest.month:02d}"
+
+    def touch(self, dt: date, reason: str) -> None:
+        if self.earliest is None or dt < self.earliest:
+            self.earliest = dt
+        self.reasons.append(reason)
+
+
+def _first_day(ym: str) -> date:
+    y, m = map(int, ym.split("-"))
+    return date(y, m, 1)
+
+
+def _vacation_sets(cfg: Dict) -> Dict[str, Set[date]]:
+    out: Dict[str, Set[date]] = {}
+    for ms in cfg.get("months", []) or []:
+        for eid, dates in (ms.get("vacations", {}) or {}).items():
+            out.setdefault(eid, set()).update(dates)
+    return out
+
+
+def diff_configs(old: Optional[Dict], new: Dict) -> ChangeSet:
+    """
+    Сравнивает конфиги горизонта. Правила:
+     - глобальные разделы (типы смен, балансер, лимиты, эпоха) или состав/порядок сотрудников
+       → с первого месяца (bootstrap-фазы зависят от позиции в списке);
+     - поля записи сотрудника (ytd_overtime, стажёр…) → с первого месяца;
+     - month_spec без отпусков (норма и т.п.) → с 1-го числа месяца;
+     - отпуска → с самой ранней добавленной/снятой даты.
+    """
+    change = ChangeSet()
+    new_months = [ms["month_year"] for ms in new.get("months", []) or []]
+    if old is None:
+        if new_months:
+            change.touch(_first_day(new_months[0]), "initial")
+        return change
+
+    old_months = [ms["month_year"] for ms in old.get("months", []) or []]
+    horizon_start = _first_day(min(new_months + old_months)) if (new_months or old_months) else None
+
+    for key in GLOBAL_SECTIONS:
+        if old.get(key) != new.get(key) and horizon_start is not None:
+            change.touch(horizon_start, f"config.{key}")
+
+    old_emps = old.get("employees", []) or []
+    new_emps = new.get("employees", []) or []
+    if [e["id"] for e in old_emps] != [e["id"] for e in new_emps]:
+        if horizon_start is not None:
+            change.touch(horizon_start, "employees.roster")
+    else:
+        for a, b in zip(old_emps, new_emps):
+            if a != b and horizon_start is not None:
+                change.touch(horizon_start, f"employees.{b['id']}")
+
+    old_specs = {ms["month_year"]: ms for ms in old.get("months", []) or []}
+    new_specs = {ms["month_year"]: ms for ms in new.get("months", []) or []}
+    for ym in sorted(set(old_specs) | set(new_specs)):
+        a = {k: v for k, v in (old_specs.get(ym) or {}).items() if k != "vacations"}
+        b = {k: v for k, v in (new_specs.get(ym) or {}).items() if k != "vacations"}
+        if a != b:
+            change.touch(_first_day(ym), f"months.{ym}")
+
+    old_vac = _vacation_sets(old)
+    new_vac = _vacation_sets(new)
+    for eid in sorted(set(old_vac) | set(new_vac)):
+        diff = old_vac.get(eid, set()) ^ new_vac.get(eid, set())
+        if diff:
+            change.touch(min(diff), f"vacations.{eid}")
+
+    return change
+
+
+__all__ = ["ChangeSet", "diff_configs", "GLOBAL_SECTIONS"]
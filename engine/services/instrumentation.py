@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Iterable, Iterator, Optional
+import copy
+import json
+
+# Счётчики и тайминги горячих путей (балансер, операторы shifts_ops).
+# Активный сборщик один на поток выполнения (ContextVar: у каждого потока свой):
+# copy_schedule() учитывает глубокие копии только пока открыт контекст collecting().
+
+_ACTIVE: ContextVar[Optional["OpStats"]] = ContextVar("instrumentation_active", default=None)
+
+
+class OpStats:
+    """Счётчики операторов (tried/accepted/rejected по причинам) и вызовов с суммарным временем."""
+
+    def __init__(self) -> None:
+        self.operators: Dict[str, Dict[str, object]] = {}
+        self.calls: Dict[str, Dict[str, float]] = {}
+
+    # ---------- Операторы ----------
+    def _op(self, name: str) -> Dict[str, object]:
+        rec = self.operators.get(name)
+        if rec is None:
+            rec = {"tried": 0, "accepted": 0, "rejected": 0, "reject_reasons": {}}
+            self.operators[name] = rec
+        return rec
+
+    def tried(self, op: str) -> None:
+        self._op(op)["tried"] += 1
+
+    def accepted(self, op: str) -> None:
+        self._op(op)["accepted"] += 1
+
+    def rejected(self, op: str, reasons: Iterable[str]) -> None:
+        rec = self._op(op)
+        rec["rejected"] += 1
+        by_reason = rec["reject_reasons"]
+        for reason in reasons:
+            by_reason[reason] = by_reason.get(reason, 0) + 1
+
+    # ---------- Вызовы ----------
+    def add_call(self, name: str, seconds: float, n: int = 1) -> None:
+        rec = self.calls.get(name)
+        if rec is None:
+            rec = {"count": 0, "seconds": 0.0}
+            self.calls[name] = rec
+        rec["count"] += n
+        rec["seconds"] += seconds
+
+    @contextmanager
+    def timed(self, name: str) -> Iterator[None]:
+        t0 = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_call(name, perf_counter() - t0)
+
+    # ---------- Экспорт ----------
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "operators": {k: dict(v, reject_reasons=dict(v["reject_reasons"])) for k, v in sorted(self.operators.items())},
+            "calls": {
+                k: {"count": int(v["count"]), "seconds": round(v["seconds"], 6)}
+                for k, v in sorted(self.calls.items())
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, payload: Dict[str, object]) -> "OpStats":
+        """Обратное к to_dict (например, при чтении из кэша месяцев)."""
+        stats = cls()
+        for name, rec in (payload.get("operators") or {}).items():
+            stats.operators[name] = dict(rec, reject_reasons=dict(rec.get("reject_reasons") or {}))
+        for name, rec in (payload.get("calls") or {}).items():
+            stats.calls[name] = {"count": int(rec["count"]), "seconds": float(rec["seconds"])}
+        return stats
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+    def write_json(self, path: str) -> str:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json())
+            f.write("\n")
+        return path
+
+
+@contextmanager
+def collecting(stats: Optional[OpStats]) -> Iterator[Optional[OpStats]]:
+    """Делает stats активным сборщиком для copy_schedule() на время блока."""
+    token = _ACTIVE.set(stats)
+    try:
+        yield stats
+    finally:
+        _ACTIVE.reset(token)
+
+
+def copy_schedule(schedule):
+    """copy.deepcopy расписания с учётом в активном сборщике (вызов "deepcopy")."""
+    stats = _ACTIVE.get()
+    if stats is None:
+        return copy.deepcopy(schedule)
+    t0 = perf_counter()
+    out = copy.deepcopy(schedule)
+    stats.add_call("deepcopy", perf_counter() - t0)
+    return out
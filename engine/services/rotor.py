@@ -1,9 +1,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
+from bisect import bisect_left
 from dataclasses import dataclass
 from datetime import date
 from typing import List, Optional, Tuple
 
+from engine.services import dirty
+
+# Undo-токен in-place операторов: изменённые ячейки в порядке изменения,
+# (date, emp_id, prev_shift_key, prev_effective_hours, prev_source).
+UndoToken = List[Tuple[date, str, str, int, str]]
+
 DAY_CODES = {"DA", "DB", "M8A", "M8B", "E8A", "E8B"}
 NIGHT_CODES = {"NA", "NB"}
 N8 = {"N8A", "N8B"}
@@ -37,13 +44,6 @@ def _is_night(code: str) -> bool:
     return code in NIGHT_CODES or code in N4 or code in N8
 
 
-def _code_on(schedule, code_of, emp_id: str, day: date) -> str:
-    for assignment in schedule[day]:
-        if assignment.employee_id == emp_id:
-            return code_of(assignment.shift_key).upper()
-    return "OFF"
-
-
 def _ab_of(code: str) -> Optional[str]:
     if not code:
         return None
@@ -85,22 +85,31 @@ class RotorState:
         return "NA" if self.night_ab == "A" else "NB"
 
 
-def infer_state(schedule, code_of, emp_id: str, start_date: date) -> RotorState:
-    days = sorted(schedule.keys())
+def _tape(schedule, code_of, emp_id: str, days: List[date]) -> Tuple[List[str], List[object]]:
+    """Лента сотрудника по дням: (коды, строки Assignment|None) — один проход по строкам."""
+    codes: List[str] = []
+    rows: List[object] = []
+    for day in days:
+        found = None
+        for assignment in schedule[day]:
+            if assignment.employee_id == emp_id:
+                found = assignment
+                break
+        rows.append(found)
+        codes.append(code_of(found.shift_key).upper() if found is not None else "OFF")
+    return codes, rows
+
+
+def _infer_state_on_tape(codes: List[str], start_idx: int, at_first_day: bool) -> RotorState:
     state = RotorState()
-    if not days:
+    if not codes:
         return state
 
-    first_day = days[0]
-    if first_day == start_date:
-        first_code = _code_on(schedule, code_of, emp_id, first_day)
-        if first_code in N8:
-            state.night_ab = _ab_of(first_code)
+    if at_first_day and codes[0] in N8:
+        state.night_ab = _ab_of(codes[0])
 
-    for day in reversed(days):
-        if day >= start_date:
-            continue
-        code = _code_on(schedule, code_of, emp_id, day)
+    for i in range(min(start_idx, len(codes)) - 1, -1, -1):
+        code = codes[i]
         if code in DAY_CODES and state.day_ab is None:
             state.day_ab = _ab_of(code)
         if _is_night(code) and state.night_ab is None:
@@ -110,19 +119,46 @@ def infer_state(schedule, code_of, emp_id: str, start_date: date) -> RotorState:
     return state
 
 
-def _set_code(schedule, emp_id: str, day: date, code: Optional[str]) -> None:
-    for assignment in schedule[day]:
-        if assignment.employee_id != emp_id:
-            continue
-        target_code = (code or "OFF").upper()
-        info = _CODE_TO_INFO.get(target_code)
-        if info is None:
-            return
-        key, hours = info
-        assignment.shift_key = key
-        assignment.effective_hours = hours
-        assignment.source = "phase_shift"
+def infer_state(schedule, code_of, emp_id: str, start_date: date) -> RotorState:
+    days = sorted(schedule.keys())
+    if not days:
+        return RotorState()
+    codes, _ = _tape(schedule, code_of, emp_id, days)
+    return _infer_state_on_tape(codes, bisect_left(days, start_date), days[0] == start_date)
+
+
+def remember(undo: Optional[UndoToken], day: date, assignment) -> None:
+    """Запоминает прежнее состояние ячейки в undo-токене (если он ведётся) и отмечает её изменённой."""
+    dirty.mark(assignment.employee_id, day)
+    if undo is not None:
+        undo.append(
+            (day, assignment.employee_id, assignment.shift_key, assignment.effective_hours, assignment.source)
+        )
+
+
+def revert(schedule, undo: UndoToken) -> None:
+    """Откатывает изменения in-place оператора по его undo-токену."""
+    for day, emp_id, key, hours, source in reversed(undo):
+        for assignment in schedule[day]:
+            if assignment.employee_id == emp_id:
+                assignment.shift_key = key
+                assignment.effective_hours = hours
+                assignment.source = source
+                break
+
+
+def _set_row(assignment, day: date, code: Optional[str], undo: Optional[UndoToken] = None) -> None:
+    if assignment is None:
+        return
+    target_code = (code or "OFF").upper()
+    info = _CODE_TO_INFO.get(target_code)
+    if info is None:
         return
+    key, hours = info
+    remember(undo, day, assignment)
+    assignment.shift_key = key
+    assignment.effective_hours = hours
+    assignment.source = "phase_shift"
 
 
 def stitch_into_schedule(
@@ -133,29 +169,34 @@ def stitch_into_schedule(
     tokens: List[str],
     partner_id: Optional[str] = None,
     anti_align: bool = True,
+    undo: Optional[UndoToken] = None,
 ) -> None:
-    """Перекрашивает хвост по ленте токенов, с учётом чередования офисов."""
+    """Перекрашивает хвост по ленте токенов, с учётом чередования офисов.
 
-    days = sorted(schedule.keys())
-    if start_date not in days:
+    Ленты сотрудника и напарника строятся один раз на вызов, дальше все проходы
+    по токенам — O(1) на день. Если передан undo — в него пишутся прежние
+    состояния изменённых ячеек.
+    """
+
+    if start_date not in schedule:
         return
-    start_idx = days.index(start_date)
-    state = infer_state(schedule, code_of, emp_id, start_date)
+    days = sorted(schedule.keys())
+    start_idx = bisect_left(days, start_date)
+    codes, rows = _tape(schedule, code_of, emp_id, days)
+    state = _infer_state_on_tape(codes, start_idx, start_idx == 0)
+    span = min(len(tokens), len(days) - start_idx)
 
     if anti_align and partner_id:
+        partner_codes, _ = _tape(schedule, code_of, partner_id, days)
         primed_day_partner = False
         primed_night_partner = False
-        for offset, token in enumerate(tokens):
+        for offset in range(span):
             if primed_day_partner and primed_night_partner:
                 break
-            idx = start_idx + offset
-            if idx >= len(days):
-                break
+            token = tokens[offset]
             if token not in ("D", "N"):
                 continue
-            day = days[idx]
-            partner_code = _code_on(schedule, code_of, partner_id, day).upper()
-            kind_ab = _partner_kind_ab(partner_code)
+            kind_ab = _partner_kind_ab(partner_codes[start_idx + offset])
             if not kind_ab:
                 continue
             kind, partner_ab = kind_ab
@@ -172,16 +213,13 @@ def stitch_into_schedule(
 
     primed_day_self = False
     primed_night_self = False
-    for offset, token in enumerate(tokens):
+    for offset in range(span):
         if primed_day_self and primed_night_self:
             break
-        idx = start_idx + offset
-        if idx >= len(days):
-            break
+        token = tokens[offset]
         if token not in ("D", "N"):
             continue
-        day = days[idx]
-        current_code = _code_on(schedule, code_of, emp_id, day).upper()
+        current_code = codes[start_idx + offset]
         if token == "D" and not primed_day_self and _is_day(current_code):
             ab = _ab_of(current_code)
             if ab in ("A", "B") and state.day_ab is None:
@@ -193,23 +231,48 @@ def stitch_into_schedule(
                 state.night_ab = "B" if ab == "A" else "A"
                 primed_night_self = True
 
-    for offset, token in enumerate(tokens):
+    last_idx = len(days) - 1
+    for offset in range(span):
+        token = tokens[offset]
         idx = start_idx + offset
-        if idx >= len(days):
-            break
         day = days[idx]
-        current_code = _code_on(schedule, code_of, emp_id, day)
+        current_code = codes[idx]
         if current_code in VAC or current_code in N8 or (current_code in N4 and token != "N"):
             continue
         if token == "O":
-            _set_code(schedule, emp_id, day, None)
+            _set_row(rows[idx], day, None, undo)
         elif token == "D":
-            _set_code(schedule, emp_id, day, state.next_day_code())
+            _set_row(rows[idx], day, state.next_day_code(), undo)
         elif token == "N":
             code_full = state.next_night_code()
-            if day == days[-1]:
+            if idx == last_idx:
                 n4_code = "N4A" if code_full.endswith("A") else "N4B"
-                _set_code(schedule, emp_id, day, n4_code)
+                _set_row(rows[idx], day, n4_code, undo)
             else:
-                _set_code(schedule, emp_id, day, code_full)
+                _set_row(rows[idx], day, code_full, undo)
         # иные токены игнорируем
+
+
+def stitch_into_schedule_inplace(
+    schedule,
+    code_of,
+    emp_id: str,
+    start_date: date,
+    tokens: List[str],
+    partner_id: Optional[str] = None,
+    anti_align: bool = True,
+) -> UndoToken:
+    """Как stitch_into_schedule, но возвращает undo-токен для revert()."""
+
+    undo: UndoToken = []
+    stitch_into_schedule(
+        schedule,
+        code_of,
+        emp_id,
+        start_date,
+        tokens,
+        partner_id=partner_id,
+        anti_align=anti_align,
+        undo=undo,
+    )
+    return undo
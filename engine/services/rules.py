@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from time import perf_counter
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from engine.services import grid as grid_mod
+from engine.services.validator import ValidationIssue, _baseline_char, _baseline_row_issues
+
+# Декларативный набор проверок расписания, который исполняется за один проход по
+# плотной сетке (grid.build_grid): каждое правило — либо «лента» (строка сотрудника по
+# датам), либо «столбец» (все сотрудники за день). Разбросанные по модулям проверки
+# (цикл baseline, соло-дни, ночь перед отпуском, два дневных при сокращении, места N8/N4)
+# собраны здесь как правила RULES; новое правило добавляется в набор (register или
+# compile_rules(extra=...)) и считается в том же проходе, без ещё одного скана месяца.
+# У каждого правила свои счётчики (проверено лент/столбцов, нарушений) и время.
+#
+# Нарушения — validator.ValidationIssue с rule=<имя правила>; baseline.cycle даёт те же
+# записи, что validator.iter_baseline_issues (кроме дублей строк за день: сетка берёт первую).
+
+DAY_CODES = frozenset({"DA", "DB", "M8A", "M8B", "E8A", "E8B"})
+SHORT_DAY_CODES = frozenset({"M8A", "M8B", "E8A", "E8B"})
+NIGHT_CODES = frozenset({"NA", "NB", "N8A", "N8B", "N4A", "N4B"})
+N8_CODES = frozenset({"N8A", "N8B"})
+N4_CODES = frozenset({"N4A", "N4B"})
+VAC_CODES = frozenset({"VAC8", "VAC0"})
+
+TAPE = "tape"
+COLUMN = "column"
+
+
+@dataclass
+class RuleContext:
+    """Общие данные прохода: месяц, даты, сотрудники сетки и параметры правил."""
+
+    ym: str
+    dates: List[date]
+    emp_ids: List[str]
+    ignore_vacations: bool = True
+    month_start: bool = True  # первая дата — 1-е число (N8 на ней — перенос с прошлого месяца)
+    month_end: bool = True  # последняя дата — последний день месяца (место для N4)
+    memo: Dict[str, object] = field(default_factory=dict)  # кэш правил на время прохода
+
+
+@dataclass
+class Column:
+    """Столбец сетки: день di, коды сотрудников и индексы «дневных» (DA/DB/M8/E8)."""
+
+    di: int
+    date: date
+    codes: List[str]
+    day_workers: List[int]
+
+
+# Лента: (ctx, индекс сотрудника, коды по датам) -> [(индекс даты, ожидалось, есть)]
+TapeCheck = Callable[[RuleContext, int, List[str]], Iterable[Tuple[int, str, str]]]
+# Столбец: (ctx, Column) -> [(индекс сотрудника, ожидалось, есть)]
+ColumnCheck = Callable[[RuleContext, Column], Iterable[Tuple[int, str, str]]]
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    scope: str  # TAPE | COLUMN
+    check: Callable
+    description: str = ""
+
+
+@dataclass
+class RuleStats:
+    checked: int = 0  # лент или столбцов
+    violations: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"checked": self.checked, "violations": self.violations, "seconds": round(self.seconds, 6)}
+
+
+@dataclass
+class RuleReport:
+    ym: str
+    issues: List[ValidationIssue] = field(default_factory=list)
+    stats: Dict[str, RuleStats] = field(default_factory=dict)
+
+    def by_rule(self, name: str) -> List[ValidationIssue]:
+        return [x for x in self.issues if x.rule == name]
+
+    def to_dict(self) -> Dict[str, object]:
+        return {"ym": self.ym, "rules": {k: v.to_dict() for k, v in self.stats.items()}}
+
+
+# ---------- Правила ----------
+def _check_cycle(ctx: RuleContext, ei: int, tape: List[str]) -> Iterable[Tuple[int, str, str]]:
+    """Цикл D→N→O→O от старта на 1-е (как validate_baseline)."""
+    row = "".join([_baseline_char(c) for c in tape])
+    memo = ctx.memo.setdefault("baseline.cycle", {})
+    res = memo.get(row)
+    if res is None:
+        res = memo[row] = _baseline_row_issues(row, ctx.ignore_vacations)
+    exp, bad = res
+    return [(i, exp[i], "O" if row[i] in "8v" else row[i]) for i in bad]
+
+
+def _check_night_before_vacation(ctx: RuleContext, ei: int, tape: List[str]) -> Iterable[Tuple[int, str, str]]:
+    """Ночная (NA/NB/N8/N4) накануне отпуска — postprocess.apply_vacations снимает её в OFF."""
+    return [
+        (i, "OFF", tape[i])
+        for i in range(len(tape) - 1)
+        if tape[i + 1] in VAC_CODES and tape[i] in NIGHT_CODES
+    ]
+
+
+def _check_n8_placement(ctx: RuleContext, ei: int, tape: List[str]) -> Iterable[Tuple[int, str, str]]:
+    """N8* — только хвост ночи с прошлого месяца на 1-е число (shifts_ops не создаёт N8 внутри месяца)."""
+    return [
+        (i, "N" + c[-1], c)
+        for i, c in enumerate(tape)
+        if c in N8_CODES and not (i == 0 and ctx.month_start)
+    ]
+
+
+def _check_n4_placement(ctx: RuleContext, ei: int, tape: List[str]) -> Iterable[Tuple[int, str, str]]:
+    """N4* — только в последний день месяца, и полная ночь в последний день укорачивается до N4."""
+    last = len(tape) - 1
+    out: List[Tuple[int, str, str]] = []
+    for i, c in enumerate(tape):
+        if c in N4_CODES and not (i == last and ctx.month_end):
+            out.append((i, "N" + c[-1], c))
+    if last >= 0 and ctx.month_end and tape[last] in ("NA", "NB"):
+        out.append((last, "N4" + tape[last][-1], tape[last]))
+    return out
+
+
+def _check_solo_day(ctx: RuleContext, col: Column) -> Iterable[Tuple[int, str, str]]:
+    """Единственный дневной за день (как coverage.solo_days_by_employee)."""
+    if len(col.day_workers) == 1:
+        return [(col.day_workers[0], "D≥2", "D=1")]
+    return ()
+
+
+def _check_short_day_workers(ctx: RuleContext, col: Column) -> Iterable[Tuple[int, str, str]]:
+    """Сокращённая дневная (M8/E8) допустима, только если дневных за день минимум двое (ShiftShortener)."""
+    n = len(col.day_workers)
+    if n >= 2:
+        return ()
+    return [(ei, "D≥2", f"D={n}") for ei in col.day_workers if col.codes[ei] in SHORT_DAY_CODES]
+
+
+RULES: Dict[str, Rule] = {}
+
+
+def register(rule: Rule) -> Rule:
+    """Добавить правило в реестр (имя уникально; повторная регистрация заменяет правило)."""
+    if rule.scope not in (TAPE, COLUMN):
+        raise ValueError(f"rule {rule.name}: unknown scope {rule.scope!r}")
+    RULES[rule.name] = rule
+    return rule
+
+
+register(Rule("baseline.cycle", TAPE, _check_cycle, "цикл D→N→O→O от 1-го числа"))
+register(Rule("vacation.night_before", TAPE, _check_night_before_vacation, "нет ночи накануне отпуска"))
+register(Rule("placement.n8", TAPE, _check_n8_placement, "N8 только на 1-е число"))
+register(Rule("placement.n4", TAPE, _check_n4_placement, "N4 только в последний день месяца"))
+register(Rule("coverage.solo_day", COLUMN, _check_solo_day, "в день минимум два дневных"))
+register(Rule("shortening.two_day_workers", COLUMN, _check_short_day_workers, "сокращение при двух дневных"))
+
+
+# ---------- Исполнение ----------
+class CompiledRules:
+    """Набор правил, разложенный на ленточные и столбцовые; run() — один проход по сетке."""
+
+    def __init__(self, rules: Sequence[Rule]) -> None:
+        names = [r.name for r in rules]
+        if len(set(names)) != len(names):
+            raise ValueError(f"duplicate rule names: {names}")
+        self.rules: Tuple[Rule, ...] = tuple(rules)
+        self.tape_rules: Tuple[Rule, ...] = tuple(r for r in rules if r.scope == TAPE)
+        self.column_rules: Tuple[Rule, ...] = tuple(r for r in rules if r.scope == COLUMN)
+
+    @property
+    def names(self) -> List[str]:
+        return [r.name for r in self.rules]
+
+    def run(
+        self,
+        ym: str,
+        employees,
+        schedule,
+        code_of,
+        *,
+        ignore_vacations: bool = True,
+    ) -> RuleReport:
+        """Строит сетку по сотрудникам месяца (в их порядке) и проверяет её."""
+        sg = grid_mod.build_grid(schedule, code_of, [e.id for e in employees])
+        return self.run_grid(ym, sg, ignore_vacations=ignore_vacations)
+
+    def run_grid(self, ym: str, sg: grid_mod.ScheduleGrid, *, ignore_vacations: bool = True) -> RuleReport:
+        """Проверка уже построенной сетки (без повторного прохода по расписанию)."""
+        dates, emp_ids = sg.dates, sg.emp_ids
+        report = RuleReport(ym=ym, stats={r.name: RuleStats() for r in self.rules})
+        if not dates:
+            return report
+        nxt = dates[-1] + timedelta(days=1)
+        ctx = RuleContext(
+            ym=ym, dates=dates, emp_ids=emp_ids, ignore_vacations=ignore_vacations,
+            month_start=dates[0].day == 1, month_end=nxt.month != dates[-1].month,
+        )
+        issues = report.issues
+        stats = report.stats
+
+        if self.tape_rules:
+            for ei, eid in enumerate(emp_ids):
+                tape = sg.codes[ei]
+                for rule in self.tape_rules:
+                    st = stats[rule.name]
+                    t0 = perf_counter()
+                    found = rule.check(ctx, ei, tape)
+                    st.seconds += perf_counter() - t0
+                    st.checked += 1
+                    for di, exp, act in found:
+                        st.violations += 1
+                        issues.append(ValidationIssue(ym, eid, dates[di], exp, act, rule.name))
+
+        if self.column_rules:
+            codes = sg.codes
+            n_emp = len(emp_ids)
+            for di, d in enumerate(dates):
+                col_codes = [codes[ei][di] for ei in range(n_emp)]
+                col = Column(di, d, col_codes, [ei for ei, c in enumerate(col_codes) if c in DAY_CODES])
+                for rule in self.column_rules:
+                    st = stats[rule.name]
+                    t0 = perf_counter()
+                    found = rule.check(ctx, col)
+                    st.seconds += perf_counter() - t0
+                    st.checked += 1
+                    for ei, exp, act in found:
+                        st.violations += 1
+                        issues.append(ValidationIssue(ym, emp_ids[ei], d, exp, act, rule.name))
+        return report
+
+
+def compile_rules(names: Optional[Iterable[str]] = None, extra: Iterable[Rule] = ()) -> CompiledRules:
+    """Набор из реестра RULES (names=None — все) плюс extra — правила вне реестра."""
+    chosen: List[Rule] = []
+    for name in (list(RULES) if names is None else names):
+        rule = RULES.get(name)
+        if rule is None:
+            raise ValueError(f"unknown rule: {name}")
+        chosen.append(rule)
+    chosen.extend(extra)
+    return CompiledRules(chosen)
+
+
+def check_schedule(ym: str, employees, schedule, code_of, names: Optional[Iterable[str]] = None, **kwargs) -> RuleReport:
+    return compile_rules(names).run(ym, employees, schedule, code_of, **kwargs)
+
+
+__all__ = [
+    "COLUMN",
+    "Column",
+    "CompiledRules",
+    "RULES",
+    "Rule",
+    "RuleContext",
+    "RuleReport",
+    "RuleStats",
+    "TAPE",
+    "check_schedule",
+    "compile_rules",
+    "register",
+]
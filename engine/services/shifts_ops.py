@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import List, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 from datetime import date
-import copy
 
+from engine.services import dirty
+from engine.services import grid
 from engine.services import rotor
+from engine.services.instrumentation import copy_schedule
+from engine.services.rotor import UndoToken, remember
 
 # --- Code groups ---
 N8 = {"N8A", "N8B"}
@@ -146,19 +149,43 @@ def shift_phase(schedule, code_of, emp_id: str, direction: int, window: Tuple[da
      - не создаём N4 вне последнего дня месяца.
     """
 
-    assert direction in (-1, +1)
+    # невыполнимый сдвиг (нет строк, пустое/узкое окно) отсекаем до копирования расписания
     dates, seq = _emp_seq(schedule, code_of, emp_id)
-    if not seq:
-        return schedule, 0, False, "no-rows"
+    span, note = _shift_span(dates, [c for (_, _, c) in seq], window)
+    if span is None:
+        return schedule, 0, False, note
+    new_sched = copy_schedule(schedule)
+    _, hours_delta, ok, note = shift_phase_inplace(new_sched, code_of, emp_id, direction, window)
+    return (new_sched if ok else schedule), hours_delta, ok, note
+
+
+def shift_phase_inplace(schedule, code_of, emp_id: str, direction: int, window: Tuple[date, date]):
+    """In-place вариант shift_phase: возвращает (undo, hours_delta, ok, note)."""
+
+    undo: UndoToken = []
+    dates, seq = _emp_seq(schedule, code_of, emp_id)
+    rows = [a for (_, a, _) in seq]
+    codes = [c for (_, _, c) in seq]
+    hours_delta, ok, note = _shift_row(dates, rows, codes, direction, window, undo)
+    return undo, hours_delta, ok, note
+
+
+def _shift_span(
+    dates: List[date], codes: List[str], window: Tuple[date, date]
+) -> Tuple[Optional[Tuple[int, int]], str]:
+    """Индексы [i0..i1] окна сдвига на ленте сотрудника или (None, причина), если сдвиг невозможен."""
+
+    if not codes:
+        return None, "no-rows"
 
     start = 0
-    if seq and seq[0][2] in N8:
+    if codes[0] in N8:
         start = 1
 
     d0, d1 = window
     n = len(dates)
     if start >= n:
-        return schedule, 0, False, "window-empty"
+        return None, "window-empty"
 
     try:
         i0 = dates.index(d0)
@@ -173,9 +200,29 @@ def shift_phase(schedule, code_of, emp_id: str, direction: int, window: Tuple[da
     i0 = min(i0, n - 1)
     i1 = min(i1, n - 1)
     if i0 >= i1:
-        return schedule, 0, False, f"window-too-narrow({i0},{i1})"
+        return None, f"window-too-narrow({i0},{i1})"
+    return (i0, i1), ""
+
+
+def _shift_row(
+    dates: List[date],
+    rows: List[object],
+    codes: List[str],
+    direction: int,
+    window: Tuple[date, date],
+    undo: Optional[UndoToken],
+) -> Tuple[int, bool, str]:
+    """Ядро shift_phase над лентой одного сотрудника (даты/строки/коды только дней со строкой).
+
+    Меняет строки на месте и обновляет codes до нового состояния. Возвращает (hours_delta, ok, note).
+    """
+
+    assert direction in (-1, +1)
+    span, note = _shift_span(dates, codes, window)
+    if span is None:
+        return 0, False, note
+    i0, i1 = span
 
-    codes = [c for (_, _, c) in seq]
     new_codes = _rot(codes, i0, i1, direction)
 
     for k in range(i0, i1 + 1):
@@ -184,7 +231,6 @@ def shift_phase(schedule, code_of, emp_id: str, direction: int, window: Tuple[da
 
     _fix_last_day_n4(new_codes)
 
-    new_sched = copy.deepcopy(schedule)
     new_hours = 0
     old_hours = 0
     for idx, d in enumerate(dates):
@@ -194,32 +240,96 @@ def shift_phase(schedule, code_of, emp_id: str, direction: int, window: Tuple[da
         new_c = new_codes[idx]
         if old_c == new_c:
             continue
-        _, orig_assn, _ = seq[idx]
-        if orig_assn and orig_assn.employee_id == emp_id:
-            old_hours += int(getattr(orig_assn, "effective_hours", 0))
-        for a in new_sched[d]:
-            if a.employee_id != emp_id:
-                continue
-            a.shift_key = _key_for_code(new_c)
-            a.source = "autofix"
-            val = _hours_for_code(new_c)
-            a.effective_hours = val
-            new_hours += val
-            break
-
+        a = rows[idx]
+        old_hours += int(getattr(a, "effective_hours", 0))
+        remember(undo, d, a)
+        a.shift_key = _key_for_code(new_c)
+        a.source = "autofix"
+        val = _hours_for_code(new_c)
+        a.effective_hours = val
+        new_hours += val
+
+    codes[:] = new_codes
     hours_delta = new_hours - old_hours
-    return new_sched, hours_delta, True, f"rot({direction})[{dates[i0]}..{dates[i1]}]:Δh={hours_delta}"
+    return hours_delta, True, f"rot({direction})[{dates[i0]}..{dates[i1]}]:Δh={hours_delta}"
+
+
+def shift_phase_many(schedule, code_of, requests: List[Tuple[str, int, Tuple[date, date]]]):
+    """
+    Пакетный shift_phase: список запросов (emp_id, direction, window) на одной копии расписания.
+    Возвращает (schedule, results), где results[emp_id] = (hours_delta, ok, note);
+    для сотрудника с несколькими запросами hours_delta суммируется, note — последнего запроса.
+    """
+
+    new_sched = copy_schedule(schedule)
+    _, results = shift_phase_many_inplace(new_sched, code_of, requests)
+    if not any(ok for (_, ok, _) in results.values()):
+        return schedule, results
+    return new_sched, results
+
+
+def shift_phase_many_inplace(schedule, code_of, requests: List[Tuple[str, int, Tuple[date, date]]]):
+    """In-place вариант shift_phase_many: возвращает (undo, results).
+
+    Сетка кодов строится один раз (`grid.build_grid`), далее каждая строка ротируется
+    по семантике `_rot` с теми же фиксами (N8 на 1-е, N4 в последний день), что и shift_phase.
+    """
+
+    undo: UndoToken = []
+    results: Dict[str, Tuple[int, bool, str]] = {}
+    if not requests:
+        return undo, results
+    g = grid.build_grid(schedule, code_of, emp_ids=sorted({emp_id for emp_id, _, _ in requests}))
+    tapes: Dict[str, Tuple[List[date], List[object], List[str]]] = {}
+    for emp_id, ei in g.emp_index.items():
+        present = [di for di, a in enumerate(g.rows[ei]) if a is not None]
+        tapes[emp_id] = (
+            [g.dates[di] for di in present],
+            [g.rows[ei][di] for di in present],
+            [g.codes[ei][di] for di in present],
+        )
+
+    for emp_id, direction, window in requests:
+        dates, rows, codes = tapes[emp_id]
+        dh, ok, note = _shift_row(dates, rows, codes, direction, window, undo)
+        prev_dh, prev_ok, _ = results.get(emp_id, (0, False, ""))
+        results[emp_id] = (prev_dh + dh, prev_ok or ok, note)
+    return undo, results
 
 
 # -------------------- Новые фазовые операторы --------------------
 
 
-def _set_off(a) -> None:
+def _set_off(a, d: date, undo: Optional[UndoToken] = None) -> None:
+    remember(undo, d, a)
     a.shift_key = "off"
     a.effective_hours = 0
     a.source = "phase_shift"
 
 
+def _flip_assignment(a, code_of, d: date, source: str = "pair_desync") -> Tuple[bool, str]:
+    """Флип A↔B одной строки на месте. Возвращает (ok, note|причина отказа)."""
+
+    before = code_of(a.shift_key).upper()
+    if d.day == 1 and before in {"N8A", "N8B"}:
+        return False, "protected code"
+    after = _swap_ab_code(before)
+    if after == before:
+        return False, "noop"
+    dirty.mark(a.employee_id, d)
+    a.shift_key = _key_for_code(after)
+    if after in {"DA", "DB", "NA", "NB"}:
+        a.effective_hours = 12
+    elif after in {"M8A", "M8B", "E8A", "E8B", "N8A", "N8B"}:
+        a.effective_hours = 8
+    elif after in {"N4A", "N4B"}:
+        a.effective_hours = 4
+    else:
+        a.effective_hours = 0
+    a.source = source
+    return True, f"flip_ab_on_day[{a.employee_id}] {before}->{after} {d.isoformat()}"
+
+
 def flip_ab_on_day(schedule, code_of, emp_id: str, d: date):
     """Локальный флип A↔B на конкретный день без изменения D/N/O.
 
@@ -227,30 +337,44 @@ def flip_ab_on_day(schedule, code_of, emp_id: str, d: date):
     допускают перестановку офисов. Часы приводим к стандарту выбранного кода.
     """
 
-    new_sched = copy.deepcopy(schedule)
+    new_sched = copy_schedule(schedule)
     for a in new_sched[d]:
         if a.employee_id != emp_id:
             continue
-        before = code_of(a.shift_key).upper()
-        if d.day == 1 and before in {"N8A", "N8B"}:
-            return schedule, False, "flip_ab_on_day: protected code"
-        after = _swap_ab_code(before)
-        if after == before:
-            return schedule, False, "flip_ab_on_day: noop"
-        a.shift_key = _key_for_code(after)
-        if after in {"DA", "DB", "NA", "NB"}:
-            a.effective_hours = 12
-        elif after in {"M8A", "M8B", "E8A", "E8B", "N8A", "N8B"}:
-            a.effective_hours = 8
-        elif after in {"N4A", "N4B"}:
-            a.effective_hours = 4
-        else:
-            a.effective_hours = 0
-        a.source = "pair_desync"
-        return new_sched, True, f"flip_ab_on_day[{emp_id}] {before}->{after} {d.isoformat()}"
+        ok, note = _flip_assignment(a, code_of, d)
+        if not ok:
+            return schedule, False, f"flip_ab_on_day: {note}"
+        return new_sched, True, note
     return schedule, False, "flip_ab_on_day: no row"
 
 
+def flip_ab_on_cells(schedule, code_of, cells: List[Tuple[str, date]], source: str = "pair_desync"):
+    """Пакетный флип A↔B по списку ячеек (emp_id, date) на одной копии расписания.
+
+    Правила те же, что у `flip_ab_on_day`; защищённые/неизменяемые ячейки пропускаются.
+    source — метка источника у перекрашенных строк.
+    Возвращает (schedule, flips, notes); если ни одного флипа нет — исходное расписание без копии.
+    """
+
+    if not cells:
+        return schedule, 0, []
+    new_sched = copy_schedule(schedule)
+    flips = 0
+    notes: List[str] = []
+    for emp_id, d in cells:
+        for a in new_sched.get(d, ()):
+            if a.employee_id != emp_id:
+                continue
+            ok, note = _flip_assignment(a, code_of, d, source)
+            if ok:
+                flips += 1
+                notes.append(note)
+            break
+    if not flips:
+        return schedule, 0, []
+    return new_sched, flips, notes
+
+
 def phase_shift_minus_one_skip(
     schedule,
     code_of,
@@ -264,37 +388,54 @@ def phase_shift_minus_one_skip(
     и перешиваем хвост по циклу O,O,D,N,… (двойной OFF гарантирован, тройного OFF не будет).
     """
 
-    new_sched = copy.deepcopy(schedule)
+    new_sched = copy_schedule(schedule)
+    _, dh, ok, note = phase_shift_minus_one_skip_inplace(
+        new_sched, code_of, emp_id, window, partner_id=partner_id, anti_align=anti_align
+    )
+    return (new_sched if ok else schedule), dh, ok, note
+
+
+def phase_shift_minus_one_skip_inplace(
+    schedule,
+    code_of,
+    emp_id: str,
+    window: Tuple[date, date],
+    partner_id: Optional[str] = None,
+    anti_align: bool = True,
+):
+    """In-place вариант phase_shift_minus_one_skip: возвращает (undo, dh, ok, note)."""
+
+    undo: UndoToken = []
     days = [d for d in sorted(schedule.keys()) if window[0] <= d <= window[1]]
     days_all = sorted(schedule.keys())
     total = len(days_all)
     if not days:
-        return schedule, 0, False, "phase_shift_-1: empty window"
+        return undo, 0, False, "phase_shift_-1: empty window"
 
     for d in days:
         idx = days_all.index(d)
         if idx == 0 or idx >= total - 1:
             continue
 
-        cur_code = _emp_code_on(new_sched, code_of, emp_id, d)
+        cur_code = _emp_code_on(schedule, code_of, emp_id, d)
         if d.day == 1 and cur_code in N8:
             continue
         if d == days_all[-1] and cur_code in N4:
             continue
 
-        t_prev = _emp_tok_on(new_sched, code_of, emp_id, days_all[idx - 1])
-        t_curr = _emp_tok_on(new_sched, code_of, emp_id, days_all[idx])
-        t_next = _emp_tok_on(new_sched, code_of, emp_id, days_all[idx + 1])
+        t_prev = _emp_tok_on(schedule, code_of, emp_id, days_all[idx - 1])
+        t_curr = _emp_tok_on(schedule, code_of, emp_id, days_all[idx])
+        t_next = _emp_tok_on(schedule, code_of, emp_id, days_all[idx + 1])
         if not (t_prev == "D" and t_curr == "N" and t_next == "O"):
             continue
 
-        for a in new_sched[d]:
+        for a in schedule[d]:
             if a.employee_id == emp_id:
                 before = code_of(a.shift_key).upper()
                 if before not in {"NA", "NB"}:
-                    return schedule, 0, False, "phase_shift_-1: target is not N"
+                    return undo, 0, False, "phase_shift_-1: target is not N"
                 dh = -12
-                _set_off(a)
+                _set_off(a, d, undo)
                 break
 
         tokens = [
@@ -302,18 +443,19 @@ def phase_shift_minus_one_skip(
             for offset in range(0, total - idx)
         ]
         rotor.stitch_into_schedule(
-            new_sched,
+            schedule,
             code_of,
             emp_id,
             days_all[idx],
             tokens,
             partner_id=partner_id,
             anti_align=anti_align,
+            undo=undo,
         )
 
-        return new_sched, dh, True, f"phase_shift_-1[{d.isoformat()}]"
+        return undo, dh, True, f"phase_shift_-1[{d.isoformat()}]"
 
-    return schedule, 0, False, "phase_shift_-1: no D,N,O pattern in window"
+    return undo, 0, False, "phase_shift_-1: no D,N,O pattern in window"
 
 
 def phase_shift_plus_one_insert_off(
@@ -329,12 +471,29 @@ def phase_shift_plus_one_insert_off(
     и продолжаем цикл как O,O,O,D,N,…
     """
 
-    new_sched = copy.deepcopy(schedule)
+    new_sched = copy_schedule(schedule)
+    _, dh, ok, note = phase_shift_plus_one_insert_off_inplace(
+        new_sched, code_of, emp_id, window, partner_id=partner_id, anti_align=anti_align
+    )
+    return (new_sched if ok else schedule), dh, ok, note
+
+
+def phase_shift_plus_one_insert_off_inplace(
+    schedule,
+    code_of,
+    emp_id: str,
+    window: Tuple[date, date],
+    partner_id: Optional[str] = None,
+    anti_align: bool = True,
+):
+    """In-place вариант phase_shift_plus_one_insert_off: возвращает (undo, dh, ok, note)."""
+
+    undo: UndoToken = []
     days = [d for d in sorted(schedule.keys()) if window[0] <= d <= window[1]]
     tokens: List[Tuple[str, str, date]] = []
     for d in days:
         code = "OFF"
-        for a in new_sched[d]:
+        for a in schedule[d]:
             if a.employee_id == emp_id:
                 code = code_of(a.shift_key).upper()
                 break
@@ -350,32 +509,48 @@ def phase_shift_plus_one_insert_off(
             if d2.day == 1 and c2 in N8:
                 continue
 
-            for a in new_sched[d2]:
+            for a in schedule[d2]:
                 if a.employee_id == emp_id:
                     before = code_of(a.shift_key).upper()
                     dh = -_hours_for_code(before)
-                    _set_off(a)
+                    _set_off(a, d2, undo)
                     break
 
-            days_all = sorted(new_sched.keys())
+            days_all = sorted(schedule.keys())
             idx2 = days_all.index(d2)
             tokens = [
                 "O" if (offset % 4) in (0, 3) else ("D" if (offset % 4) == 1 else "N")
                 for offset in range(0, len(days_all) - idx2)
             ]
             rotor.stitch_into_schedule(
-                new_sched,
+                schedule,
                 code_of,
                 emp_id,
                 days_all[idx2],
                 tokens,
                 partner_id=partner_id,
                 anti_align=anti_align,
+                undo=undo,
             )
 
-            return new_sched, dh, True, f"phase_shift_+1[{d2.isoformat()}]"
+            return undo, dh, True, f"phase_shift_+1[{d2.isoformat()}]"
 
-    return schedule, 0, False, "phase_shift_+1: no place O,O,(work)"
+    return undo, 0, False, "phase_shift_+1: no place O,O,(work)"
+
+
+def _next_token_day(
+    schedule, code_of, emp_id: str, window: Tuple[date, date], kind: str
+) -> Tuple[Optional[date], str]:
+    """Первый день окна с токеном kind у сотрудника или (None, причина)."""
+
+    w0, w1 = window
+    days = [d for d in sorted(schedule.keys()) if w0 <= d <= w1]
+    if not days:
+        return None, "flip_ab: empty window"
+    for d in days:
+        if _tok_for_pair(_emp_code_on(schedule, code_of, emp_id, d), d) == kind:
+            return d, ""
+    return None, "flip_ab: no token"
 
 
 def flip_ab_on_next_token(
@@ -388,54 +563,66 @@ def flip_ab_on_next_token(
     partner_id: Optional[str] = None,
     anti_align: bool = True,
 ):
-    days_all = sorted(schedule.keys())
-    w0, w1 = window
-    days = [d for d in days_all if w0 <= d <= w1]
-    if not days:
-        return schedule, 0, False, "flip_ab: empty window"
+    # пустое окно или нет токена kind — без копирования расписания
+    start_day, note = _next_token_day(schedule, code_of, emp_id, window, kind)
+    if start_day is None:
+        return schedule, 0, False, note
+    new_sched = copy_schedule(schedule)
+    _, dh, ok, note = flip_ab_on_next_token_inplace(
+        new_sched, code_of, emp_id, window, kind=kind, partner_id=partner_id, anti_align=anti_align
+    )
+    return (new_sched if ok else schedule), dh, ok, note
 
-    start_day: Optional[date] = None
-    for d in days:
-        tok = _tok_for_pair(_emp_code_on(schedule, code_of, emp_id, d), d)
-        if tok == kind:
-            start_day = d
-            break
+
+def flip_ab_on_next_token_inplace(
+    schedule,
+    code_of,
+    emp_id: str,
+    window: Tuple[date, date],
+    *,
+    kind: str = "D",
+    partner_id: Optional[str] = None,
+    anti_align: bool = True,
+):
+    """In-place вариант flip_ab_on_next_token: возвращает (undo, dh, ok, note)."""
+
+    undo: UndoToken = []
+    start_day, note = _next_token_day(schedule, code_of, emp_id, window, kind)
     if start_day is None:
-        return schedule, 0, False, "flip_ab: no token"
+        return undo, 0, False, note
 
+    days_all = sorted(schedule.keys())
     start_idx = days_all.index(start_day)
     tail_tokens = [
         _tok_for_pair(_emp_code_on(schedule, code_of, emp_id, day), day)
         for day in days_all[start_idx:]
     ]
 
-    new_sched = copy.deepcopy(schedule)
     rotor.stitch_into_schedule(
-        new_sched,
+        schedule,
         code_of,
         emp_id,
         start_day,
         tail_tokens,
         partner_id=partner_id,
         anti_align=anti_align,
+        undo=undo,
     )
-    return new_sched, 0, True, f"flip_ab[{kind}]@{start_day.isoformat()}"
+    return undo, 0, True, f"flip_ab[{kind}]@{start_day.isoformat()}"
 
 
 def desync_pair_month(schedule, code_of, emp_a: str, emp_b: str):
     """Пост-проход по месяцу: разводим офисы, если оба в одну смену.
 
     На датах, где сотрудники работают в одной фазе (D или N) и в одном офисе,
-    выполняем `flip_ab_on_day` для emp_a. Хвостовые N4* считаем полноценными
-    сменами и разрешаем флип; N8 на 1-е число пропускаем.
+    флипаем emp_a (одним пакетом через `flip_ab_on_cells`). Хвостовые N4* считаем
+    полноценными сменами и разрешаем флип; N8 на 1-е число пропускаем.
     """
 
-    new_sched = copy.deepcopy(schedule)
-    flips = 0
-    notes: List[str] = []
-    for d in sorted(new_sched.keys()):
-        ca = _emp_code_on(new_sched, code_of, emp_a, d)
-        cb = _emp_code_on(new_sched, code_of, emp_b, d)
+    cells: List[Tuple[str, date]] = []
+    for d in sorted(schedule.keys()):
+        ca = _emp_code_on(schedule, code_of, emp_a, d)
+        cb = _emp_code_on(schedule, code_of, emp_b, d)
         ta = _tok_for_pair(ca, d)
         tb = _tok_for_pair(cb, d)
         if ta != tb or ta == "O":
@@ -444,10 +631,5 @@ def desync_pair_month(schedule, code_of, emp_a: str, emp_b: str):
             continue
         if d.day == 1 and (ca in {"N8A", "N8B"} or cb in {"N8A", "N8B"}):
             continue
-        new_sched, ok, note = flip_ab_on_day(new_sched, code_of, emp_a, d)
-        if ok:
-            flips += 1
-            notes.append(note)
-    return new_sched, flips, notes
-
-
+        cells.append((emp_a, d))
+    return flip_ab_on_cells(schedule, code_of, cells)
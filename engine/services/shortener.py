@@ -1,14 +1,19 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from datetime import date
+from time import perf_counter
+import heapq
 from typing import Dict, List, Optional, Sequence, Set, Tuple
 
 from engine.domain.employee import Employee
 from engine.domain.schedule import Assignment
 from engine.domain.shift import ShiftType
 from engine.infrastructure.production_calendar import ProductionCalendar
+from engine.services import dirty
+from engine.services.hours import HoursMismatch, code_hours
+from engine.services.shortening_solver import SolverTimeout, plan_min_shortening, required_shortenings
 
 
 @dataclass
@@ -18,6 +23,37 @@ class ShorteningConfig:
     evening_short_by_office: Dict[str, str]
 
 
+@dataclass
+class ShorteningPreview:
+    """
+    Результат сокращений без изменения расписания: разреженная разница поверх исходного.
+    changes — (дата, исходная строка, предлагаемая копия) только по сокращаемым ячейкам.
+    """
+
+    info: Dict[str, object]
+    changes: List[Tuple[date, Assignment, Assignment]]
+    hours_delta: Dict[str, int]  # сотрудник -> изменение часов (только затронутые)
+
+    @property
+    def operations(self) -> List[Dict[str, object]]:
+        return self.info["operations"]  # type: ignore[return-value]
+
+    def hours(self) -> Dict[str, int]:
+        """Часы по сотрудникам после предлагаемых сокращений."""
+        per_employee = self.info.get("per_employee", {}) or {}
+        return {eid: int(row.get("hours", 0)) for eid, row in per_employee.items()}  # type: ignore[union-attr]
+
+    def overlay(self, schedule: Dict[date, List[Assignment]]) -> Dict[date, List[Assignment]]:
+        """Вид расписания с сокращениями: новые списки только у затронутых дат, прочие — общие с исходным."""
+        view = dict(schedule)
+        by_date: Dict[date, Dict[int, Assignment]] = {}
+        for dt, orig, new in self.changes:
+            by_date.setdefault(dt, {})[id(orig)] = new
+        for dt, repl in by_date.items():
+            view[dt] = [repl.get(id(a), a) for a in schedule[dt]]
+        return view
+
+
 class ShiftShortener:
     """Реализует слой сокращения дневных смен до 8 часов."""
 
@@ -32,6 +68,7 @@ class ShiftShortener:
         self.shift_types = shift_types
         self.code_of = code_of
         self.config = config
+        self._options_cache: Dict[str, List[Tuple[str, str, Tuple[int, int]]]] = {}
 
     def apply(
         self,
@@ -41,6 +78,54 @@ class ShiftShortener:
         ym: str,
         monthly_allowance: int,
         yearly_cap: int,
+        solver: str = "greedy",
+        time_budget_ms: int = 200,
+    ) -> Dict[str, object]:
+        """
+        Сокращает DA/DB→M8/E8 у сотрудников с перелимитом.
+        solver="greedy" — по датам, сотрудники по порядку; solver="exact" — минимальный набор
+        сокращений по всей команде (shortening_solver), при исчерпании time_budget_ms — жадный.
+        """
+        return self._run(
+            employees, schedule, norm_month, ym, monthly_allowance, yearly_cap, solver, time_budget_ms, None
+        )
+
+    def preview(
+        self,
+        employees: List[Employee],
+        schedule: Dict[date, List[Assignment]],
+        norm_month: int,
+        ym: str,
+        monthly_allowance: int,
+        yearly_cap: int,
+        solver: str = "greedy",
+        time_budget_ms: int = 200,
+    ) -> ShorteningPreview:
+        """То же, что apply, но расписание не меняется: сокращаются копии строк-кандидатов."""
+        copies: Dict[int, Tuple[date, Assignment, Assignment]] = {}
+        with dirty.suspended():
+            info = self._run(
+                employees, schedule, norm_month, ym, monthly_allowance, yearly_cap, solver, time_budget_ms, copies
+            )
+        changes = [(dt, orig, new) for dt, orig, new in copies.values() if new.shift_key != orig.shift_key]
+        changes.sort(key=lambda x: x[0])
+        hours_delta: Dict[str, int] = {}
+        for op in info["operations"]:  # type: ignore[union-attr]
+            eid = op["employee_id"]
+            hours_delta[eid] = hours_delta.get(eid, 0) + int(op["hours_delta"])
+        return ShorteningPreview(info=info, changes=changes, hours_delta=hours_delta)
+
+    def _run(
+        self,
+        employees: List[Employee],
+        schedule: Dict[date, List[Assignment]],
+        norm_month: int,
+        ym: str,
+        monthly_allowance: int,
+        yearly_cap: int,
+        solver: str,
+        time_budget_ms: int,
+        copies: Optional[Dict[int, Tuple[date, Assignment, Assignment]]],
     ) -> Dict[str, object]:
         monthly_cap = norm_month + monthly_allowance if norm_month else norm_month
 
@@ -54,90 +139,103 @@ class ShiftShortener:
             "warnings": [],
         }
 
-        hours_by_emp: Dict[str, int] = {}
-        for rows in schedule.values():
-            for assignment in rows:
-                hours_by_emp[assignment.employee_id] = hours_by_emp.get(assignment.employee_id, 0) + int(
-                    assignment.effective_hours
-                )
-
+        eligible_dates: Set[date] = (
+            {dt for dt in schedule.keys() if self._date_allows_shortening(dt)} if norm_month > 0 else set()
+        )
+        coverage_state, day_workers, candidates_by_emp, hours_by_emp, mismatches = self._index_schedule(
+            schedule, eligible_dates
+        )
+        info["hours_mismatches"] = [str(m) for m in mismatches]
         if norm_month <= 0:
             info["per_employee"] = {e.id: {"hours": hours_by_emp.get(e.id, 0)} for e in employees}
             return info
 
-        eligible_dates: Set[date] = {dt for dt in schedule.keys() if self._date_allows_shortening(dt)}
-        coverage_state = self._build_coverage_state(schedule)
+        if copies is not None:
+            # предпросмотр: меняются только копии кандидатов (исходная строка -> копия)
+            for eid, rows in candidates_by_emp.items():
+                shadow: List[Tuple[date, Assignment]] = []
+                for dt, a in rows:
+                    entry = copies.get(id(a))
+                    if entry is None:
+                        entry = copies[id(a)] = (dt, a, replace(a))
+                    shadow.append((dt, entry[2]))
+                candidates_by_emp[eid] = shadow
         operations: List[Dict[str, object]] = []
 
         def yearly_ok(emp: Employee, new_hours: int) -> bool:
             overtime = max(0, new_hours - norm_month)
             return (emp.ytd_overtime + overtime) <= yearly_cap if yearly_cap else True
 
-        for emp in employees:
-            if emp.id not in hours_by_emp:
-                hours_by_emp[emp.id] = 0
-            if (monthly_cap and hours_by_emp[emp.id] <= monthly_cap) and yearly_ok(emp, hours_by_emp[emp.id]):
-                continue
+        def over_cap(emp: Employee) -> bool:
+            hours = hours_by_emp.get(emp.id, 0)
+            return not ((monthly_cap and hours <= monthly_cap) and yearly_ok(emp, hours))
+
+        plan = None
+        if solver == "exact":
+            info["solver"] = "exact"
+            try:
+                plan = self._plan_exact(
+                    employees, hours_by_emp, candidates_by_emp, day_workers, coverage_state,
+                    norm_month, monthly_cap, yearly_cap, perf_counter() + time_budget_ms / 1000.0,
+                )
+            except SolverTimeout:
+                info["solver"] = "greedy_fallback"
 
-            candidates: List[Tuple[date, Assignment]] = []
-            for dt in sorted(schedule.keys()):
-                if dt not in eligible_dates:
+        if plan is not None:
+            done: Set[str] = set()
+            for emp in employees:
+                if emp.id in done:
+                    continue
+                done.add(emp.id)
+                for dt, assn, new_key in plan.get(emp.id, ()):
+                    new_code = self.code_of(new_key).upper()
+                    cov = coverage_state[dt]
+                    contrib = self._coverage_contribution(new_code)
+                    coverage_state[dt] = {
+                        "morning": cov["morning"] - 1 + contrib[0],
+                        "evening": cov["evening"] - 1 + contrib[1],
+                    }
+                    self._shorten(dt, emp.id, assn, new_key, new_code, hours_by_emp, operations)
+        else:
+            # Очередь сотрудников с перелимитом. Приоритет — позиция в списке сотрудников:
+            # порядок, в котором сотрудники «занимают» покрытие дня, а значит и список операций,
+            # остаётся прежним. Часы только убывают, поэтому в очередь попадают лишь те, кто
+            # с перелимитом на старте; при извлечении условие проверяется повторно.
+            queue: List[Tuple[int, Employee]] = [(pos, emp) for pos, emp in enumerate(employees) if over_cap(emp)]
+            heapq.heapify(queue)
+            while queue:
+                _pos, emp = heapq.heappop(queue)
+                hours_by_emp.setdefault(emp.id, 0)
+                if not over_cap(emp):
                     continue
-                for assn in schedule[dt]:
-                    if assn.employee_id == emp.id and assn.shift_key in self.config.day_shift_keys:
-                        candidates.append((dt, assn))
-
-            for dt, assn in candidates:
-                while (
-                    (monthly_cap and hours_by_emp[emp.id] > monthly_cap)
-                    or (not yearly_ok(emp, hours_by_emp[emp.id]))
-                ):
-                    if assn.shift_key not in self.config.day_shift_keys:
-                        break
-
-                    # Требование: сокращаем только если в этот день минимум 2 дневных сотрудника.
-                    # В частности, запрещаем сокращение, если текущий сотрудник единственный «дневной» в этот день.
-                    # Считаем «дневными» DA/DB/M8/E8, но дополнительно проверяем, что есть хотя бы ещё один сотрудник,
-                    # отличный от текущего, с дневным кодом.
-                    other_day_workers = [
-                        a for a in schedule[dt]
-                        if a is not assn and self._is_day_code(self.code_of(a.shift_key))
-                    ]
-                    if len(other_day_workers) < 1:
-                        break
-
-                    chosen = self._choose_short_shift(assn, coverage_state[dt])
-                    if not chosen:
-                        break
-
-                    new_key, new_code, new_cov = chosen
-                    prev_key = assn.shift_key
-                    prev_code = self.code_of(prev_key).upper()
-                    prev_hours = int(assn.effective_hours)
-                    st = self.shift_types[new_key]
-
-                    assn.shift_key = new_key
-                    assn.effective_hours = st.hours
-                    if assn.source == "template":
-                        assn.source = "autofix"
-
-                    coverage_state[dt] = new_cov
-                    delta = prev_hours - st.hours
-                    hours_by_emp[emp.id] = hours_by_emp.get(emp.id, 0) - delta
-                    operations.append(
-                        {
-                            "date": dt,
-                            "employee_id": emp.id,
-                            "from_code": prev_code,
-                            "to_code": new_code,
-                            "hours_delta": st.hours - prev_hours,
-                        }
-                    )
 
-                    if ((monthly_cap and hours_by_emp[emp.id] <= monthly_cap) or not monthly_cap) and yearly_ok(
-                        emp, hours_by_emp[emp.id]
+                for dt, assn in candidates_by_emp.get(emp.id, ()):
+                    while (
+                        (monthly_cap and hours_by_emp[emp.id] > monthly_cap)
+                        or (not yearly_ok(emp, hours_by_emp[emp.id]))
                     ):
-                        break
+                        if assn.shift_key not in self.config.day_shift_keys:
+                            break
+
+                        # Требование: сокращаем только если в этот день минимум 2 дневных сотрудника.
+                        # В частности, запрещаем сокращение, если текущий сотрудник единственный «дневной» в этот день.
+                        # Считаем «дневными» DA/DB/M8/E8, но дополнительно проверяем, что есть хотя бы ещё один сотрудник,
+                        # отличный от текущего, с дневным кодом (сам кандидат — дневной, поэтому минус один).
+                        if day_workers[dt] - 1 < 1:
+                            break
+
+                        chosen = self._choose_short_shift(assn, coverage_state[dt])
+                        if not chosen:
+                            break
+
+                        new_key, new_code, new_cov = chosen
+                        coverage_state[dt] = new_cov
+                        self._shorten(dt, emp.id, assn, new_key, new_code, hours_by_emp, operations)
+
+                        if ((monthly_cap and hours_by_emp[emp.id] <= monthly_cap) or not monthly_cap) and yearly_ok(
+                            emp, hours_by_emp[emp.id]
+                        ):
+                            break
 
         warnings: List[str] = []
         per_employee: Dict[str, Dict[str, object]] = {}
@@ -171,22 +269,122 @@ class ShiftShortener:
         info["per_employee"] = per_employee
         return info
 
+    def _shorten(
+        self,
+        dt: date,
+        emp_id: str,
+        assn: Assignment,
+        new_key: str,
+        new_code: str,
+        hours_by_emp: Dict[str, int],
+        operations: List[Dict[str, object]],
+    ) -> None:
+        prev_code = self.code_of(assn.shift_key).upper()
+        prev_hours = int(assn.effective_hours)
+        st = self.shift_types[new_key]
+
+        dirty.mark(emp_id, dt)
+        assn.shift_key = new_key
+        assn.effective_hours = st.hours
+        if assn.source == "template":
+            assn.source = "autofix"
+
+        delta = prev_hours - st.hours
+        hours_by_emp[emp_id] = hours_by_emp.get(emp_id, 0) - delta
+        operations.append(
+            {
+                "date": dt,
+                "employee_id": emp_id,
+                "from_code": prev_code,
+                "to_code": new_code,
+                "hours_delta": st.hours - prev_hours,
+            }
+        )
+
+    def _plan_exact(
+        self,
+        employees: List[Employee],
+        hours_by_emp: Dict[str, int],
+        candidates_by_emp: Dict[str, List[Tuple[date, Assignment]]],
+        day_workers: Dict[date, int],
+        coverage_state: Dict[date, Dict[str, int]],
+        norm_month: int,
+        monthly_cap: int,
+        yearly_cap: int,
+        deadline: float,
+    ) -> Dict[str, List[Tuple[date, Assignment, str]]]:
+        need: Dict[str, int] = {}
+        for emp in employees:
+            cands = candidates_by_emp.get(emp.id, ())
+            deltas = [
+                int(a.effective_hours) - self.shift_types[opt].hours
+                for _dt, a in cands
+                for opt, _code, _contrib in self._short_options(a.shift_key)
+            ]
+            if not deltas:
+                continue
+            need[emp.id] = required_shortenings(
+                emp, hours_by_emp.get(emp.id, 0), min(deltas), norm_month, monthly_cap, yearly_cap
+            )
+        return plan_min_shortening(
+            employees, need, candidates_by_emp, day_workers, coverage_state, self._short_options, deadline
+        )
+
     def _date_allows_shortening(self, dt: date) -> bool:
         if self.calendar:
             return self.calendar.allows_shortening(dt)
         return dt.weekday() >= 5
 
-    def _build_coverage_state(self, schedule: Dict[date, List[Assignment]]) -> Dict[date, Dict[str, int]]:
-        state: Dict[date, Dict[str, int]] = {}
-        for dt, rows in schedule.items():
-            cov = {"morning": 0, "evening": 0}
-            for assn in rows:
-                code = self.code_of(assn.shift_key).upper()
-                contrib = self._coverage_contribution(code)
-                cov["morning"] += contrib[0]
-                cov["evening"] += contrib[1]
-            state[dt] = cov
-        return state
+    def _index_schedule(
+        self,
+        schedule: Dict[date, List[Assignment]],
+        eligible_dates: Set[date],
+    ) -> Tuple[
+        Dict[date, Dict[str, int]],
+        Dict[date, int],
+        Dict[str, List[Tuple[date, Assignment]]],
+        Dict[str, int],
+        List[HoursMismatch],
+    ]:
+        """
+        Один проход по расписанию: покрытие утро/вечер по датам,
+        число «дневных» строк на дату, кандидаты на сокращение по сотрудникам (в порядке дат),
+        итог часов по сотрудникам и расхождения effective_hours с часами по коду
+        (как build_hours, но без полной таблицы токенов/офисов — она здесь не нужна).
+        Сокращение DA/DB→M8/E8 оставляет смену дневной, поэтому счётчики дневных
+        не меняются по ходу работы, а покрытие обновляется точечно.
+        """
+        day_keys = set(self.config.day_shift_keys)
+        # shift_key -> (дневная?, утро, вечер, часы по коду, код)
+        profile: Dict[str, Tuple[bool, int, int, int, str]] = {}
+        coverage_state: Dict[date, Dict[str, int]] = {}
+        day_workers: Dict[date, int] = {}
+        candidates_by_emp: Dict[str, List[Tuple[date, Assignment]]] = {}
+        hours_by_emp: Dict[str, int] = {}
+        mismatches: List[HoursMismatch] = []
+        for dt in sorted(schedule.keys()):
+            eligible = dt in eligible_dates
+            morning = evening = workers = 0
+            for assn in schedule[dt]:
+                key = assn.shift_key
+                prof = profile.get(key)
+                if prof is None:
+                    code = self.code_of(key).upper()
+                    prof = (self._is_day_code(code),) + self._coverage_contribution(code) + (code_hours(code), code)
+                    profile[key] = prof
+                if prof[0]:
+                    workers += 1
+                morning += prof[1]
+                evening += prof[2]
+                h = int(assn.effective_hours)
+                hours_by_emp[assn.employee_id] = hours_by_emp.get(assn.employee_id, 0) + h
+                if h != prof[3]:
+                    mismatches.append(HoursMismatch(assn.employee_id, dt, prof[4], h, prof[3]))
+                if eligible and key in day_keys:
+                    candidates_by_emp.setdefault(assn.employee_id, []).append((dt, assn))
+            coverage_state[dt] = {"morning": morning, "evening": evening}
+            day_workers[dt] = workers
+        return coverage_state, day_workers, candidates_by_emp, hours_by_emp, mismatches
 
     @staticmethod
     def _coverage_contribution(code: str) -> Tuple[int, int]:
@@ -209,29 +407,34 @@ class ShiftShortener:
         base_morning = coverage["morning"] - cur_contrib[0]
         base_evening = coverage["evening"] - cur_contrib[1]
 
-        office = self.shift_types[assignment.shift_key].office
-        options: List[str] = []
-        morning = self.config.morning_short_by_office.get(office or "")
-        evening = self.config.evening_short_by_office.get(office or "")
-        if morning:
-            options.append(morning)
-        if evening:
-            options.append(evening)
-
-        for opt in options:
-            new_code = self.code_of(opt).upper()
-            contrib = self._coverage_contribution(new_code)
+        for opt, new_code, contrib in self._short_options(assignment.shift_key):
             next_morning = base_morning + contrib[0]
             next_evening = base_evening + contrib[1]
             if next_morning >= 1 and next_evening >= 1:
                 return opt, new_code, {"morning": next_morning, "evening": next_evening}
         return None
 
+    def _short_options(self, shift_key: str) -> List[Tuple[str, str, Tuple[int, int]]]:
+        """Варианты сокращения для офиса смены (утро, затем вечер) с кодами и вкладом в покрытие; кэш по ключу."""
+        options = self._options_cache.get(shift_key)
+        if options is None:
+            office = self.shift_types[shift_key].office
+            options = []
+            for opt in (
+                self.config.morning_short_by_office.get(office or ""),
+                self.config.evening_short_by_office.get(office or ""),
+            ):
+                if opt:
+                    new_code = self.code_of(opt).upper()
+                    options.append((opt, new_code, self._coverage_contribution(new_code)))
+            self._options_cache[shift_key] = options
+        return options
+
     @staticmethod
     def _is_day_code(code: str) -> bool:
         c = (code or "").upper()
         return c in {"DA", "DB", "M8A", "M8B", "E8A", "E8B"}
 
 
-__all__ = ["ShiftShortener", "ShorteningConfig"]
+__all__ = ["ShiftShortener", "ShorteningConfig", "ShorteningPreview"]
 
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from datetime import date
+from time import perf_counter
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from engine.domain.employee import Employee
+from engine.domain.schedule import Assignment
+
+# Точный подбор минимального набора сокращений DA/DB→M8/E8 по всей команде.
+#
+# Каждому сотруднику с перелимитом нужно need_e сокращений (минимум, чтобы уложиться в
+# месячный и годовой лимиты). На дату d сокращение допустимо, только если в этот день есть
+# ещё хотя бы один дневной сотрудник; покрытие утро/вечер после x переводов в M8 и y в E8:
+#     утро' = утро − y ≥ 1,  вечер' = вечер − x ≥ 1,
+# т.е. на дату можно сократить не больше cap_d = min(кандидатов, (утро−1) + (вечер−1)) смен,
+# а тип (M8/E8) затем раскладывается внутри дня. Остаётся b-паросочетание
+# «единицы потребности сотрудников × ёмкости дат» — его максимум ищем увеличивающими путями
+# (Кун): при достижимости сумма сокращений равна Σ need_e и меньше быть не может.
+# Даты перебираются по возрастанию, сотрудники — по порядку списка, поэтому результат
+# детерминирован и, как у жадного, предпочитает ранние даты.
+
+Candidate = Tuple[date, Assignment]
+
+
+class SolverTimeout(Exception):
+    """Бюджет времени исчерпан — вызывающий откатывается на жадный алгоритм."""
+
+
+def required_shortenings(
+    emp: Employee,
+    hours: int,
+    delta: int,
+    norm_month: int,
+    monthly_cap: int,
+    yearly_cap: int,
+) -> int:
+    """Минимум сокращений (по delta часов), чтобы уложиться в месячный и годовой лимиты."""
+    target = monthly_cap if monthly_cap else hours
+    if yearly_cap:
+        # годовой остаток ограничивает переработку месяца; если он уже исчерпан — тянем к норме
+        target = min(target, norm_month + max(0, yearly_cap - emp.ytd_overtime))
+    excess = hours - target
+    if excess <= 0 or delta <= 0:
+        return 0
+    return -(-excess // delta)
+
+
+def plan_min_shortening(
+    employees: List[Employee],
+    need: Dict[str, int],
+    candidates_by_emp: Dict[str, List[Candidate]],
+    day_workers: Dict[date, int],
+    coverage_state: Dict[date, Dict[str, int]],
+    options_of: Callable[[str], List[Tuple[str, str, Tuple[int, int]]]],
+    deadline: Optional[float] = None,
+) -> Dict[str, List[Tuple[date, Assignment, str]]]:
+    """
+    План: сотрудник -> [(дата, строка, новый ключ смены)], даты по возрастанию.
+    Бросает SolverTimeout, если perf_counter() превысил deadline.
+    """
+    cands: Dict[str, List[Candidate]] = {}
+    per_date: Dict[date, int] = {}
+    for emp in employees:
+        if need.get(emp.id, 0) <= 0 or emp.id in cands:
+            continue
+        rows = [(dt, a) for dt, a in candidates_by_emp.get(emp.id, ()) if day_workers.get(dt, 0) >= 2]
+        cands[emp.id] = rows
+        for dt, _a in rows:
+            per_date[dt] = per_date.get(dt, 0) + 1
+
+    cap: Dict[date, int] = {}
+    for dt, n in per_date.items():
+        cov = coverage_state[dt]
+        cap[dt] = max(0, min(n, (cov["morning"] - 1) + (cov["evening"] - 1)))
+
+    held: Dict[str, Set[date]] = {eid: set() for eid in cands}
+    holders: Dict[date, List[str]] = {dt: [] for dt in cap}
+    cell: Dict[Tuple[str, date], Assignment] = {(eid, dt): a for eid, rows in cands.items() for dt, a in rows}
+
+    def augment(eid: str, seen: Set[date]) -> bool:
+        if deadline is not None and perf_counter() > deadline:
+            raise SolverTimeout()
+        for dt, _a in cands[eid]:
+            if dt in held[eid] or dt in seen or cap[dt] == 0:
+                continue
+            seen.add(dt)
+            if len(holders[dt]) < cap[dt]:
+                held[eid].add(dt)
+                holders[dt].append(eid)
+                return True
+            for other in list(holders[dt]):
+                if augment(other, seen):
+                    holders[dt].remove(other)
+                    held[other].discard(dt)
+                    held[eid].add(dt)
+                    holders[dt].append(eid)
+                    return True
+        return False
+
+    for eid in cands:
+        for _ in range(need[eid]):
+            if not augment(eid, set()):
+                break  # дальше для этого сотрудника путей нет (Кун: позже они не появятся)
+
+    # Раскладка M8/E8 внутри дня: сначала утро (как у жадного), пока вечернее покрытие позволяет
+    plan: Dict[str, List[Tuple[date, Assignment, str]]] = {eid: [] for eid in cands}
+    order = {eid: i for i, eid in enumerate(cands)}
+    for dt in sorted(holders):
+        cov = coverage_state[dt]
+        morning, evening = cov["morning"], cov["evening"]
+        for eid in sorted(holders[dt], key=order.__getitem__):
+            a = cell[(eid, dt)]
+            for opt, _code, contrib in options_of(a.shift_key):
+                # из DA/DB (1,1) в opt: теряем 1 - contrib по каждой половине дня
+                nm = morning - (1 - contrib[0])
+                ne = evening - (1 - contrib[1])
+                if nm >= 1 and ne >= 1:
+                    morning, evening = nm, ne
+                    plan[eid].append((dt, a, opt))
+                    break
+    for rows in plan.values():
+        rows.sort(key=lambda x: x[0])
+    return plan
+
+
+__all__ = ["SolverTimeout", "required_shortenings", "plan_min_shortening"]
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+import os
+
+from engine.domain.employee import Employee
+from engine.domain.schedule import Assignment
+from engine.infrastructure.production_calendar import ProductionCalendar
+from engine.services.generator import CarryState, Generator, MonthResult
+
+# Команды отдела — независимые шарды: у каждой свой состав, отпуска и CarryState,
+# общий только производственный календарь и таксономия смен. Полный месячный
+# пайплайн команды (генерация → пары → отпуска → сокращения) считается в отдельном
+# процессе; календарь и shift_types передаются в воркер один раз (initializer).
+
+_WORKER: Dict[str, object] = {}
+
+# Меньше этого объёма (сотрудник × месяц по всем командам; ≈0.2 мс каждый) запуск пула,
+# пересылка конфига и результатов дороже самого расчёта — считаем в текущем процессе.
+MIN_PARALLEL_EMPLOYEE_MONTHS = 2000
+
+
+@dataclass
+class TeamSpec:
+    """Команда: сотрудники (как в CONFIG["employees"]) + необязательные месяцы/состояние/переопределения конфига."""
+
+    team_id: str
+    employees: List[Dict]
+    months: Optional[List[Dict]] = None  # month_spec'и команды (отпуска); по умолчанию — из базового конфига
+    state: Optional[CarryState] = None  # состояние на входе в первый месяц
+    intern_ids: Optional[List[str]] = None
+    config: Dict = field(default_factory=dict)  # поверхностные переопределения базового конфига
+
+
+@dataclass
+class TeamRun:
+    """Результат шарда: месяцы горизонта одной команды."""
+
+    team_id: str
+    months: List[MonthResult]
+
+
+@dataclass
+class DepartmentMonth:
+    """Месяц отдела: сетки команд склеены по датам (команды — по порядку), сотрудники — подряд."""
+
+    ym: str
+    employees: List[Employee]
+    schedule: Dict[date, List[Assignment]]
+    carry_out: List[Assignment]
+    vacations: Dict[str, List[date]]
+    norm_info: Dict
+    pairs: List[Tuple[str, str, int, int]]  # пары внутри команд
+    team_of: Dict[str, str]  # employee_id -> team_id
+    teams: Dict[str, MonthResult]
+
+
+def _init_worker(base_cfg: Dict, calendar: Optional[ProductionCalendar]) -> None:
+    """Один раз на процесс: базовый конфиг, календарь и общая таксономия смен."""
+    _WORKER["cfg"] = base_cfg
+    _WORKER["calendar"] = calendar
+    _WORKER["shift_types"] = Generator(base_cfg, calendar=calendar).shift_types
+
+
+def _team_config(base_cfg: Dict, team: TeamSpec) -> Dict:
+    cfg = dict(base_cfg)
+    cfg.update(team.config or {})
+    cfg["employees"] = list(team.employees)
+    if team.months is not None:
+        cfg["months"] = list(team.months)
+    return cfg
+
+
+def run_team(team: TeamSpec, start_ym: Optional[str] = None, end_ym: Optional[str] = None) -> TeamRun:
+    """Полный горизонт одной команды в текущем процессе (после _init_worker)."""
+    cfg = _team_config(_WORKER["cfg"], team)
+    gen = Generator(cfg, calendar=_WORKER["calendar"], shift_types=_WORKER["shift_types"])
+    months = gen.configured_months(cfg.get("months", []) or [])  # ValueError: пусто, не по порядку, пропуски
+    start_ym = start_ym or months[0]
+    end_ym = end_ym or months[-1]
+    results = list(
+        gen.generate_horizon(
+            start_ym,
+            end_ym,
+            team.state or CarryState(),
+            intern_ids=team.intern_ids,
+        )
+    )
+    for res in results:
+        res.validation = None  # держит генератор (code_of) — не тащим его через границу процесса
+    return TeamRun(team_id=team.team_id, months=results)
+
+
+def _run_team_args(args: Tuple[TeamSpec, Optional[str], Optional[str]]) -> TeamRun:
+    return run_team(*args)
+
+
+def run_teams(
+    base_cfg: Dict,
+    teams: List[TeamSpec],
+    *,
+    calendar: Optional[ProductionCalendar] = None,
+    start_ym: Optional[str] = None,
+    end_ym: Optional[str] = None,
+    max_workers: Optional[int] = None,
+) -> List[TeamRun]:
+    """
+    Считает команды шардами в ProcessPoolExecutor; порядок результатов = порядок teams.
+    Без пула, в текущем процессе: max_workers=1 (удобно для отладки), одна команда,
+    один CPU или маленький отдел (меньше MIN_PARALLEL_EMPLOYEE_MONTHS сотрудник-месяцев).
+    """
+    jobs = [(t, start_ym, end_ym) for t in teams]
+    cpus = os.cpu_count() or 1
+    workers = max_workers or cpus
+    if workers <= 1 or cpus <= 1 or len(teams) <= 1 or _workload(base_cfg, teams) < MIN_PARALLEL_EMPLOYEE_MONTHS:
+        _init_worker(base_cfg, calendar)
+        return [_run_team_args(job) for job in jobs]
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(base_cfg, calendar),
+    ) as pool:
+        chunk = max(1, len(jobs) // (workers * 4))
+        return list(pool.map(_run_team_args, jobs, chunksize=chunk))
+
+
+def _workload(base_cfg: Dict, teams: List[TeamSpec]) -> int:
+    """Оценка объёма расчёта: сотрудник-месяцы по всем командам."""
+    base_months = len(base_cfg.get("months", []) or [])
+    return sum(len(t.employees) * max(1, len(t.months) if t.months is not None else base_months) for t in teams)
+
+
+def _merge_norm_info(ym: str, infos: List[Dict]) -> Dict:
+    """Склейка norm_info команд: операции/предупреждения подряд, per_employee — объединение."""
+    merged: Dict[str, object] = {"month": ym, "operations": [], "warnings": [], "per_employee": {}}
+    for info in infos:
+        if not info:
+            continue
+        for key in ("norm_hours", "monthly_allowance", "monthly_cap", "yearly_cap"):
+            if key in info:
+                merged.setdefault(key, info[key])
+        merged["operations"].extend(info.get("operations", []) or [])
+        merged["warnings"].extend(info.get("warnings", []) or [])
+        merged["per_employee"].update(info.get("per_employee", {}) or {})
+    return merged
+
+
+def merge_department(runs: List[TeamRun]) -> List[DepartmentMonth]:
+    """Собирает результаты команд в помесячные сетки отдела. ID сотрудников должны быть уникальны по отделу."""
+    team_of: Dict[str, str] = {}
+    by_month: Dict[str, List[Tuple[str, MonthResult]]] = {}
+    for run in runs:
+        for res in run.months:
+            by_month.setdefault(res.ym, []).append((run.team_id, res))
+            for e in res.employees:
+                owner = team_of.setdefault(e.id, run.team_id)
+                if owner != run.team_id:
+                    raise ValueError(f"Employee {e.id} belongs to teams {owner} and {run.team_id}")
+
+    out: List[DepartmentMonth] = []
+    for ym in sorted(by_month):
+        parts = by_month[ym]
+        schedule: Dict[date, List[Assignment]] = {}
+        employees: List[Employee] = []
+        carry_out: List[Assignment] = []
+        vacations: Dict[str, List[date]] = {}
+        pairs: List[Tuple[str, str, int, int]] = []
+        for _team_id, res in parts:
+            for d, rows in res.schedule.items():
+                schedule.setdefault(d, []).extend(rows)
+            employees.extend(res.employees)
+            carry_out.extend(res.carry_out)
+            vacations.update(res.vacations)
+            pairs.extend(res.pairs)
+        pairs.sort(key=lambda t: (t[2], t[3]), reverse=True)  # как в pairing.compute_pairs (стабильно по командам)
+        out.append(
+            DepartmentMonth(
+                ym=ym,
+                employees=employees,
+                schedule=dict(sorted(schedule.items())),
+                carry_out=carry_out,
+                vacations=vacations,
+                norm_info=_merge_norm_info(ym, [res.norm_info for _t, res in parts]),
+                pairs=pairs,
+                team_of={e.id: team_of[e.id] for e in employees},
+                teams={team_id: res for team_id, res in parts},
+            )
+        )
+    return out
+
+
+__all__ = [
+    "TeamSpec",
+    "TeamRun",
+    "DepartmentMonth",
+    "run_team",
+    "run_teams",
+    "merge_department",
+]
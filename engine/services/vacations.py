@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import bisect
+
+# Индекс отпусков: по сотруднику — отсортированные непересекающиеся диапазоны дат
+# [начало, конец] (подряд идущие дни склеены). Строится один раз на прогон из всех
+# month_spec (или из словаря сотрудник -> даты); дальше «в отпуске ли сотрудник в день d»
+# и «даты отпуска в окне [d0..d1]» — bisect по началам диапазонов, O(log k).
+# Этим пользуются генератор (эффективные отпуска месяца), postprocess (перекраска и
+# снятие ночи накануне отпуска) и сценарии. Заодно по границам диапазонов одним
+# проходом считаются пересечения отпусков в команде (conflicts).
+
+
+@dataclass
+class VacationConflict:
+    """Интервал [start..end], когда одновременно в отпуске больше допустимого."""
+
+    start: date
+    end: date
+    employee_ids: List[str]
+
+    def __str__(self) -> str:
+        span = self.start.isoformat() if self.start == self.end else f"{self.start.isoformat()}..{self.end.isoformat()}"
+        return f"{span}: {len(self.employee_ids)} в отпуске ({', '.join(self.employee_ids)})"
+
+
+def _merge(days: Iterable[date]) -> List[Tuple[date, date]]:
+    out: List[Tuple[date, date]] = []
+    for d in sorted(set(days)):
+        if out and out[-1][1] + timedelta(days=1) == d:
+            out[-1] = (out[-1][0], d)
+        else:
+            out.append((d, d))
+    return out
+
+
+@dataclass
+class VacationIndex:
+    ranges: Dict[str, List[Tuple[date, date]]] = field(default_factory=dict)  # сотрудник -> диапазоны по порядку
+    _starts: Dict[str, List[date]] = field(default_factory=dict, repr=False)
+    # (месяц, сотрудник) -> порядок первого упоминания: эффективные отпуска месяца
+    # перечисляются в том же порядке, что и при обходе month_spec
+    _order: Dict[Tuple[str, str], int] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def from_dates(cls, vacations: Dict[str, Iterable[date]]) -> "VacationIndex":
+        index = cls()
+        for eid, days in (vacations or {}).items():
+            days = list(days or ())
+            for d in days:
+                index._order.setdefault((_ym(d), eid), len(index._order))
+            if days:
+                index._add(eid, days)
+        return index
+
+    @classmethod
+    def from_months(cls, month_specs: Iterable[Dict]) -> "VacationIndex":
+        """Все отпуска из всех month_spec (даты могут повторяться между месяцами)."""
+        by_emp: Dict[str, List[date]] = {}
+        order: Dict[Tuple[str, str], int] = {}
+        for ms in month_specs:
+            for eid, days in (ms.get("vacations", {}) or {}).items():
+                for d in days:
+                    order.setdefault((_ym(d), eid), len(order))
+                    by_emp.setdefault(eid, []).append(d)
+        index = cls()
+        index._order = order
+        for eid, days in by_emp.items():
+            index._add(eid, days)
+        return index
+
+    def _add(self, eid: str, days: Iterable[date]) -> None:
+        old = self.ranges.get(eid, [])
+        merged = _merge([d for lo, hi in old for d in _span(lo, hi)] + list(days))
+        self.ranges[eid] = merged
+        self._starts[eid] = [lo for lo, _ in merged]
+
+    # ---------- Запросы ----------
+    def on_vacation(self, emp_id: str, d: date) -> bool:
+        starts = self._starts.get(emp_id)
+        if not starts:
+            return False
+        i = bisect.bisect_right(starts, d) - 1
+        return i >= 0 and d <= self.ranges[emp_id][i][1]
+
+    def dates_in(self, emp_id: str, d0: date, d1: date) -> List[date]:
+        """Даты отпуска сотрудника в окне [d0..d1] по порядку."""
+        starts = self._starts.get(emp_id)
+        if not starts:
+            return []
+        rngs = self.ranges[emp_id]
+        out: List[date] = []
+        i = max(0, bisect.bisect_right(starts, d0) - 1)
+        while i < len(rngs) and rngs[i][0] <= d1:
+            lo, hi = max(rngs[i][0], d0), min(rngs[i][1], d1)
+            if lo <= hi:
+                out.extend(_span(lo, hi))
+            i += 1
+        return out
+
+    def starts_in(self, emp_id: str, d0: date, d1: date) -> List[date]:
+        """Первые дни диапазонов отпуска сотрудника, попавшие в [d0..d1]."""
+        starts = self._starts.get(emp_id) or []
+        return starts[bisect.bisect_left(starts, d0) : bisect.bisect_right(starts, d1)]
+
+    def window(self, d0: date, d1: date, emp_ids: Optional[Iterable[str]] = None) -> Dict[str, List[date]]:
+        """Сотрудник -> даты отпуска в окне (только сотрудники с датами; emp_ids — фильтр)."""
+        allowed = set(emp_ids) if emp_ids is not None else None
+        ym = _ym(d0) if (d0.year, d0.month) == (d1.year, d1.month) else None
+        eids = [eid for eid in self.ranges if allowed is None or eid in allowed]
+        if ym is not None:
+            big = len(self._order)
+            eids.sort(key=lambda eid: self._order.get((ym, eid), big))
+        out: Dict[str, List[date]] = {}
+        for eid in eids:
+            ds = self.dates_in(eid, d0, d1)
+            if ds:
+                out[eid] = ds
+        return out
+
+    def employees(self) -> List[str]:
+        return list(self.ranges)
+
+    def conflicts(
+        self,
+        max_concurrent: int = 1,
+        d0: Optional[date] = None,
+        d1: Optional[date] = None,
+        emp_ids: Optional[Iterable[str]] = None,
+    ) -> List[VacationConflict]:
+        """
+        Интервалы, где одновременно в отпуске больше max_concurrent сотрудников (окно [d0..d1]
+        и фильтр сотрудников необязательны). Проход по отсортированным границам диапазонов: O(R log R).
+        """
+        allowed = set(emp_ids) if emp_ids is not None else None
+        events: List[Tuple[date, int, str]] = []  # (день, +1 начало / -1 после конца, сотрудник)
+        for eid, rngs in self.ranges.items():
+            if allowed is not None and eid not in allowed:
+                continue
+            for lo, hi in rngs:
+                if d0 is not None and hi < d0 or d1 is not None and lo > d1:
+                    continue
+                lo = max(lo, d0) if d0 is not None else lo
+                hi = min(hi, d1) if d1 is not None else hi
+                events.append((lo, 1, eid))
+                events.append((hi + timedelta(days=1), -1, eid))
+        events.sort(key=lambda x: (x[0], x[1]))
+        active: Dict[str, None] = {}
+        out: List[VacationConflict] = []
+        i = 0
+        while i < len(events):
+            day = events[i][0]
+            while i < len(events) and events[i][0] == day:
+                _, kind, eid = events[i]
+                if kind > 0:
+                    active[eid] = None
+                else:
+                    active.pop(eid, None)
+                i += 1
+            if len(active) > max_concurrent:
+                nxt = events[i][0] if i < len(events) else day + timedelta(days=1)
+                out.append(VacationConflict(day, nxt - timedelta(days=1), sorted(active)))
+        return out
+
+
+def _span(lo: date, hi: date) -> List[date]:
+    return [lo + timedelta(days=k) for k in range((hi - lo).days + 1)]
+
+
+def _ym(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+__all__ = ["VacationConflict", "VacationIndex"]
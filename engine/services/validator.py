@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
-from typing import Dict, List, Tuple
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 from datetime import date
 
 # Ожидаем интерфейс schedule: Dict[date, List[Assignment]]
@@ -47,6 +48,106 @@ def _office(code: str) -> str | None:
     return None
 
 
+@dataclass(frozen=True)
+class ValidationIssue:
+    """Нарушение проверки: сотрудник, дата, ожидаемый и фактический токен, правило."""
+
+    ym: str
+    employee_id: str
+    date: date
+    expected: str
+    actual: str
+    rule: str = "baseline.cycle"
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "ym": self.ym,
+            "employee_id": self.employee_id,
+            "date": self.date.isoformat(),
+            "expected": self.expected,
+            "actual": self.actual,
+            "rule": self.rule,
+        }
+
+
+def format_issue(issue: ValidationIssue) -> str:
+    """Текст нарушения — как в логах (строки validate_baseline)."""
+    if issue.rule == "baseline.cycle":
+        return (
+            f"{issue.ym}: Сотрудник {issue.employee_id} — нарушен цикл на дате {issue.date.isoformat()} "
+            f"(ожидалось {issue.expected}, есть {issue.actual})"
+        )
+    return (
+        f"{issue.ym}: Сотрудник {issue.employee_id} — {issue.rule} на дате {issue.date.isoformat()} "
+        f"(ожидалось {issue.expected}, есть {issue.actual})"
+    )
+
+
+def limit_issues(
+    issues: Iterable[ValidationIssue],
+    max_issues: Optional[int] = None,
+    per_employee: Optional[int] = None,
+) -> Iterator[ValidationIssue]:
+    """Отсечки: не больше per_employee на сотрудника и max_issues всего (None/0 — без ограничения)."""
+    total = 0
+    seen: Dict[str, int] = {}
+    for issue in issues:
+        if max_issues and total >= max_issues:
+            return
+        if per_employee:
+            k = seen.get(issue.employee_id, 0)
+            if k >= per_employee:
+                continue
+            seen[issue.employee_id] = k + 1
+        total += 1
+        yield issue
+
+
+# Сетка для baseline: код сотрудника на дату -> символ строки.
+# D/N — токены цикла, O — вне цикла, «8» — N8* (тоже O, но на 1-е задаёт старт O2),
+# «v» — VAC8/VAC0 (O, пропускается при ignore_vacations и при поиске первого дня).
+_BASELINE_CHAR = {"VAC8": "v", "VAC0": "v", "N8A": "8", "N8B": "8"}
+_CYCLE = "DNOO"
+
+
+def _baseline_char(code: str) -> str:
+    ch = _BASELINE_CHAR.get(code)
+    return ch if ch is not None else _tok(code)
+
+
+def _baseline_row_issues(row: str, ignore_vacations: bool) -> Tuple[str, List[int]]:
+    """
+    Для строки символов сотрудника: ожидаемая строка цикла и индексы расхождений.
+    Старт цикла: N8* на 1-е → O2; иначе по первому не-VAC дню;
+    если он O — из O2/O3 выбирается старт с меньшим числом расхождений (при равенстве O2).
+    """
+    n = len(row)
+    cyc = _CYCLE * (n // 4 + 2)
+    # сравниваемая строка: N8 → O, VAC → «*» (пропуск) или O
+    cmp = row.replace("8", "O").replace("v", "*" if ignore_vacations else "O")
+
+    def mismatches(start: int) -> List[int]:
+        exp = cyc[start : start + n]
+        if cmp == exp:
+            return []
+        return [i for i, (a, b) in enumerate(zip(cmp, exp)) if a != b and a != "*"]
+
+    if row[0] == "8":
+        start = 2
+    else:
+        idx = n - len(row.lstrip("v"))
+        if idx == n:
+            start = 2
+        elif row[idx] == "D":
+            start = (0 - idx) % 4
+        elif row[idx] == "N":
+            start = (1 - idx) % 4
+        else:
+            mis2, mis3 = mismatches(2), mismatches(3)
+            return (cyc[3 : 3 + n], mis3) if len(mis3) < len(mis2) else (cyc[2 : 2 + n], mis2)
+    return cyc[start : start + n], mismatches(start)
+
+
 def validate_baseline(
     ym: str,
     employees,
@@ -54,73 +155,97 @@ def validate_baseline(
     code_of,
     gen = None,
     ignore_vacations: bool = True,
+    *,
+    max_issues: Optional[int] = None,
+    per_employee: Optional[int] = None,
 ) -> List[str]:
     """
     Базовая проверка паттерна с «якорем» = 1-е число текущего месяца.
     Используем фактический токен на 1-е (с учётом N4→N, N8→O, VAC→O) как старт цикла D→N→O→O.
     Это учитывает carry-in и переносы.
+
+    Текстовая форма iter_baseline_issues (format_issue).
+    """
+    return [
+        format_issue(issue)
+        for issue in iter_baseline_issues(
+            ym, employees, schedule, code_of,
+            ignore_vacations=ignore_vacations, max_issues=max_issues, per_employee=per_employee,
+        )
+    ]
+
+
+def iter_baseline_issues(
+    ym: str,
+    employees,
+    schedule: Dict[date, List],
+    code_of,
+    *,
+    ignore_vacations: bool = True,
+    max_issues: Optional[int] = None,
+    per_employee: Optional[int] = None,
+) -> Iterator[ValidationIssue]:
+    """
+    Нарушения baseline записями, лениво (по сотрудникам в порядке списка, внутри — по датам).
+
+    Сетка: строка сотрудника — символы по датам (при дублях за день — последняя строка),
+    сравнение с циклом для обоих O-стартов строками целиком; одинаковые строки (а при
+    ротации их немного) проверяются один раз. Отсечки останавливают перебор без лишней работы.
     """
-    issues: List[str] = []
     dates = sorted(schedule.keys())
     if not dates:
-        return issues
-    d0 = dates[0]
+        return iter(())
+    rows = _baseline_char_rows(schedule, dates, code_of)
+    memo: Dict[str, Tuple[str, List[int]]] = {}
+    every = (
+        issue
+        for e in employees
+        for issue in _baseline_emp_issues(ym, e.id, rows, dates, ignore_vacations, memo, per_employee)
+    )
+    return limit_issues(every, max_issues, per_employee)
 
-    actual_code: Dict[Tuple[date, str], str] = {}
-    for d in dates:
+
+def _baseline_char_rows(schedule, dates: List[date], code_of, only: Optional[Set[str]] = None) -> Dict[str, str]:
+    """Строки символов baseline по сотрудникам (only — только эти). При дублях за день — последняя строка."""
+    n = len(dates)
+    chars: Dict[str, List[str]] = {}
+    char_of: Dict[str, str] = {}
+    for di, d in enumerate(dates):
         for a in schedule[d]:
-            code = code_of(a.shift_key).upper()
-            actual_code[(d, a.employee_id)] = code
-
-    cycle = ["D", "N", "O", "O"]  # 0,1,2,3
-    idx_of = {"D": 0, "N": 1, "O": 2}  # NB: O может быть и 2, и 3 — разрулим ниже
-
-    def _first_non_vac_index(eid: str) -> int | None:
-        for i, d in enumerate(dates):
-            code = actual_code.get((d, eid), "OFF")
-            if code not in {"VAC8", "VAC0"}:
-                return i
-        return None
-
-    def _choose_start(eid: str) -> int:
-        """Старт цикла на 1-е: N8* => O2, иначе — по первому не-VAC дню с учётом O2/O3."""
-        code_d1 = actual_code.get((d0, eid), "OFF").upper()
-        if code_d1 in {"N8A", "N8B"}:
-            return 2
-        idx = _first_non_vac_index(eid)
-        if idx is None:
-            return 2
-        tok = _tok(actual_code.get((dates[idx], eid), "OFF"))
-        if tok != "O":
-            return (idx_of[tok] - idx) % 4
-        best_start, best_mis = 2, 10 ** 9
-        for o_start in (2, 3):
-            mis = 0
-            for i, d in enumerate(dates):
-                code = actual_code.get((d, eid), "OFF")
-                if ignore_vacations and code in {"VAC8", "VAC0"}:
-                    continue
-                exp = cycle[(o_start + i) % 4]
-                act = _tok(code)
-                if exp != act:
-                    mis += 1
-            if mis < best_mis:
-                best_start, best_mis = o_start, mis
-        return best_start
-
-    for e in employees:
-        start = _choose_start(e.id)
-        for i, d in enumerate(dates):
-            exp = cycle[(start + i) % 4]
-            code = actual_code.get((d, e.id), "OFF").upper()
-            act = _tok(code)
-            if ignore_vacations and code in {"VAC8", "VAC0"}:
+            if only is not None and a.employee_id not in only:
                 continue
-            if act != exp:
-                issues.append(
-                    f"{ym}: Сотрудник {e.id} — нарушен цикл на дате {d.isoformat()} (ожидалось {exp}, есть {act})"
-                )
-    return issues
+            ch = char_of.get(a.shift_key)
+            if ch is None:
+                ch = _baseline_char(code_of(a.shift_key).upper())
+                char_of[a.shift_key] = ch
+            row = chars.get(a.employee_id)
+            if row is None:
+                row = chars[a.employee_id] = ["O"] * n
+            row[di] = ch
+    return {eid: "".join(row) for eid, row in chars.items()}
+
+
+def _baseline_emp_issues(
+    ym: str,
+    emp_id: str,
+    rows: Dict[str, str],
+    dates: List[date],
+    ignore_vacations: bool,
+    memo: Dict[str, Tuple[str, List[int]]],
+    limit: Optional[int] = None,
+) -> List[ValidationIssue]:
+    row_s = rows.get(emp_id) or "O" * len(dates)
+    res = memo.get(row_s)
+    if res is None:
+        res = memo[row_s] = _baseline_row_issues(row_s, ignore_vacations)
+    exp, bad = res
+    if limit:
+        bad = bad[:limit]
+    return [
+        ValidationIssue(ym, emp_id, dates[i], exp[i], "O" if row_s[i] in "8v" else row_s[i])
+        for i in bad
+    ]
+
 
 # Доп. «мягкая» проверка/лог по первым дням месяца (smoke): DA/DB/A/B-сплит
 def coverage_smoke(ym, schedule, code_of, first_days: int = 8):
@@ -147,49 +272,121 @@ def phase_trace(ym, employees, schedule, code_of, gen = None, days: int = 10):
     dates = sorted(schedule.keys())[:days]
     if not dates:
         return []
+    return [_phase_trace_line(e.id, dates, schedule, code_of) for e in employees]
+
+
+def _phase_trace_line(emp_id: str, dates: List[date], schedule, code_of) -> str:
     cycle = ["D", "N", "O", "O"]
     idx_of = {"D": 0, "N": 1, "O": 2}
-    out = []
-    for e in employees:
-        act: List[str] = []
-        codes: List[str | None] = []
-        for d in dates:
-            code = None
-            for a in schedule[d]:
-                if a.employee_id == e.id:
-                    code = code_of(a.shift_key).upper()
-                    break
-            codes.append(code)
-            act.append(_tok(code or "OFF"))
-
-        def choose_start_from_act() -> int:
-            if not dates:
-                return 2
-            day1_code = None
-            for a in schedule[dates[0]]:
-                if a.employee_id == e.id:
-                    day1_code = code_of(a.shift_key).upper()
-                    break
-            if day1_code in {"N8A", "N8B"}:
-                return 2
-            nonvac = None
-            for i, code in enumerate(codes):
-                c = (code or "OFF").upper()
-                if c not in {"VAC8", "VAC0"}:
-                    nonvac = i
-                    break
-            if nonvac is None:
-                return 2
-            tok = act[nonvac]
-            if tok != "O":
-                return (idx_of[tok] - nonvac) % 4
-            candidates = [
-                (2, sum(1 for i, t in enumerate(act) if t != cycle[(2 + i) % 4])),
-                (3, sum(1 for i, t in enumerate(act) if t != cycle[(3 + i) % 4])),
-            ]
-            return min(candidates, key=lambda x: x[1])[0]
-
-        start = choose_start_from_act()
-        exp = [cycle[(start + i) % 4] for i in range(len(act))]
-        out.append(f"{e.id}: exp={' '.join(exp)} | act={' '.join(act)}")
-    return out
+    act: List[str] = []
+    codes: List[str | None] = []
+    for d in dates:
+        code = None
+        for a in schedule[d]:
+            if a.employee_id == emp_id:
+                code = code_of(a.shift_key).upper()
+                break
+        codes.append(code)
+        act.append(_tok(code or "OFF"))
+
+    def choose_start_from_act() -> int:
+        day1_code = codes[0]
+        if day1_code in {"N8A", "N8B"}:
+            return 2
+        nonvac = None
+        for i, code in enumerate(codes):
+            c = (code or "OFF").upper()
+            if c not in {"VAC8", "VAC0"}:
+                nonvac = i
+                break
+        if nonvac is None:
+            return 2
+        tok = act[nonvac]
+        if tok != "O":
+            return (idx_of[tok] - nonvac) % 4
+        candidates = [
+            (2, sum(1 for i, t in enumerate(act) if t != cycle[(2 + i) % 4])),
+            (3, sum(1 for i, t in enumerate(act) if t != cycle[(3 + i) % 4])),
+        ]
+        return min(candidates, key=lambda x: x[1])[0]
+
+    start = choose_start_from_act()
+    exp = [cycle[(start + i) % 4] for i in range(len(act))]
+    return f"{emp_id}: exp={' '.join(exp)} | act={' '.join(act)}"
+
+
+class IncrementalValidation:
+    """
+    Кэш validate_baseline и phase_trace одного месяца по сотрудникам.
+
+    Первый вызов issues()/trace() проверяет всех; дальше с DirtySet (services.dirty)
+    перепроверяются только изменённые сотрудники: baseline — вся строка сотрудника
+    (старт цикла зависит от всего месяца), phase_trace — если правка попала в первые
+    trace_days дней. dirty=None, everything или другой набор дат — полная проверка.
+    Результат совпадает с validate_baseline/phase_trace по текущему расписанию (с теми же отсечками).
+    """
+
+    def __init__(
+        self,
+        ym: str,
+        employees,
+        code_of,
+        *,
+        ignore_vacations: bool = True,
+        trace_days: int = 10,
+        max_issues: Optional[int] = None,
+        per_employee: Optional[int] = None,
+    ) -> None:
+        self.ym = ym
+        self.employees = list(employees)
+        self.code_of = code_of
+        self.ignore_vacations = ignore_vacations
+        self.trace_days = trace_days
+        self.max_issues = max_issues
+        self.per_employee = per_employee
+        self.rechecked = 0  # сколько сотрудников перепроверил последний issue_records()
+        self.trace_rechecked = 0  # то же для последнего trace()
+        self._ids = list(dict.fromkeys(e.id for e in self.employees))
+        self._issue_dates: Optional[List[date]] = None
+        self._issues: Dict[str, List[ValidationIssue]] = {}
+        self._trace_dates: Optional[List[date]] = None
+        self._trace: Dict[str, str] = {}
+
+    def issues(self, schedule: Dict[date, List], dirty=None) -> List[str]:
+        return [format_issue(issue) for issue in self.issue_records(schedule, dirty)]
+
+    def issue_records(self, schedule: Dict[date, List], dirty=None) -> List[ValidationIssue]:
+        dates = sorted(schedule.keys())
+        if not dates:
+            self._issue_dates, self._issues, self.rechecked = dates, {}, 0
+            return []
+        if self._issue_dates != dates or dirty is None or dirty.everything:
+            ids = self._ids
+        else:
+            ids = [eid for eid in self._ids if eid in dirty.ranges]
+        if ids:
+            rows = _baseline_char_rows(schedule, dates, self.code_of, only=set(ids))
+            memo: Dict[str, Tuple[str, List[int]]] = {}
+            for eid in ids:
+                self._issues[eid] = _baseline_emp_issues(
+                    self.ym, eid, rows, dates, self.ignore_vacations, memo, self.per_employee
+                )
+        self._issue_dates = dates
+        self.rechecked = len(ids)
+        every = (issue for e in self.employees for issue in self._issues[e.id])
+        return list(limit_issues(every, self.max_issues, self.per_employee))
+
+    def trace(self, schedule: Dict[date, List], dirty=None) -> List[str]:
+        dates = sorted(schedule.keys())[: self.trace_days]
+        if not dates:
+            self._trace_dates, self._trace, self.trace_rechecked = dates, {}, 0
+            return []
+        if self._trace_dates != dates or dirty is None or dirty.everything:
+            ids = self._ids
+        else:
+            ids = [eid for eid in self._ids if dirty.touches(eid, dates[0], dates[-1])]
+        for eid in ids:
+            self._trace[eid] = _phase_trace_line(eid, dates, schedule, self.code_of)
+        self._trace_dates = dates
+        self.trace_rechecked = len(ids)
+        return [self._trace[e.id] for e in self.employees]
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+from __future__ import annotations
+
+from engine.infrastructure.config import CONFIG
+from engine.infrastructure.production_calendar import ProductionCalendar
+from engine.services import dirty, validator
+from engine.services.generator import Generator
+
+
+def _month():
+    gen = Generator(CONFIG, calendar=ProductionCalendar.load_default())
+    ym = gen.configured_months(CONFIG["months"])[0]
+    res = next(gen.generate_horizon(ym, ym))
+    gen.final_issues(res)  # прогрев кэша на итоговом расписании
+    return gen, res
+
+
+def _full(gen, res):
+    v = res.validation
+    return list(
+        validator.iter_baseline_issues(
+            res.ym, res.employees, res.schedule, gen.code_of, ignore_vacations=True,
+            max_issues=v.max_issues, per_employee=v.per_employee,
+        )
+    )
+
+
+def test_single_cell_edit_rechecks_only_touched_employee():
+    gen, res = _month()
+    day = sorted(res.schedule)[5]
+    cell = next(a for a in res.schedule[day] if gen.code_of(a.shift_key) != "OFF")
+    with dirty.tracking() as changed:
+        dirty.mark(cell.employee_id, day)
+        cell.shift_key, cell.effective_hours = "off", 0
+
+    got = res.validation.issue_records(res.schedule, changed)
+
+    assert res.validation.rechecked == 1
+    assert got == _full(gen, res)
+
+
+def test_final_issues_match_full_check():
+    gen, res = _month()
+    assert res.validation.rechecked <= len(res.employees)
+    assert gen.final_issues(res) == _full(gen, res)
+
+
+def test_trace_and_issue_counters_are_separate():
+    gen, res = _month()
+    v = res.validation
+    v.trace(res.schedule)
+    assert v.trace_rechecked == len(res.employees)
+    v.issue_records(res.schedule, dirty.DirtySet())
+    assert v.rechecked == 0
+    assert v.trace_rechecked == len(res.employees)